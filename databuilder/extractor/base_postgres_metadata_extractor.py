@@ -6,15 +6,17 @@ import logging
 from collections import namedtuple
 from itertools import groupby
 from typing import (
-    Any, Dict, Iterator, Union,
+    Any, Dict, Iterator, List, Union,
 )
 
+import pandas
 from pyhocon import ConfigFactory, ConfigTree
 
 from databuilder import Scoped
 from databuilder.extractor.base_extractor import Extractor
 from databuilder.extractor.sql_alchemy_extractor import SQLAlchemyExtractor
 from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+from databuilder.models.table_metadata_batch import TableMetadataBatch
 
 TableKey = namedtuple('TableKey', ['schema', 'table_name'])
 
@@ -31,12 +33,16 @@ class BasePostgresMetadataExtractor(Extractor):
     CLUSTER_KEY = 'cluster_key'
     USE_CATALOG_AS_CLUSTER_NAME = 'use_catalog_as_cluster_name'
     DATABASE_KEY = 'database_key'
+    # Number of columns extracted into a TableMetadataBatch, instead of a TableMetadata per table. A batch ends at
+    # a table boundary, so it may hold more columns. 0 for a TableMetadata per table.
+    TABLE_METADATA_BATCH_SIZE = 'table_metadata_batch_size'
 
     # Default values
     DEFAULT_CLUSTER_NAME = 'master'
 
     DEFAULT_CONFIG = ConfigFactory.from_dict(
-        {WHERE_CLAUSE_SUFFIX_KEY: ' ', CLUSTER_KEY: DEFAULT_CLUSTER_NAME, USE_CATALOG_AS_CLUSTER_NAME: True}
+        {WHERE_CLAUSE_SUFFIX_KEY: ' ', CLUSTER_KEY: DEFAULT_CLUSTER_NAME, USE_CATALOG_AS_CLUSTER_NAME: True,
+         TABLE_METADATA_BATCH_SIZE: 0}
     )
 
     @abc.abstractmethod
@@ -51,6 +57,7 @@ class BasePostgresMetadataExtractor(Extractor):
         self._cluster = conf.get_string(BasePostgresMetadataExtractor.CLUSTER_KEY)
 
         self._database = conf.get_string(BasePostgresMetadataExtractor.DATABASE_KEY, default='postgres')
+        self._batch_size = conf.get_int(BasePostgresMetadataExtractor.TABLE_METADATA_BATCH_SIZE)
 
         self.sql_stmt = self.get_sql_statement(
             use_catalog_as_cluster_name=conf.get_bool(BasePostgresMetadataExtractor.USE_CATALOG_AS_CLUSTER_NAME),
@@ -68,9 +75,9 @@ class BasePostgresMetadataExtractor(Extractor):
         self._alchemy_extractor.init(sql_alch_conf)
         self._extract_iter: Union[None, Iterator] = None
 
-    def extract(self) -> Union[TableMetadata, None]:
+    def extract(self) -> Union[TableMetadata, TableMetadataBatch, None]:
         if not self._extract_iter:
-            self._extract_iter = self._get_extract_iter()
+            self._extract_iter = self._get_batch_extract_iter() if self._batch_size > 0 else self._get_extract_iter()
         try:
             return next(self._extract_iter)
         except StopIteration:
@@ -95,6 +102,31 @@ class BasePostgresMetadataExtractor(Extractor):
                                 last_row['description'],
                                 columns)
 
+    def _get_batch_extract_iter(self) -> Iterator[TableMetadataBatch]:
+        """
+        Same as _get_extract_iter, but yields TableMetadataBatch of TABLE_METADATA_BATCH_SIZE columns or more
+        :return:
+        """
+        rows: List[Dict[str, Any]] = []
+        for _, group in groupby(self._get_raw_extract_iter(), self._get_table_key):
+            for row in group:
+                rows.append({TableMetadataBatch.DATABASE: self._database,
+                             TableMetadataBatch.CLUSTER: row['cluster'],
+                             TableMetadataBatch.SCHEMA: row['schema'],
+                             TableMetadataBatch.TABLE: row['name'],
+                             TableMetadataBatch.TABLE_DESCRIPTION: row['description'],
+                             TableMetadataBatch.COLUMN_NAME: row['col_name'],
+                             TableMetadataBatch.COLUMN_TYPE: row['col_type'],
+                             TableMetadataBatch.SORT_ORDER: row['col_sort_order'],
+                             TableMetadataBatch.COLUMN_DESCRIPTION: row['col_description']})
+
+            if len(rows) >= self._batch_size:
+                yield TableMetadataBatch(pandas.DataFrame.from_records(rows))
+                rows = []
+
+        if rows:
+            yield TableMetadataBatch(pandas.DataFrame.from_records(rows))
+
     def _get_raw_extract_iter(self) -> Iterator[Dict[str, Any]]:
         """
         Provides iterator of result row from SQLAlchemy extractor
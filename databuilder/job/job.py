@@ -2,6 +2,8 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 
 from pyhocon import ConfigTree
 from statsd import StatsClient
@@ -10,6 +12,8 @@ from databuilder import Scoped
 from databuilder.job.base_job import Job
 from databuilder.publisher.base_publisher import NoopPublisher, Publisher
 from databuilder.task.base_task import Task
+from databuilder.utils.key_registry import reset_key_registry
+from databuilder.utils.ready_file_queue import READY_FILE_QUEUE, ReadyFileQueue
 
 LOGGER = logging.getLogger(__name__)
 
@@ -18,6 +22,8 @@ class DefaultJob(Job):
     # Config keys
     IS_STATSD_ENABLED = 'is_statsd_enabled'
     JOB_IDENTIFIER = 'identifier'
+    # KeyRegistry instance that models share to dedup nodes and relations in the job run. Default: KeyRegistry()
+    KEY_REGISTRY = 'key_registry'
 
     """
     Default job that expects a task, and optional publisher
@@ -26,6 +32,14 @@ class DefaultJob(Job):
     Note that job.identifier is part of metrics prefix and choose unique & readable identifier for the job.
 
     To configure statsd itself, use environment variable: https://statsd.readthedocs.io/en/v3.2.1/configure.html
+
+    If the publisher is configured with a ReadyFileQueue (shared with the loader), publisher runs concurrently with
+    the task and publishes files as the loader completes them. If the task fails, the queue is aborted so that the
+    publisher rolls back its open transaction and stops; files it already committed stay published. If the publisher
+    fails, the queue is rejected so that the loader fails and the task stops, and the publisher's error is raised.
+
+    Keys that models remember to dedup nodes and relations across records are scoped to the job run: the key registry
+    is reset when the job is launched and when it's done.
     """
 
     def __init__(self,
@@ -61,15 +75,22 @@ class DefaultJob(Job):
         #  closeable get closed.
         try:
             is_success = True
+            reset_key_registry(self.scoped_conf.get(DefaultJob.KEY_REGISTRY, None))
             self._init()
-            try:
-                self.task.run()
-            finally:
-                self.task.close()
-
-            self.publisher.init(Scoped.get_scoped_conf(self.conf, self.publisher.get_scope()))
-            Job.closer.register(self.publisher.close)
-            self.publisher.publish()
+            publisher_conf = Scoped.get_scoped_conf(self.conf, self.publisher.get_scope())
+            ready_file_queue = publisher_conf.get(READY_FILE_QUEUE, None)
+            if ready_file_queue:
+                self._launch_streaming(publisher_conf, ready_file_queue)
+            else:
+                try:
+                    self.task.run()
+                finally:
+                    self.task.close()
+
+                self.publisher.set_statsd(self.statsd)
+                self.publisher.init(publisher_conf)
+                Job.closer.register(self.publisher.close)
+                self.publisher.publish()
 
         except Exception as e:
             is_success = False
@@ -85,5 +106,49 @@ class DefaultJob(Job):
                     self.statsd.incr('fail')
 
             Job.closer.close()
+            reset_key_registry()
 
         logging.info('Job completed')
+
+    def _launch_streaming(self, publisher_conf: ConfigTree, ready_file_queue: ReadyFileQueue) -> None:
+        """
+        Runs the task while the publisher publishes the files the loader hands over through ready_file_queue.
+        :param publisher_conf:
+        :param ready_file_queue:
+        :return:
+        """
+        self.publisher.set_statsd(self.statsd)
+        self.publisher.init(publisher_conf)
+        Job.closer.register(self.publisher.close)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        publish_future = executor.submit(self.publisher.publish)
+        publish_future.add_done_callback(partial(_reject_on_failure, ready_file_queue))
+        try:
+            try:
+                self.task.run()
+            except Exception:
+                ready_file_queue.abort()
+                raise
+            finally:
+                self.task.close()
+            # The loader closes the queue once it's done, but the publisher would wait forever if the loader is not
+            # configured with the queue
+            ready_file_queue.close()
+        except Exception:
+            # Publisher failure makes the loader fail, in which case publisher's error is the cause
+            publish_error = publish_future.exception() if publish_future.done() else None
+            # Abort in case task failed on close, before the loader closes the queue
+            ready_file_queue.abort()
+            if publish_error:
+                raise publish_error
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+        publish_future.result()
+
+
+def _reject_on_failure(ready_file_queue: ReadyFileQueue, publish_future: Future) -> None:
+    if publish_future.exception():
+        ready_file_queue.reject()
@@ -2,21 +2,28 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import csv
+import json
 import logging
 import os
 import shutil
-from csv import DictWriter
+from collections import OrderedDict
 from typing import (
-    Any, Dict, FrozenSet,
+    IO, Any, Dict, FrozenSet, Iterable, List, Optional, Tuple,
 )
 
 from pyhocon import ConfigFactory, ConfigTree
 
 from databuilder.job.base_job import Job
 from databuilder.loader.base_loader import Loader
+from databuilder.models.graph_node import GraphNode
+from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
 from databuilder.serializers import neo4_serializer
+from databuilder.utils import compressed_file, ready_file_queue
 from databuilder.utils.closer import Closer
+from databuilder.utils.ready_file_queue import ReadyFileQueue
+from databuilder.utils.row_deduplicator import RowDeduplicator
+from databuilder.utils.staging_files import CHECKPOINT_FILE_NAME, MANIFEST_FILE_NAME
 
 LOGGER = logging.getLogger(__name__)
 
@@ -26,22 +33,78 @@ class FsNeo4jCSVLoader(Loader):
     Write node and relationship CSV file(s) that can be consumed by
     Neo4jCsvPublisher.
     It assumes that the record it consumes is instance of Neo4jCsvSerializable
+
+    Along with CSV files, it writes a manifest into each directory that describes the labels, header and row count
+    of each file so that publisher does not need to scan the files for it.
+
+    With MAX_ROWS_PER_FILE or MAX_BYTES_PER_FILE, files are split into parts named with a sequence per file
+    (e.g: Column_0.part-00017.csv), so that a large label becomes independent units to publish and checkpoint.
+
+    If a ReadyFileQueue is configured, files are written in parts of READY_FILE_ROW_COUNT rows, and each node part is
+    handed over to the publisher as soon as it is complete. As a node of any label may still be written into a later
+    part, relation parts are held until the loader is closed and handed over after all node parts, so that the
+    publisher creates nodes before their relations.
     """
     # Config keys
     NODE_DIR_PATH = 'node_dir_path'
     RELATION_DIR_PATH = 'relationship_dir_path'
     FORCE_CREATE_DIR = 'force_create_directory'
     SHOULD_DELETE_CREATED_DIR = 'delete_created_directories'
+    READY_FILE_QUEUE = ready_file_queue.READY_FILE_QUEUE
+    # Number of rows written into a file part before it's handed over to ReadyFileQueue
+    READY_FILE_ROW_COUNT = 'ready_file_row_count'
+    # Maximum number of rows, or approximate number of uncompressed bytes, of a file part. 0 for unlimited.
+    MAX_ROWS_PER_FILE = 'max_rows_per_file'
+    MAX_BYTES_PER_FILE = 'max_bytes_per_file'
+    # Maximum number of files kept open. The least recently written file is closed beyond it, and reopened in append
+    # mode when it's written again.
+    MAX_OPEN_FILES = 'max_open_files'
+    # Write buffer size of each open file in bytes
+    WRITE_BUFFER_SIZE = 'write_buffer_size'
+    # Compression of the files, either 'gzip' or 'zstd'. Its extension is appended to file names (e.g: Table_0.csv.gz),
+    # and Neo4jCsvPublisher decompresses the files by it. zstd requires zstandard package.
+    COMPRESSION = 'compression'
+    # A boolean flag to drop node and relation rows identical to a row loaded before, so that repeated nodes such as
+    # User of usage records or Badge of partition columns are written and merged once.
+    DEDUPLICATE = 'deduplicate'
+    # Rows remembered exactly before spilling into a Bloom filter, which bounds memory but may drop unique rows at
+    # DEDUPLICATE_BLOOM_ERROR_RATE while it holds no more than DEDUPLICATE_BLOOM_CAPACITY rows.
+    DEDUPLICATE_MAX_EXACT_ROWS = 'deduplicate_max_exact_rows'
+    DEDUPLICATE_BLOOM_CAPACITY = 'deduplicate_bloom_capacity'
+    DEDUPLICATE_BLOOM_ERROR_RATE = 'deduplicate_bloom_error_rate'
 
     _DEFAULT_CONFIG = ConfigFactory.from_dict({
         SHOULD_DELETE_CREATED_DIR: True,
-        FORCE_CREATE_DIR: False
+        FORCE_CREATE_DIR: False,
+        READY_FILE_ROW_COUNT: 10000,
+        MAX_ROWS_PER_FILE: 0,
+        MAX_BYTES_PER_FILE: 0,
+        MAX_OPEN_FILES: 256,
+        WRITE_BUFFER_SIZE: 128 * 1024,
+        DEDUPLICATE: False,
+        DEDUPLICATE_MAX_EXACT_ROWS: 1000000,
+        DEDUPLICATE_BLOOM_CAPACITY: 10000000,
+        DEDUPLICATE_BLOOM_ERROR_RATE: 1e-6
     })
 
     def __init__(self) -> None:
-        self._node_file_mapping: Dict[Any, DictWriter] = {}
-        self._relation_file_mapping: Dict[Any, DictWriter] = {}
+        self._node_file_mapping: Dict[Any, Any] = {}
+        self._relation_file_mapping: Dict[Any, Any] = {}
+        # Layout of rows per label (or start label, end label and types), attribute names and types
+        self._node_layouts: Dict[Any, _RowLayout] = {}
+        self._relation_layouts: Dict[Any, _RowLayout] = {}
         self._keys: Dict[FrozenSet[str], int] = {}
+        self._manifest_entries: Dict[Any, Dict[str, Any]] = {}
+        # Manifest entries of the file parts that are complete
+        self._completed_manifest_entries: List[Dict[str, Any]] = []
+        # Open files in least recently written order
+        self._file_outs: 'OrderedDict[Any, IO]' = OrderedDict()
+        self._part_numbers: Dict[Any, int] = {}
+        self._byte_counts: Dict[Any, int] = {}
+        self._ready_file_queue: Optional[ReadyFileQueue] = None
+        # Relation file parts that are complete, as path and manifest entry, held until node files are final
+        self._held_relation_files: List[Tuple[str, Dict[str, Any]]] = []
+        self._deduplicator: Optional[RowDeduplicator] = None
         self._closer = Closer()
 
     def init(self, conf: ConfigTree) -> None:
@@ -61,9 +124,27 @@ class FsNeo4jCSVLoader(Loader):
         self._delete_created_dir = \
             conf.get_bool(FsNeo4jCSVLoader.SHOULD_DELETE_CREATED_DIR)
         self._force_create_dir = conf.get_bool(FsNeo4jCSVLoader.FORCE_CREATE_DIR)
+        self._ready_file_queue = conf.get(FsNeo4jCSVLoader.READY_FILE_QUEUE, None)
+        self._ready_file_row_count = conf.get_int(FsNeo4jCSVLoader.READY_FILE_ROW_COUNT)
+        self._max_rows_per_file = conf.get_int(FsNeo4jCSVLoader.MAX_ROWS_PER_FILE)
+        self._max_bytes_per_file = conf.get_int(FsNeo4jCSVLoader.MAX_BYTES_PER_FILE)
+        self._split_files = bool(self._ready_file_queue or self._max_rows_per_file or self._max_bytes_per_file)
+        self._max_open_files = conf.get_int(FsNeo4jCSVLoader.MAX_OPEN_FILES)
+        self._write_buffer_size = conf.get_int(FsNeo4jCSVLoader.WRITE_BUFFER_SIZE)
+        self._file_extension = f'.csv{compressed_file.get_extension(conf.get(FsNeo4jCSVLoader.COMPRESSION, None))}'
+        if conf.get_bool(FsNeo4jCSVLoader.DEDUPLICATE):
+            self._deduplicator = RowDeduplicator(
+                max_exact_rows=conf.get_int(FsNeo4jCSVLoader.DEDUPLICATE_MAX_EXACT_ROWS),
+                bloom_capacity=conf.get_int(FsNeo4jCSVLoader.DEDUPLICATE_BLOOM_CAPACITY),
+                bloom_error_rate=conf.get_float(FsNeo4jCSVLoader.DEDUPLICATE_BLOOM_ERROR_RATE))
         self._create_directory(self._node_dir)
         self._create_directory(self._relation_dir)
 
+        # Registered first so that it runs after all files are closed
+        self._closer.register(self._write_manifests)
+        self._closer.register(self._close_files)
+        self._closer.register(self._log_duplicates)
+
     def _create_directory(self, path: str) -> None:
         """
         Validate directory does not exist, creates it, register deletion of
@@ -85,6 +166,11 @@ class FsNeo4jCSVLoader(Loader):
                 LOGGER.warning('Skip Deleting directory %s', path)
                 return
 
+            # Publisher leaves a checkpoint behind when it fails, so that it can resume from the same files
+            if os.path.exists(os.path.join(self._node_dir, CHECKPOINT_FILE_NAME)):
+                LOGGER.warning('Skip Deleting directory %s as publisher checkpoint exists in %s', path, self._node_dir)
+                return
+
             LOGGER.info('Deleting directory %s', path)
             shutil.rmtree(path)
 
@@ -99,93 +185,288 @@ class FsNeo4jCSVLoader(Loader):
         can also have different nodes, and relationships.
 
         Common pattern for both nodes and relations:
-         1. retrieve csv row (a dict where keys represent a header,
-         values represent a row)
-         2. using this dict to get a appropriate csv writer and write to it.
+         1. find the layout (header and file) of the row by its label, attribute names and types. Header is
+         serialized once per layout.
+         2. write the values as a row tuple into the csv writer of the file.
          3. repeat 1 and 2
 
         :param csv_serializable:
         :return:
         """
 
-        node = csv_serializable.next_node()
-        while node:
-            node_dict = neo4_serializer.serialize_node(node)
-            key = (node.label, self._make_key(node_dict))
-            file_suffix = '{}_{}'.format(*key)
-            node_writer = self._get_writer(node_dict,
-                                           self._node_file_mapping,
-                                           key,
-                                           self._node_dir,
-                                           file_suffix)
-            node_writer.writerow(node_dict)
-            node = csv_serializable.next_node()
-
-        relation = csv_serializable.next_relation()
-        while relation:
-            relation_dict = neo4_serializer.serialize_relationship(relation)
-            key2 = (relation.start_label,
-                    relation.end_label,
-                    relation.type,
-                    self._make_key(relation_dict))
-
-            file_suffix = f'{key2[0]}_{key2[1]}_{key2[2]}'
-            relation_writer = self._get_writer(relation_dict,
-                                               self._relation_file_mapping,
-                                               key2,
-                                               self._relation_dir,
-                                               file_suffix)
-            relation_writer.writerow(relation_dict)
-            relation = csv_serializable.next_relation()
+        for node in csv_serializable.iter_nodes():
+            layout = self._get_node_layout(node)
+            row = (node.label, node.key, *node.attributes.values())
+            if not self._is_duplicate((layout.key, row)):
+                self._write_row(row, layout, self._node_file_mapping, self._node_dir)
+                if self._add_row(layout.key, row):
+                    self._complete_node_file(layout.key)
+
+        for relation in csv_serializable.iter_relations():
+            layout = self._get_relation_layout(relation)
+            row = (relation.start_key, relation.start_label, relation.end_key, relation.end_label, relation.type,
+                   relation.reverse_type, *relation.attributes.values())
+            if not self._is_duplicate((layout.key, row)):
+                self._write_row(row, layout, self._relation_file_mapping, self._relation_dir)
+                if self._add_row(layout.key, row):
+                    self._complete_relation_file(layout.key)
+
+    def _get_node_layout(self, node: GraphNode) -> '_RowLayout':
+        """
+        Provides the header and file of the node. The header depends on the label, attribute names and their types
+        (for UNQUOTED_SUFFIX), so that it's serialized once per combination of them.
+        :param node:
+        :return:
+        """
+        attributes = node.attributes
+        layout_key = (node.label, tuple(attributes), tuple(map(type, attributes.values())))
+        layout = self._node_layouts.get(layout_key)
+        if layout is None:
+            header = list(neo4_serializer.serialize_node(node))
+            key = (node.label, self._make_key(header))
+            layout = _RowLayout(key, header, '{}_{}'.format(*key), {'labels': [node.label]})
+            self._node_layouts[layout_key] = layout
+        return layout
+
+    def _get_relation_layout(self, relation: GraphRelationship) -> '_RowLayout':
+        attributes = relation.attributes
+        layout_key = (relation.start_label, relation.end_label, relation.type, relation.reverse_type,
+                      tuple(attributes), tuple(map(type, attributes.values())))
+        layout = self._relation_layouts.get(layout_key)
+        if layout is None:
+            header = list(neo4_serializer.serialize_relationship(relation))
+            key = (relation.start_label, relation.end_label, relation.type, self._make_key(header))
+            layout = _RowLayout(key,
+                                header,
+                                f'{key[0]}_{key[1]}_{key[2]}',
+                                {'start_label': relation.start_label,
+                                 'end_label': relation.end_label,
+                                 'type': relation.type,
+                                 'reverse_type': relation.reverse_type})
+            self._relation_layouts[layout_key] = layout
+        return layout
+
+    def _write_row(self,
+                   row: Tuple[Any, ...],
+                   layout: '_RowLayout',
+                   file_mapping: Dict[Any, Any],
+                   dir_path: str) -> None:
+        """
+        Writes the row into the file of the layout. Values are reordered if the file was created with the same set of
+        columns in a different order.
+        :param row: Values in the order of layout header
+        :param layout:
+        :param file_mapping:
+        :param dir_path:
+        :return:
+        """
+        writer = self._get_writer(layout.header, file_mapping, layout.key, dir_path, layout.file_suffix,
+                                  layout.manifest_entry)
+        file_header = self._manifest_entries[layout.key]['header']
+        if file_header is not layout.header and file_header != layout.header:
+            values = dict(zip(layout.header, row))
+            row = tuple(values[column] for column in file_header)
+        writer.writerow(row)
+
+    def _is_duplicate(self, row: Tuple[Any, ...]) -> bool:
+        return self._deduplicator is not None and self._deduplicator.is_duplicate(row)
+
+    def _log_duplicates(self) -> None:
+        if self._deduplicator:
+            LOGGER.info('Dropped %i duplicate rows out of %i',
+                        self._deduplicator.duplicate_count, self._deduplicator.row_count)
 
     def _get_writer(self,
-                    csv_record_dict: Dict[str, Any],
-                    file_mapping: Dict[Any, DictWriter],
+                    header: List[str],
+                    file_mapping: Dict[Any, Any],
                     key: Any,
                     dir_path: str,
-                    file_suffix: str
-                    ) -> DictWriter:
+                    file_suffix: str,
+                    manifest_entry: Dict[str, Any]
+                    ) -> Any:
         """
-        Finds a writer based on csv record, key.
+        Finds a writer based on key.
         If writer does not exist, it's creates a csv writer and update the
-        mapping.
+        mapping. If the file of the writer was closed to bound open files, it's reopened in append mode.
 
-        :param csv_record_dict:
+        :param header:
         :param file_mapping:
         :param key:
         :param file_suffix:
+        :param manifest_entry: Describes the file in manifest. Header and row count are added to it.
         :return:
         """
         writer = file_mapping.get(key)
+        if writer and key in self._file_outs:
+            self._file_outs.move_to_end(key)
+            return writer
+
         if writer:
+            entry = self._manifest_entries[key]
+            LOGGER.debug('Reopening file for %s', key)
+            file_out = self._open_file(key, f'{entry["dir_path"]}/{entry["file_name"]}', 'a')
+            writer = csv.writer(file_out, quoting=csv.QUOTE_NONNUMERIC)
+            file_mapping[key] = writer
             return writer
 
         LOGGER.info('Creating file for %s', key)
 
-        file_out = open(f'{dir_path}/{file_suffix}.csv', 'w', encoding='utf8')
-        writer = csv.DictWriter(file_out, fieldnames=csv_record_dict.keys(),
-                                quoting=csv.QUOTE_NONNUMERIC)
+        if self._split_files:
+            part_number = self._part_numbers[key] = self._part_numbers.get(key, -1) + 1
+            file_suffix = f'{file_suffix}.part-{part_number:05d}'
 
-        def file_out_close() -> None:
-            LOGGER.info('Closing file IO %s', file_out)
-            file_out.close()
-        self._closer.register(file_out_close)
+        file_out = self._open_file(key, f'{dir_path}/{file_suffix}{self._file_extension}', 'w')
+        writer = csv.writer(file_out, quoting=csv.QUOTE_NONNUMERIC)
 
-        writer.writeheader()
+        writer.writerow(header)
         file_mapping[key] = writer
+        self._byte_counts[key] = _estimate_row_size(header)
+        self._manifest_entries[key] = dict(manifest_entry,
+                                           dir_path=dir_path,
+                                           file_name=f'{file_suffix}{self._file_extension}',
+                                           header=header,
+                                           row_count=0)
 
         return writer
 
+    def _open_file(self, key: Any, path: str, mode: str) -> IO:
+        """
+        Opens the file with WRITE_BUFFER_SIZE, closing the least recently written file if MAX_OPEN_FILES are open.
+        :param key:
+        :param path:
+        :param mode:
+        :return:
+        """
+        if len(self._file_outs) >= self._max_open_files:
+            # zstd stream writer has no file name, hence logging the key
+            lru_key, lru_file_out = self._file_outs.popitem(last=False)
+            LOGGER.debug('Closing least recently written file for %s', lru_key)
+            lru_file_out.close()
+
+        file_out = compressed_file.open_text(path, mode, buffering=self._write_buffer_size)
+        self._file_outs[key] = file_out
+        return file_out
+
+    def _close_files(self) -> None:
+        while self._file_outs:
+            _, file_out = self._file_outs.popitem(last=False)
+            LOGGER.info('Closing file IO %s', file_out)
+            file_out.close()
+
+    def _add_row(self, key: Any, row: Iterable[Any]) -> bool:
+        """
+        Counts the row written into the file part.
+        :param key:
+        :param row:
+        :return: True if the part is full
+        """
+        entry = self._manifest_entries[key]
+        entry['row_count'] += 1
+        if self._ready_file_queue and entry['row_count'] >= self._ready_file_row_count:
+            return True
+        if self._max_rows_per_file and entry['row_count'] >= self._max_rows_per_file:
+            return True
+        if self._max_bytes_per_file:
+            self._byte_counts[key] += _estimate_row_size(row)
+            return self._byte_counts[key] >= self._max_bytes_per_file
+        return False
+
+    def _complete_node_file(self, key: Any) -> None:
+        self._complete_file(key, self._node_file_mapping, ready_file_queue.NODE)
+
+    def _complete_relation_file(self, key: Any) -> None:
+        self._complete_file(key, self._relation_file_mapping, ready_file_queue.RELATION)
+
+    def _complete_file(self, key: Any, file_mapping: Dict[Any, Any], kind: str) -> None:
+        """
+        Closes the file part and puts it into ReadyFileQueue, if configured. Relation file parts are held until the
+        loader is closed. Next record with the same key starts a new part.
+        :param key:
+        :param file_mapping:
+        :param kind:
+        :return:
+        """
+        del file_mapping[key]
+        file_out = self._file_outs.pop(key, None)
+        if file_out:
+            file_out.close()
+        entry = self._manifest_entries.pop(key)
+        self._completed_manifest_entries.append(entry)
+
+        if not self._ready_file_queue:
+            return
+
+        manifest_entry = dict(entry)
+        path = os.path.join(manifest_entry.pop('dir_path'), manifest_entry.pop('file_name'))
+        if kind == ready_file_queue.RELATION:
+            self._held_relation_files.append((path, manifest_entry))
+            return
+
+        LOGGER.info('Handing over %s with %s rows', path, entry['row_count'])
+        self._ready_file_queue.put(kind, path, manifest_entry)
+
+    def _write_manifests(self) -> None:
+        """
+        Writes manifest of the files into node and relation directory.
+        :return:
+        """
+        manifests: Dict[str, Dict[str, Any]] = {self._node_dir: {}, self._relation_dir: {}}
+        for entry in self._completed_manifest_entries + list(self._manifest_entries.values()):
+            entry = dict(entry)
+            dir_path = entry.pop('dir_path')
+            manifests[dir_path][entry.pop('file_name')] = entry
+
+        for dir_path, manifest in manifests.items():
+            with open(f'{dir_path}/{MANIFEST_FILE_NAME}', 'w', encoding='utf8') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+
     def close(self) -> None:
         """
         Any closeable callable registered in _closer, it will close.
+        If a ReadyFileQueue is configured, remaining node file parts are handed over, followed by all relation file
+        parts, and the queue is closed so that the publisher finishes.
         :return:
         """
-        self._closer.close()
+        try:
+            if self._ready_file_queue:
+                for key in list(self._node_file_mapping):
+                    self._complete_node_file(key)
+                for key in list(self._relation_file_mapping):
+                    self._complete_relation_file(key)
+
+                LOGGER.info('Handing over %i relation files', len(self._held_relation_files))
+                for path, manifest_entry in self._held_relation_files:
+                    self._ready_file_queue.put(ready_file_queue.RELATION, path, manifest_entry)
+        finally:
+            # Files are closed even if handing over fails, e.g: as the publisher stopped
+            try:
+                self._closer.close()
+            finally:
+                if self._ready_file_queue:
+                    self._ready_file_queue.close()
 
     def get_scope(self) -> str:
         return "loader.filesystem_csv_neo4j"
 
-    def _make_key(self, record_dict: Dict[str, Any]) -> int:
+    def _make_key(self, header: Iterable[str]) -> int:
         """ Each unique set of record keys is assigned an increasing numeric key """
-        return self._keys.setdefault(frozenset(record_dict.keys()), len(self._keys))
+        return self._keys.setdefault(frozenset(header), len(self._keys))
+
+
+class _RowLayout(object):
+    """
+    Header of rows with the same label (or start label, end label and types), attribute names and types, and the file
+    they are written into.
+    """
+    __slots__ = ('key', 'header', 'file_suffix', 'manifest_entry')
+
+    def __init__(self, key: Any, header: List[str], file_suffix: str, manifest_entry: Dict[str, Any]) -> None:
+        self.key = key
+        self.header = header
+        self.file_suffix = file_suffix
+        self.manifest_entry = manifest_entry
+
+
+def _estimate_row_size(values: Iterable[Any]) -> int:
+    """ Approximate size of a CSV row, assuming every value is quoted """
+    return sum(len(str(value)) + 3 for value in values)
@@ -0,0 +1,242 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+from collections import OrderedDict
+from typing import (
+    Any, Dict, FrozenSet, List, Tuple,
+)
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.loader.file_system_neo4j_csv_loader import FsNeo4jCSVLoader
+from databuilder.models.graph_node import GraphNode
+from databuilder.models.graph_relationship import GraphRelationship
+from databuilder.models.graph_serializable import (
+    NODE_KEY, NODE_LABEL, RELATION_END_KEY, RELATION_END_LABEL, RELATION_REVERSE_TYPE, RELATION_START_KEY,
+    RELATION_START_LABEL, RELATION_TYPE, GraphSerializable,
+)
+from databuilder.utils.staging_files import PARQUET_EXTENSION
+
+LOGGER = logging.getLogger(__name__)
+
+# Columns with few distinct values relative to rows, or repeated across rows of a relation file
+DICTIONARY_COLUMNS = {NODE_LABEL, NODE_KEY, RELATION_START_LABEL, RELATION_START_KEY, RELATION_END_LABEL,
+                      RELATION_END_KEY, RELATION_TYPE, RELATION_REVERSE_TYPE}
+
+# Parquet type of each Python type of values. Values of other types are written as strings, same as in CSV.
+ARROW_TYPES = {
+    str: pa.string(),
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    type(None): pa.null()
+}
+
+
+class FsNeo4jParquetLoader(FsNeo4jCSVLoader):
+    """
+    Write node and relationship Parquet file(s) that can be consumed by Neo4jCsvPublisher, as an alternative to
+    FsNeo4jCSVLoader. Values keep their native types, so that columns are not suffixed with ':UNQUOTED', and
+    label and key columns are dictionary encoded.
+    Files are grouped the same way as FsNeo4jCSVLoader, and also by the types of values, as a column of a Parquet file
+    has one type. The schema of a file is given by the types of its first row rather than inferred from data, so that
+    a column that is None in every row stays a null column throughout the file. Files are described by the same
+    manifest. Rows of each file are buffered and written as a row group of ROW_GROUP_SIZE rows.
+    MAX_OPEN_FILES of FsNeo4jCSVLoader bounds open Parquet writers. As a Parquet file can't be appended to once closed,
+    the least recently written file is completed beyond it, and the next rows of it are written into a new part
+    (e.g: Column_0.part-00001.parquet).
+    READY_FILE_QUEUE, MAX_ROWS_PER_FILE, MAX_BYTES_PER_FILE and COMPRESSION of FsNeo4jCSVLoader are not supported, and
+    init raises ValueError if any of them is configured.
+
+    Requires pyarrow package (pip install amundsen-databuilder[parquet]).
+    """
+    # Config keys
+    ROW_GROUP_SIZE = 'row_group_size'
+    # Parquet compression codec, e.g: 'snappy', 'zstd', 'gzip' or 'none'
+    PARQUET_COMPRESSION = 'parquet_compression'
+
+    _DEFAULT_CONFIG = ConfigFactory.from_dict({
+        ROW_GROUP_SIZE: 10000,
+        PARQUET_COMPRESSION: 'snappy'
+    })
+
+    def __init__(self) -> None:
+        super(FsNeo4jParquetLoader, self).__init__()
+        # Buffered columns and schema of each file
+        self._buffers: Dict[Any, Dict[str, List[Any]]] = {}
+        self._schemas: Dict[Any, pa.Schema] = {}
+        # Open writers in least recently written order
+        self._writers: 'OrderedDict[Any, pq.ParquetWriter]' = OrderedDict()
+        self._typed_keys: Dict[FrozenSet[Tuple[str, type]], int] = {}
+
+    # Config keys of FsNeo4jCSVLoader that are not supported
+    UNSUPPORTED_KEYS = (FsNeo4jCSVLoader.READY_FILE_QUEUE, FsNeo4jCSVLoader.MAX_ROWS_PER_FILE,
+                        FsNeo4jCSVLoader.MAX_BYTES_PER_FILE, FsNeo4jCSVLoader.COMPRESSION)
+
+    def init(self, conf: ConfigTree) -> None:
+        unsupported_keys = [key for key in FsNeo4jParquetLoader.UNSUPPORTED_KEYS if key in conf]
+        if unsupported_keys:
+            raise ValueError(f'{unsupported_keys} are not supported by {self.__class__.__name__}')
+
+        conf = conf.with_fallback(FsNeo4jParquetLoader._DEFAULT_CONFIG)
+        super(FsNeo4jParquetLoader, self).init(conf)
+
+        self._row_group_size = conf.get_int(FsNeo4jParquetLoader.ROW_GROUP_SIZE)
+        self._parquet_compression = conf.get_string(FsNeo4jParquetLoader.PARQUET_COMPRESSION)
+
+        # Registered after manifest writer so that it runs before it
+        self._closer.register(self._close_writers)
+
+    def load(self, csv_serializable: GraphSerializable) -> None:
+        """
+        Buffers nodes and relations of the record into the file of their label (or start label, end label and type)
+        and set of properties.
+        :param csv_serializable:
+        :return:
+        """
+        for node in csv_serializable.iter_nodes():
+            node_dict = _node_to_dict(node)
+            key = (node.label, self._make_typed_key(node_dict))
+            if self._is_duplicate((key, tuple(node_dict.values()))):
+                continue
+
+            self._append(node_dict, key, self._node_dir, '{}_{}'.format(*key), manifest_entry={'labels': [node.label]})
+
+        for relation in csv_serializable.iter_relations():
+            relation_dict = _relation_to_dict(relation)
+            key2 = (relation.start_label,
+                    relation.end_label,
+                    relation.type,
+                    self._make_typed_key(relation_dict))
+            if self._is_duplicate((key2, tuple(relation_dict.values()))):
+                continue
+
+            self._append(relation_dict,
+                         key2,
+                         self._relation_dir,
+                         f'{key2[0]}_{key2[1]}_{key2[2]}',
+                         manifest_entry={'start_label': relation.start_label,
+                                         'end_label': relation.end_label,
+                                         'type': relation.type,
+                                         'reverse_type': relation.reverse_type})
+
+    def _append(self,
+                record_dict: Dict[str, Any],
+                key: Any,
+                dir_path: str,
+                file_name: str,
+                manifest_entry: Dict[str, Any]) -> None:
+        """
+        Appends the record to the buffer of its file, and writes the buffer as a row group once it's full.
+        :param record_dict:
+        :param key:
+        :param dir_path:
+        :param file_name: File name without extension
+        :param manifest_entry: Describes the file in manifest. Header and row count are added to it.
+        :return:
+        """
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            LOGGER.info('Creating file for %s', key)
+            buffer = self._buffers[key] = {column: [] for column in record_dict}
+            self._schemas[key] = pa.schema([(column, ARROW_TYPES.get(type(value), pa.string()))
+                                            for column, value in record_dict.items()])
+            part_number = self._part_numbers[key] = self._part_numbers.get(key, -1) + 1
+            if part_number:
+                file_name = f'{file_name}.part-{part_number:05d}'
+            self._manifest_entries[key] = dict(manifest_entry,
+                                               dir_path=dir_path,
+                                               file_name=f'{file_name}{PARQUET_EXTENSION}',
+                                               header=list(record_dict.keys()),
+                                               row_count=0)
+
+        for column, value in record_dict.items():
+            buffer[column].append(value if type(value) in ARROW_TYPES else str(value))
+
+        entry = self._manifest_entries[key]
+        entry['row_count'] += 1
+        if entry['row_count'] % self._row_group_size == 0:
+            self._write_row_group(key)
+
+    def _make_typed_key(self, record_dict: Dict[str, Any]) -> int:
+        """
+        Each unique set of record keys and types of their values is assigned an increasing numeric key
+        """
+        typed_header = frozenset((column, type(value)) for column, value in record_dict.items())
+        return self._typed_keys.setdefault(typed_header, len(self._typed_keys))
+
+    def _write_row_group(self, key: Any) -> None:
+        buffer = self._buffers[key]
+        if not next(iter(buffer.values())):
+            return
+
+        schema = self._schemas[key]
+        writer = self._writers.get(key)
+        if writer:
+            self._writers.move_to_end(key)
+        else:
+            if len(self._writers) >= self._max_open_files:
+                self._complete_parquet_file(next(iter(self._writers)))
+
+            entry = self._manifest_entries[key]
+            writer = pq.ParquetWriter(f'{entry["dir_path"]}/{entry["file_name"]}',
+                                      schema,
+                                      compression=self._parquet_compression,
+                                      use_dictionary=[column for column in schema.names
+                                                      if column in DICTIONARY_COLUMNS])
+            self._writers[key] = writer
+
+        writer.write_table(pa.Table.from_pydict(buffer, schema=schema))
+        for values in buffer.values():
+            values.clear()
+
+    def _complete_parquet_file(self, key: Any) -> None:
+        """
+        Writes the rows buffered for the file and closes it. Next record with the same key starts a new part.
+        :param key:
+        :return:
+        """
+        LOGGER.debug('Completing least recently written file for %s', key)
+        self._write_row_group(key)
+        self._writers.pop(key).close()
+        del self._buffers[key]
+        del self._schemas[key]
+        self._completed_manifest_entries.append(self._manifest_entries.pop(key))
+
+    def _close_writers(self) -> None:
+        for key in list(self._buffers):
+            # Opening a writer can complete another file, which then has no buffer
+            if key in self._buffers:
+                self._write_row_group(key)
+
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def get_scope(self) -> str:
+        return "loader.filesystem_parquet_neo4j"
+
+
+def _node_to_dict(node: GraphNode) -> Dict[str, Any]:
+    node_dict = {
+        NODE_LABEL: node.label,
+        NODE_KEY: node.key
+    }
+    node_dict.update(node.attributes)
+    return node_dict
+
+
+def _relation_to_dict(relation: GraphRelationship) -> Dict[str, Any]:
+    relation_dict = {
+        RELATION_START_KEY: relation.start_key,
+        RELATION_START_LABEL: relation.start_label,
+        RELATION_END_KEY: relation.end_key,
+        RELATION_END_LABEL: relation.end_label,
+        RELATION_TYPE: relation.type,
+        RELATION_REVERSE_TYPE: relation.reverse_type
+    }
+    relation_dict.update(relation.attributes)
+    return relation_dict
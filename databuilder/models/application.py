@@ -6,6 +6,7 @@ from typing import List, Union
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import TableMetadata
 
 
@@ -62,10 +63,7 @@ class Application(GraphSerializable):
 
     def get_table_model_key(self) -> str:
         # returns formatted string for table name
-        return TableMetadata.TABLE_KEY_FORMAT.format(db=self.database,
-                                                     schema=self.schema,
-                                                     tbl=self.table,
-                                                     cluster=self.cluster)
+        return get_table_key_builder(self.database, self.cluster, self.schema, self.table).table_key
 
     def get_application_model_key(self) -> str:
         # returns formatting string for application of type dag
@@ -2,7 +2,11 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import re
-from typing import List, Optional
+import sys
+from functools import lru_cache
+from typing import (
+    Any, List, Optional, Sequence,
+)
 
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
@@ -10,9 +14,23 @@ from databuilder.models.graph_serializable import GraphSerializable
 
 
 class Badge:
+    """
+    Badge is immutable, so that one instance can be shared by every entity that has the badge. Use get_badge to get
+    the shared instance.
+    """
+    __slots__ = ('name', 'category')
+    name: str
+    category: str
+
     def __init__(self, name: str, category: str):
-        self.name = name
-        self.category = category
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'category', sys.intern(category) if type(category) is str else category)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'Badge is immutable. Cannot set {name}')
+
+    def __reduce__(self) -> Any:
+        return Badge, (self.name, self.category)
 
     def __repr__(self) -> str:
         return f'Badge({self.name!r}, {self.category!r})'
@@ -23,6 +41,17 @@ class Badge:
         return self.name == other.name and \
             self.category == other.category
 
+    def __hash__(self) -> int:
+        return hash((self.name, self.category))
+
+
+@lru_cache(maxsize=4096)
+def get_badge(name: str, category: str) -> Badge:
+    """
+    :return: Badge instance shared by repeated badges of the same name and category
+    """
+    return Badge(name, category)
+
 
 class BadgeMetadata(GraphSerializable):
     """
@@ -39,7 +68,7 @@ class BadgeMetadata(GraphSerializable):
     def __init__(self,
                  start_label: str,  # Table, Dashboard, Column
                  start_key: str,
-                 badges: List[Badge],
+                 badges: Sequence[Badge],
                  ):
         self.badges = badges
 
@@ -8,6 +8,7 @@ from typing import (
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import TableMetadata
 from databuilder.models.usage.usage_constants import (
     READ_RELATION_COUNT_PROPERTY, READ_RELATION_TYPE, READ_REVERSE_RELATION_TYPE,
@@ -85,10 +86,7 @@ class ColumnUsageModel(GraphSerializable):
         return [relationship]
 
     def _get_table_key(self) -> str:
-        return TableMetadata.TABLE_KEY_FORMAT.format(db=self.database,
-                                                     cluster=self.cluster,
-                                                     schema=self.schema,
-                                                     tbl=self.table_name)
+        return get_table_key_builder(self.database, self.cluster, self.schema, self.table_name).table_key
 
     def _get_user_key(self, email: str) -> str:
         return User.get_user_model_key(email=email)
@@ -53,9 +53,6 @@ class DashboardMetadata(GraphSerializable):
     DASHBOARD_TAG_RELATION_TYPE = 'TAG'
     TAG_DASHBOARD_RELATION_TYPE = 'TAG_OF'
 
-    serialized_nodes: Set[Any] = set()
-    serialized_rels: Set[Any] = set()
-
     def __init__(self,
                  dashboard_group: str,
                  dashboard_name: str,
@@ -127,6 +124,9 @@ class DashboardMetadata(GraphSerializable):
         except StopIteration:
             return None
 
+    def get_node_iterator(self) -> Iterator[GraphNode]:
+        return self._node_iterator
+
     def _create_next_node(self) -> Iterator[GraphNode]:
         # Cluster node
         if not self._get_cluster_key() in self._processed_cluster:
@@ -216,6 +216,9 @@ class DashboardMetadata(GraphSerializable):
         except StopIteration:
             return None
 
+    def get_relation_iterator(self) -> Iterator[GraphRelationship]:
+        return self._relation_iterator
+
     def _create_next_relation(self) -> Iterator[GraphRelationship]:
         # Cluster <-> Dashboard group
         cluster_dashboard_group_relationship = GraphRelationship(
@@ -2,7 +2,9 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import abc
-from typing import Union  # noqa: F401
+from typing import (  # noqa: F401
+    Iterator, Set, Union,
+)
 
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
@@ -17,6 +19,11 @@ RELATION_END_LABEL = 'END_LABEL'
 RELATION_TYPE = 'TYPE'
 RELATION_REVERSE_TYPE = 'REVERSE_TYPE'
 
+# Labels and relation types that passed validation. Models only use a handful of them, so that they are validated once.
+_MAX_VALIDATED_VALUES = 10000
+_validated_labels: Set[str] = set()
+_validated_relation_types: Set[str] = set()
+
 
 class GraphSerializable(object, metaclass=abc.ABCMeta):
     """
@@ -24,6 +31,10 @@ class GraphSerializable(object, metaclass=abc.ABCMeta):
     next relation in dict form so that it can be serialized to CSV file.
 
     Any model class that needs to be pushed to a graph database should inherit this class.
+
+    Consumers can either call next_node and next_relation until they return None, or iterate iter_nodes and
+    iter_relations, which saves a call per record. Models that generate records with an iterator can also override
+    get_node_iterator and get_relation_iterator to return it.
     """
 
     def __init__(self) -> None:
@@ -49,6 +60,47 @@ class GraphSerializable(object, metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def get_node_iterator(self) -> Iterator[GraphNode]:
+        """
+        Creates an iterator of the remaining nodes. By default, it calls create_next_node until no more node.
+        :return:
+        """
+        node = self.create_next_node()
+        while node:
+            yield node
+            node = self.create_next_node()
+
+    def get_relation_iterator(self) -> Iterator[GraphRelationship]:
+        """
+        Creates an iterator of the remaining relations. By default, it calls create_next_relation until no more
+        relation.
+        :return:
+        """
+        relation = self.create_next_relation()
+        while relation:
+            yield relation
+            relation = self.create_next_relation()
+
+    def iter_nodes(self) -> Iterator[GraphNode]:
+        """
+        Iterates the remaining nodes, same as calling next_node until it returns None.
+        :return:
+        """
+        validate_node = self._validate_node
+        for node in self.get_node_iterator():
+            validate_node(node)
+            yield node
+
+    def iter_relations(self) -> Iterator[GraphRelationship]:
+        """
+        Iterates the remaining relations, same as calling next_relation until it returns None.
+        :return:
+        """
+        validate_relation = self._validate_relation
+        for relation in self.get_relation_iterator():
+            validate_relation(relation)
+            yield relation
+
     def next_node(self) -> Union[GraphNode, None]:
         node_dict = self.create_next_node()
         if not node_dict:
@@ -83,9 +135,19 @@ class GraphSerializable(object, metaclass=abc.ABCMeta):
         self._validate_relation_type_value(relation.reverse_type)
 
     def _validate_relation_type_value(self, value: str) -> None:
+        if value in _validated_relation_types:
+            return
+
         if not value.isupper():
             raise RuntimeError(f'TYPE needs to be upper case: {value}')
+        if len(_validated_relation_types) < _MAX_VALIDATED_VALUES:
+            _validated_relation_types.add(value)
 
     def _validate_label_value(self, value: str) -> None:
+        if value in _validated_labels:
+            return
+
         if not value.istitle():
             raise RuntimeError(f'LABEL should only have upper case character on its first one: {value}')
+        if len(_validated_labels) < _MAX_VALIDATED_VALUES:
+            _validated_labels.add(value)
@@ -8,6 +8,7 @@ from typing import (
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import TableMetadata
 from databuilder.models.user import User
 
@@ -97,10 +98,10 @@ class TableColumnUsage(GraphSerializable):
             yield relationship
 
     def _get_table_key(self, col_reader: ColumnReader) -> str:
-        return TableMetadata.TABLE_KEY_FORMAT.format(db=col_reader.database,
-                                                     cluster=col_reader.cluster,
-                                                     schema=col_reader.schema,
-                                                     tbl=col_reader.table)
+        return get_table_key_builder(col_reader.database,
+                                     col_reader.cluster,
+                                     col_reader.schema,
+                                     col_reader.table).table_key
 
     def _get_user_key(self, email: str) -> str:
         return User.get_user_model_key(email=email)
@@ -0,0 +1,53 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+from functools import lru_cache
+from typing import Any
+
+
+def _intern(value: str) -> str:
+    return sys.intern(value) if type(value) is str else value
+
+
+class TableKeyBuilder(object):
+    """
+    Builds keys of a table and of the entities under it (columns, descriptions, stats, watermarks, ...), such as
+    hive://gold.test_schema/test_table/test_column. Database, cluster, schema and table keys are computed once, and
+    keys under the table are derived from the table key by concatenation. Database, cluster and schema keys are
+    interned, as they are shared by many tables.
+    Keys are the same as formatting TableMetadata.TABLE_KEY_FORMAT, ColumnMetadata.COLUMN_KEY_FORMAT and others.
+    Use get_table_key_builder to share a builder among models of the same table.
+    """
+    __slots__ = ('database_key', 'cluster_key', 'schema_key', 'table_key')
+
+    def __init__(self,
+                 database: Any,
+                 cluster: Any,
+                 schema: Any,
+                 table: Any) -> None:
+        self.database_key = _intern(f'database://{database}')
+        self.cluster_key = _intern(f'{database}://{cluster}')
+        self.schema_key = _intern(f'{self.cluster_key}.{schema}')
+        self.table_key = f'{self.schema_key}/{table}'
+
+    def get_column_key(self, column: Any) -> str:
+        return f'{self.table_key}/{column}'
+
+    def get_table_child_key(self, suffix: Any) -> str:
+        """
+        :param suffix: Path under the table key, e.g. '_description', 'timestamp' or '{column}/{stat_name}/'
+        :return: Key of an entity under the table
+        """
+        return f'{self.table_key}/{suffix}'
+
+
+@lru_cache(maxsize=4096)
+def get_table_key_builder(database: Any,
+                          cluster: Any,
+                          schema: Any,
+                          table: Any) -> TableKeyBuilder:
+    """
+    :return: TableKeyBuilder of the table, shared by models of the same table
+    """
+    return TableKeyBuilder(database, cluster, schema, table)
@@ -6,6 +6,7 @@ from typing import List, Union
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import TableMetadata
 from databuilder.models.timestamp import timestamp_constants
 
@@ -55,17 +56,12 @@ class TableLastUpdated(GraphSerializable):
 
     def get_table_model_key(self) -> str:
         # returns formatted string for table name
-        return TableMetadata.TABLE_KEY_FORMAT.format(db=self.db,
-                                                     cluster=self.cluster,
-                                                     schema=self.schema,
-                                                     tbl=self.table_name)
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table_name).table_key
 
     def get_last_updated_model_key(self) -> str:
         # returns formatted string for last updated name
-        return TableLastUpdated.LAST_UPDATED_KEY_FORMAT.format(db=self.db,
-                                                               cluster=self.cluster,
-                                                               schema=self.schema,
-                                                               tbl=self.table_name)
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table_name) \
+            .get_table_child_key('timestamp')
 
     def create_nodes(self) -> List[GraphNode]:
         """
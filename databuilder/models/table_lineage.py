@@ -7,6 +7,7 @@ from typing import List, Union
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import TableMetadata
 
 
@@ -55,7 +56,7 @@ class TableLineage(GraphSerializable):
                             schema: str,
                             table: str
                             ) -> str:
-        return f'{db}://{cluster}.{schema}/{table}'
+        return get_table_key_builder(db, cluster, schema, table).table_key
 
     def create_nodes(self) -> List[Union[GraphNode, None]]:
         """
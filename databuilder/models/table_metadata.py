@@ -2,16 +2,22 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import copy
+import sys
+from functools import lru_cache
 from typing import (
-    Any, Dict, Iterable, Iterator, List, Optional, Set, Union,
+    Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union,
 )
 
-from databuilder.models.badge import Badge, BadgeMetadata
+from databuilder.models.badge import (
+    Badge, BadgeMetadata, get_badge,
+)
 from databuilder.models.cluster import cluster_constants
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
 from databuilder.models.schema import schema_constant
+from databuilder.models.table_key_builder import TableKeyBuilder, get_table_key_builder
+from databuilder.utils.key_registry import get_key_registry
 
 DESCRIPTION_NODE_LABEL_VAL = 'Description'
 DESCRIPTION_NODE_LABEL = DESCRIPTION_NODE_LABEL_VAL
@@ -79,6 +85,12 @@ class TagMetadata(GraphSerializable):
 
 # TODO: this should inherit from ProgrammaticDescription in amundsen-common
 class DescriptionMetadata:
+    """
+    DescriptionMetadata is not modified once created, so that create_description_metadata can share one instance among
+    entities with the same description, e.g. columns that are repeated across tables.
+    """
+    __slots__ = ('_source', '_text', '_label')
+
     DESCRIPTION_NODE_LABEL = DESCRIPTION_NODE_LABEL_VAL
     PROGRAMMATIC_DESCRIPTION_NODE_LABEL = 'Programmatic_Description'
     DESCRIPTION_KEY_FORMAT = '{description}'
@@ -115,10 +127,8 @@ class DescriptionMetadata:
         if text is None:
             return None
         if not source:
-            description_node = DescriptionMetadata(text=text, source=DescriptionMetadata.DEFAULT_SOURCE)
-        else:
-            description_node = DescriptionMetadata(text=text, source=source)
-        return description_node
+            source = DescriptionMetadata.DEFAULT_SOURCE
+        return _get_description_metadata(text, source)
 
     def get_description_id(self) -> str:
         if self._source == self.DEFAULT_SOURCE:
@@ -153,7 +163,14 @@ class DescriptionMetadata:
         return relationship
 
 
+@lru_cache(maxsize=4096)
+def _get_description_metadata(text: str, source: str) -> DescriptionMetadata:
+    return DescriptionMetadata(text=text, source=sys.intern(source))
+
+
 class ColumnMetadata:
+    __slots__ = ('name', 'description', 'type', 'sort_order', 'badges')
+
     COLUMN_NODE_LABEL = 'Column'
     COLUMN_KEY_FORMAT = '{db}://{cluster}.{schema}/{tbl}/{col}'
     COLUMN_NAME = 'name'
@@ -180,10 +197,12 @@ class ColumnMetadata:
         self.name = name
         self.description = DescriptionMetadata.create_description_metadata(source=None,
                                                                            text=description)
-        self.type = col_type
+        # Column types repeat across columns, and are kept once
+        self.type = sys.intern(col_type) if type(col_type) is str else col_type
         self.sort_order = sort_order
         formatted_badges = _format_as_list(badges)
-        self.badges = [Badge(badge, 'column') for badge in formatted_badges]
+        self.badges: Sequence[Badge] = [get_badge(badge, 'column') for badge in formatted_badges] \
+            if formatted_badges else ()
 
     def __repr__(self) -> str:
         return f'ColumnMetadata({self.name!r}, {self.description!r}, {self.type!r}, ' \
@@ -229,10 +248,6 @@ class TableMetadata(GraphSerializable):
     TABLE_TAG_RELATION_TYPE = 'TAGGED_BY'
     TAG_TABLE_RELATION_TYPE = 'TAG'
 
-    # Only for deduping database, cluster, and schema (table and column will be always processed)
-    serialized_nodes_keys: Set[Any] = set()
-    serialized_rels_keys: Set[Any] = set()
-
     def __init__(self,
                  database: str,
                  cluster: str,
@@ -278,48 +293,32 @@ class TableMetadata(GraphSerializable):
         return f'TableMetadata({self.database!r}, {self.cluster!r}, {self.schema!r}, {self.name!r} ' \
                f'{self.description!r}, {self.columns!r}, {self.is_view!r}, {self.tags!r})'
 
+    def _get_key_builder(self) -> TableKeyBuilder:
+        # Looked up rather than kept, as transformers may change the table after it's created
+        return get_table_key_builder(self.database, self.cluster, self.schema, self.name)
+
     def _get_table_key(self) -> str:
-        return TableMetadata.TABLE_KEY_FORMAT.format(db=self.database,
-                                                     cluster=self.cluster,
-                                                     schema=self.schema,
-                                                     tbl=self.name)
+        return self._get_key_builder().table_key
 
     def _get_table_description_key(self, description: DescriptionMetadata) -> str:
-        return TableMetadata.TABLE_DESCRIPTION_FORMAT.format(db=self.database,
-                                                             cluster=self.cluster,
-                                                             schema=self.schema,
-                                                             tbl=self.name,
-                                                             description_id=description.get_description_id())
+        return self._get_key_builder().get_table_child_key(description.get_description_id())
 
     def _get_database_key(self) -> str:
-        return TableMetadata.DATABASE_KEY_FORMAT.format(db=self.database)
+        return self._get_key_builder().database_key
 
     def _get_cluster_key(self) -> str:
-        return TableMetadata.CLUSTER_KEY_FORMAT.format(db=self.database,
-                                                       cluster=self.cluster)
+        return self._get_key_builder().cluster_key
 
     def _get_schema_key(self) -> str:
-        return TableMetadata.SCHEMA_KEY_FORMAT.format(db=self.database,
-                                                      cluster=self.cluster,
-                                                      schema=self.schema)
+        return self._get_key_builder().schema_key
 
     def _get_col_key(self, col: ColumnMetadata) -> str:
-        return ColumnMetadata.COLUMN_KEY_FORMAT.format(db=self.database,
-                                                       cluster=self.cluster,
-                                                       schema=self.schema,
-                                                       tbl=self.name,
-                                                       col=col.name,
-                                                       badges=col.badges)
+        return self._get_key_builder().get_column_key(col.name)
 
     def _get_col_description_key(self,
                                  col: ColumnMetadata,
                                  description: DescriptionMetadata) -> str:
-        return ColumnMetadata.COLUMN_DESCRIPTION_FORMAT.format(db=self.database,
-                                                               cluster=self.cluster,
-                                                               schema=self.schema,
-                                                               tbl=self.name,
-                                                               col=col.name,
-                                                               description_id=description.get_description_id())
+        return f'{self._get_col_key(col)}/{description.get_description_id()}'
 
     @staticmethod
     def format_tags(tags: Union[List, str, None]) -> List:
@@ -331,6 +330,9 @@ class TableMetadata(GraphSerializable):
         except StopIteration:
             return None
 
+    def get_node_iterator(self) -> Iterator[GraphNode]:
+        return self._node_iterator
+
     def _create_next_node(self) -> Iterator[GraphNode]:
         yield self._create_table_node()
 
@@ -343,9 +345,11 @@ class TableMetadata(GraphSerializable):
             for tag in self.tags:
                 yield TagMetadata.create_tag_node(tag)
 
+        key_builder = self._get_key_builder()
         for col in self.columns:
+            col_key = key_builder.get_column_key(col.name)
             column_node = GraphNode(
-                key=self._get_col_key(col),
+                key=col_key,
                 label=ColumnMetadata.COLUMN_NODE_LABEL,
                 attributes={
                     ColumnMetadata.COLUMN_NAME: col.name,
@@ -356,13 +360,13 @@ class TableMetadata(GraphSerializable):
             yield column_node
 
             if col.description:
-                node_key = self._get_col_description_key(col, col.description)
+                node_key = f'{col_key}/{col.description.get_description_id()}'
                 yield col.description.get_node(node_key)
 
             if col.badges:
                 col_badge_metadata = BadgeMetadata(
                     start_label=ColumnMetadata.COLUMN_NODE_LABEL,
-                    start_key=self._get_col_key(col),
+                    start_key=col_key,
                     badges=col.badges)
                 for node in col_badge_metadata.create_nodes():
                     yield node
@@ -370,21 +374,21 @@ class TableMetadata(GraphSerializable):
         # Database, cluster, schema
         others = [
             GraphNode(
-                key=self._get_database_key(),
+                key=key_builder.database_key,
                 label=TableMetadata.DATABASE_NODE_LABEL,
                 attributes={
                     'name': self.database
                 }
             ),
             GraphNode(
-                key=self._get_cluster_key(),
+                key=key_builder.cluster_key,
                 label=TableMetadata.CLUSTER_NODE_LABEL,
                 attributes={
                     'name': self.cluster
                 }
             ),
             GraphNode(
-                key=self._get_schema_key(),
+                key=key_builder.schema_key,
                 label=TableMetadata.SCHEMA_NODE_LABEL,
                 attributes={
                     'name': self.schema
@@ -392,9 +396,10 @@ class TableMetadata(GraphSerializable):
             )
         ]
 
+        # Database, cluster and schema are deduped across records of the job run (table and column are always processed)
+        key_registry = get_key_registry()
         for node_tuple in others:
-            if node_tuple.key not in TableMetadata.serialized_nodes_keys:
-                TableMetadata.serialized_nodes_keys.add(node_tuple.key)
+            if key_registry.add((node_tuple.label, node_tuple.key)):
                 yield node_tuple
 
     def _create_table_node(self) -> GraphNode:
@@ -419,11 +424,16 @@ class TableMetadata(GraphSerializable):
         except StopIteration:
             return None
 
+    def get_relation_iterator(self) -> Iterator[GraphRelationship]:
+        return self._relation_iterator
+
     def _create_next_relation(self) -> Iterator[GraphRelationship]:
+        key_builder = self._get_key_builder()
+        table_key = key_builder.table_key
         schema_table_relationship = GraphRelationship(
-            start_key=self._get_schema_key(),
+            start_key=key_builder.schema_key,
             start_label=TableMetadata.SCHEMA_NODE_LABEL,
-            end_key=self._get_table_key(),
+            end_key=table_key,
             end_label=TableMetadata.TABLE_NODE_LABEL,
             type=TableMetadata.SCHEMA_TABLE_RELATION_TYPE,
             reverse_type=TableMetadata.TABLE_SCHEMA_RELATION_TYPE,
@@ -433,14 +443,14 @@ class TableMetadata(GraphSerializable):
 
         if self.description:
             yield self.description.get_relation(TableMetadata.TABLE_NODE_LABEL,
-                                                self._get_table_key(),
+                                                table_key,
                                                 self._get_table_description_key(self.description))
 
         if self.tags:
             for tag in self.tags:
                 tag_relationship = GraphRelationship(
                     start_label=TableMetadata.TABLE_NODE_LABEL,
-                    start_key=self._get_table_key(),
+                    start_key=table_key,
                     end_label=TagMetadata.TAG_NODE_LABEL,
                     end_key=TagMetadata.get_tag_key(tag),
                     type=TableMetadata.TABLE_TAG_RELATION_TYPE,
@@ -450,11 +460,12 @@ class TableMetadata(GraphSerializable):
                 yield tag_relationship
 
         for col in self.columns:
+            col_key = key_builder.get_column_key(col.name)
             column_relationship = GraphRelationship(
                 start_label=TableMetadata.TABLE_NODE_LABEL,
-                start_key=self._get_table_key(),
+                start_key=table_key,
                 end_label=ColumnMetadata.COLUMN_NODE_LABEL,
-                end_key=self._get_col_key(col),
+                end_key=col_key,
                 type=TableMetadata.TABLE_COL_RELATION_TYPE,
                 reverse_type=TableMetadata.COL_TABLE_RELATION_TYPE,
                 attributes={}
@@ -464,13 +475,13 @@ class TableMetadata(GraphSerializable):
             if col.description:
                 yield col.description.get_relation(
                     ColumnMetadata.COLUMN_NODE_LABEL,
-                    self._get_col_key(col),
-                    self._get_col_description_key(col, col.description)
+                    col_key,
+                    f'{col_key}/{col.description.get_description_id()}'
                 )
 
             if col.badges:
                 badge_metadata = BadgeMetadata(start_label=ColumnMetadata.COLUMN_NODE_LABEL,
-                                               start_key=self._get_col_key(col),
+                                               start_key=col_key,
                                                badges=col.badges)
                 badge_relations = badge_metadata.create_relation()
                 for relation in badge_relations:
@@ -480,8 +491,8 @@ class TableMetadata(GraphSerializable):
             GraphRelationship(
                 start_label=TableMetadata.DATABASE_NODE_LABEL,
                 end_label=TableMetadata.CLUSTER_NODE_LABEL,
-                start_key=self._get_database_key(),
-                end_key=self._get_cluster_key(),
+                start_key=key_builder.database_key,
+                end_key=key_builder.cluster_key,
                 type=TableMetadata.DATABASE_CLUSTER_RELATION_TYPE,
                 reverse_type=TableMetadata.CLUSTER_DATABASE_RELATION_TYPE,
                 attributes={}
@@ -489,15 +500,15 @@ class TableMetadata(GraphSerializable):
             GraphRelationship(
                 start_label=TableMetadata.CLUSTER_NODE_LABEL,
                 end_label=TableMetadata.SCHEMA_NODE_LABEL,
-                start_key=self._get_cluster_key(),
-                end_key=self._get_schema_key(),
+                start_key=key_builder.cluster_key,
+                end_key=key_builder.schema_key,
                 type=TableMetadata.CLUSTER_SCHEMA_RELATION_TYPE,
                 reverse_type=TableMetadata.SCHEMA_CLUSTER_RELATION_TYPE,
                 attributes={}
             )
         ]
 
+        key_registry = get_key_registry()
         for rel_tuple in others:
-            if (rel_tuple.start_key, rel_tuple.end_key, rel_tuple.type) not in TableMetadata.serialized_rels_keys:
-                TableMetadata.serialized_rels_keys.add((rel_tuple.start_key, rel_tuple.end_key, rel_tuple.type))
+            if key_registry.add((rel_tuple.start_key, rel_tuple.end_key, rel_tuple.type)):
                 yield rel_tuple
@@ -0,0 +1,269 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+from typing import (
+    Any, Iterator, List, Optional, Tuple, Union,
+)
+
+import pandas
+
+from databuilder.models.graph_node import GraphNode
+from databuilder.models.graph_relationship import GraphRelationship
+from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_metadata import (
+    ColumnMetadata, DescriptionMetadata, TableMetadata,
+)
+from databuilder.utils.key_registry import get_key_registry
+
+# Key suffix of a description of DescriptionMetadata.DEFAULT_SOURCE
+_DESCRIPTION_KEY_SUFFIX = '/_description'
+
+
+class TableMetadataBatch(GraphSerializable):
+    """
+    Columnar alternative to TableMetadata for extractors that fetch columns of many tables in bulk. Columns of the
+    batch are held in a pandas DataFrame with one row per column, and keys of the whole batch are concatenated with
+    pandas string operations over its columns, instead of building a TableMetadata and ColumnMetadata objects per
+    table.
+
+    It emits the same nodes and relations as a TableMetadata per table would, grouped by kind rather than by table:
+    Table, Description, Column, and deduped Database, Cluster and Schema nodes, along with the relations between
+    them. Table level values (table description and is_view) are taken from the first row of each table.
+    Tags, badges, description sources and additional table attributes are not supported; use TableMetadata for them.
+    """
+    # DataFrame columns
+    DATABASE = 'database'
+    CLUSTER = 'cluster'
+    SCHEMA = 'schema'
+    TABLE = 'table'
+    COLUMN_NAME = 'column_name'
+    COLUMN_TYPE = 'column_type'
+    SORT_ORDER = 'sort_order'
+    # Optional DataFrame columns
+    COLUMN_DESCRIPTION = 'column_description'
+    TABLE_DESCRIPTION = 'table_description'
+    IS_VIEW = 'is_view'
+
+    REQUIRED_COLUMNS = [DATABASE, CLUSTER, SCHEMA, TABLE, COLUMN_NAME, COLUMN_TYPE, SORT_ORDER]
+
+    def __init__(self, columns: pandas.DataFrame) -> None:
+        """
+        :param columns: DataFrame with a row per column, with REQUIRED_COLUMNS and optionally COLUMN_DESCRIPTION,
+        TABLE_DESCRIPTION and IS_VIEW. Rows of a table don't need to be adjacent.
+        """
+        missing_columns = [column for column in TableMetadataBatch.REQUIRED_COLUMNS if column not in columns]
+        if missing_columns:
+            raise ValueError(f'Missing columns {missing_columns} in TableMetadataBatch')
+
+        self._columns = columns.reset_index(drop=True)
+        self._keys: Optional[_BatchKeys] = None
+        self._node_iterator = self._create_next_node()
+        self._relation_iterator = self._create_next_relation()
+
+    def __repr__(self) -> str:
+        return f'TableMetadataBatch({len(self._columns)} columns)'
+
+    def create_next_node(self) -> Union[GraphNode, None]:
+        try:
+            return next(self._node_iterator)
+        except StopIteration:
+            return None
+
+    def get_node_iterator(self) -> Iterator[GraphNode]:
+        return self._node_iterator
+
+    def create_next_relation(self) -> Union[GraphRelationship, None]:
+        try:
+            return next(self._relation_iterator)
+        except StopIteration:
+            return None
+
+    def get_relation_iterator(self) -> Iterator[GraphRelationship]:
+        return self._relation_iterator
+
+    def _get_keys(self) -> '_BatchKeys':
+        # Shared by node and relation generation, and computed once they start so that the DataFrame can be changed
+        # until then
+        if self._keys is None:
+            self._keys = _BatchKeys(self._columns)
+        return self._keys
+
+    def _create_next_node(self) -> Iterator[GraphNode]:
+        keys = self._get_keys()
+        tables = keys.tables
+        # tolist converts numpy scalars into Python values, so that they are serialized as TableMetadata's values
+        is_view = tables[TableMetadataBatch.IS_VIEW].tolist() if TableMetadataBatch.IS_VIEW in tables \
+            else [False] * len(tables)
+        for table_key, name, view in zip(keys.table_keys, tables[TableMetadataBatch.TABLE].tolist(), is_view):
+            yield GraphNode(
+                key=table_key,
+                label=TableMetadata.TABLE_NODE_LABEL,
+                attributes={
+                    TableMetadata.TABLE_NAME: name,
+                    TableMetadata.IS_VIEW: view
+                }
+            )
+
+        table_descriptions = _get_descriptions(keys.table_keys, tables, TableMetadataBatch.TABLE_DESCRIPTION)
+        for _, description_key, text in table_descriptions:
+            yield _create_description_node(description_key, text)
+
+        for column_key, name, column_type, sort_order in zip(keys.column_keys,
+                                                             self._columns[TableMetadataBatch.COLUMN_NAME].tolist(),
+                                                             self._columns[TableMetadataBatch.COLUMN_TYPE].tolist(),
+                                                             self._columns[TableMetadataBatch.SORT_ORDER].tolist()):
+            yield GraphNode(
+                key=column_key,
+                label=ColumnMetadata.COLUMN_NODE_LABEL,
+                attributes={
+                    ColumnMetadata.COLUMN_NAME: name,
+                    ColumnMetadata.COLUMN_TYPE: column_type,
+                    ColumnMetadata.COLUMN_ORDER: sort_order
+                }
+            )
+
+        column_descriptions = _get_descriptions(keys.column_keys, self._columns, TableMetadataBatch.COLUMN_DESCRIPTION)
+        for _, description_key, text in column_descriptions:
+            yield _create_description_node(description_key, text)
+
+        # Database, cluster and schema are deduped across records of the job run, same as TableMetadata
+        key_registry = get_key_registry()
+        schemas = keys.schemas
+        for label, schema_keys, names in (
+                (TableMetadata.DATABASE_NODE_LABEL, keys.database_keys, schemas[TableMetadataBatch.DATABASE]),
+                (TableMetadata.CLUSTER_NODE_LABEL, keys.cluster_keys, schemas[TableMetadataBatch.CLUSTER]),
+                (TableMetadata.SCHEMA_NODE_LABEL, keys.schema_keys, schemas[TableMetadataBatch.SCHEMA])):
+            for key, name in zip(schema_keys, names.tolist()):
+                if key_registry.add((label, key)):
+                    yield GraphNode(key=key, label=label, attributes={'name': name})
+
+    def _create_next_relation(self) -> Iterator[GraphRelationship]:
+        keys = self._get_keys()
+        for schema_key, table_key in zip(keys.table_schema_keys, keys.table_keys):
+            yield GraphRelationship(
+                start_key=schema_key,
+                start_label=TableMetadata.SCHEMA_NODE_LABEL,
+                end_key=table_key,
+                end_label=TableMetadata.TABLE_NODE_LABEL,
+                type=TableMetadata.SCHEMA_TABLE_RELATION_TYPE,
+                reverse_type=TableMetadata.TABLE_SCHEMA_RELATION_TYPE,
+                attributes={}
+            )
+
+        table_descriptions = _get_descriptions(keys.table_keys, keys.tables, TableMetadataBatch.TABLE_DESCRIPTION)
+        for table_key, description_key, _ in table_descriptions:
+            yield _create_description_relation(TableMetadata.TABLE_NODE_LABEL, table_key, description_key)
+
+        for table_key, column_key in zip(keys.column_table_keys, keys.column_keys):
+            yield GraphRelationship(
+                start_label=TableMetadata.TABLE_NODE_LABEL,
+                start_key=table_key,
+                end_label=ColumnMetadata.COLUMN_NODE_LABEL,
+                end_key=column_key,
+                type=TableMetadata.TABLE_COL_RELATION_TYPE,
+                reverse_type=TableMetadata.COL_TABLE_RELATION_TYPE,
+                attributes={}
+            )
+
+        column_descriptions = _get_descriptions(keys.column_keys, self._columns, TableMetadataBatch.COLUMN_DESCRIPTION)
+        for column_key, description_key, _ in column_descriptions:
+            yield _create_description_relation(ColumnMetadata.COLUMN_NODE_LABEL, column_key, description_key)
+
+        key_registry = get_key_registry()
+        for start_label, end_label, start_keys, end_keys, relation_type, reverse_type in (
+                (TableMetadata.DATABASE_NODE_LABEL, TableMetadata.CLUSTER_NODE_LABEL,
+                 keys.database_keys, keys.cluster_keys,
+                 TableMetadata.DATABASE_CLUSTER_RELATION_TYPE, TableMetadata.CLUSTER_DATABASE_RELATION_TYPE),
+                (TableMetadata.CLUSTER_NODE_LABEL, TableMetadata.SCHEMA_NODE_LABEL,
+                 keys.cluster_keys, keys.schema_keys,
+                 TableMetadata.CLUSTER_SCHEMA_RELATION_TYPE, TableMetadata.SCHEMA_CLUSTER_RELATION_TYPE)):
+            for start_key, end_key in zip(start_keys, end_keys):
+                if key_registry.add((start_key, end_key, relation_type)):
+                    yield GraphRelationship(
+                        start_label=start_label,
+                        end_label=end_label,
+                        start_key=start_key,
+                        end_key=end_key,
+                        type=relation_type,
+                        reverse_type=reverse_type,
+                        attributes={}
+                    )
+
+
+class _BatchKeys(object):
+    """
+    Keys of tables, columns and schemas of a batch, the same as TableKeyBuilder builds one at a time.
+    """
+
+    def __init__(self, columns: pandas.DataFrame) -> None:
+        table_columns = [TableMetadataBatch.DATABASE, TableMetadataBatch.CLUSTER, TableMetadataBatch.SCHEMA,
+                         TableMetadataBatch.TABLE]
+        self.tables = columns.drop_duplicates(subset=table_columns)
+        self.schemas = self.tables.drop_duplicates(subset=table_columns[:-1])
+
+        _, _, table_schema_keys, table_keys = _build_keys(self.tables)
+        database_keys, cluster_keys, schema_keys, _ = _build_keys(self.schemas)
+        _, _, _, column_table_keys = _build_keys(columns)
+        column_keys = column_table_keys.str.cat(columns[TableMetadataBatch.COLUMN_NAME].astype(str), sep='/')
+
+        # Lists are cheaper to iterate than Series, and each of them is iterated while generating nodes and relations
+        self.table_schema_keys: List[str] = table_schema_keys.tolist()
+        self.table_keys: List[str] = table_keys.tolist()
+        self.database_keys: List[str] = database_keys.tolist()
+        self.cluster_keys: List[str] = cluster_keys.tolist()
+        self.schema_keys: List[str] = schema_keys.tolist()
+        self.column_table_keys: List[str] = column_table_keys.tolist()
+        self.column_keys: List[str] = column_keys.tolist()
+
+
+def _build_keys(frame: pandas.DataFrame) -> Tuple[pandas.Series, pandas.Series, pandas.Series, pandas.Series]:
+    """
+    Concatenates key parts over whole columns, the same as the key formats of TableMetadata.
+    :param frame: Rows with database, cluster, schema and table
+    :return: Database, cluster, schema and table keys of the rows
+    """
+    databases = frame[TableMetadataBatch.DATABASE].astype(str)
+    cluster_keys = databases.str.cat(frame[TableMetadataBatch.CLUSTER].astype(str), sep='://')
+    schema_keys = cluster_keys.str.cat(frame[TableMetadataBatch.SCHEMA].astype(str), sep='.')
+    table_keys = schema_keys.str.cat(frame[TableMetadataBatch.TABLE].astype(str), sep='/')
+    return 'database://' + databases, cluster_keys, schema_keys, table_keys
+
+
+def _get_descriptions(keys: List[str],
+                      frame: pandas.DataFrame,
+                      column: str) -> Iterator[Tuple[str, str, Any]]:
+    """
+    :param keys: Keys of the rows in the frame
+    :param frame:
+    :param column: Description column of the frame
+    :return: Key, description key and description of rows that have a description
+    """
+    if column not in frame:
+        return iter([])
+
+    return ((key, key + _DESCRIPTION_KEY_SUFFIX, description)
+            for key, description, has_description
+            in zip(keys, frame[column].tolist(), frame[column].notnull().tolist()) if has_description)
+
+
+def _create_description_node(key: str, text: str) -> GraphNode:
+    return GraphNode(
+        key=key,
+        label=DescriptionMetadata.DESCRIPTION_NODE_LABEL,
+        attributes={
+            DescriptionMetadata.DESCRIPTION_SOURCE: DescriptionMetadata.DEFAULT_SOURCE,
+            DescriptionMetadata.DESCRIPTION_TEXT: text
+        }
+    )
+
+
+def _create_description_relation(start_label: str, start_key: str, description_key: str) -> GraphRelationship:
+    return GraphRelationship(
+        start_label=start_label,
+        start_key=start_key,
+        end_label=DescriptionMetadata.DESCRIPTION_NODE_LABEL,
+        end_key=description_key,
+        type=DescriptionMetadata.DESCRIPTION_RELATION_TYPE,
+        reverse_type=DescriptionMetadata.INVERSE_DESCRIPTION_RELATION_TYPE,
+        attributes={}
+    )
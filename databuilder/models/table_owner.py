@@ -9,6 +9,7 @@ from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
 from databuilder.models.owner_constants import OWNER_OF_OBJECT_RELATION_TYPE, OWNER_RELATION_TYPE
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.user import User
 
 
@@ -54,7 +55,7 @@ class TableOwner(GraphSerializable):
         return User.USER_NODE_KEY_FORMAT.format(email=owner)
 
     def get_metadata_model_key(self) -> str:
-        return f'{self.db}://{self.cluster}.{self.schema}/{self.table}'
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table).table_key
 
     def create_nodes(self) -> List[GraphNode]:
         """
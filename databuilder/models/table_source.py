@@ -6,6 +6,7 @@ from typing import List, Optional
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import TableMetadata
 
 
@@ -51,13 +52,10 @@ class TableSource(GraphSerializable):
             return None
 
     def get_source_model_key(self) -> str:
-        return TableSource.KEY_FORMAT.format(db=self.db,
-                                             cluster=self.cluster,
-                                             schema=self.schema,
-                                             tbl=self.table)
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table).get_table_child_key('_source')
 
     def get_metadata_model_key(self) -> str:
-        return f'{self.db}://{self.cluster}.{self.schema}/{self.table}'
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table).table_key
 
     def create_nodes(self) -> List[GraphNode]:
         """
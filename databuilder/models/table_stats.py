@@ -5,6 +5,7 @@ from typing import List, Optional
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 from databuilder.models.table_metadata import ColumnMetadata
 
 
@@ -59,20 +60,12 @@ class TableColumnStats(GraphSerializable):
             return None
 
     def get_table_stat_model_key(self) -> str:
-        return TableColumnStats.KEY_FORMAT.format(db=self.db,
-                                                  cluster=self.cluster,
-                                                  schema=self.schema,
-                                                  table=self.table,
-                                                  col=self.col_name,
-                                                  stat_name=self.stat_name)
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table) \
+            .get_table_child_key(f'{self.col_name}/{self.stat_name}/')
 
     def get_col_key(self) -> str:
         # no cluster, schema info from the input
-        return ColumnMetadata.COLUMN_KEY_FORMAT.format(db=self.db,
-                                                       cluster=self.cluster,
-                                                       schema=self.schema,
-                                                       tbl=self.table,
-                                                       col=self.col_name)
+        return get_table_key_builder(self.db, self.cluster, self.schema, self.table).get_column_key(self.col_name)
 
     def create_nodes(self) -> List[GraphNode]:
         """
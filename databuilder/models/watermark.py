@@ -8,6 +8,7 @@ from typing import (
 from databuilder.models.graph_node import GraphNode
 from databuilder.models.graph_relationship import GraphRelationship
 from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_key_builder import get_table_key_builder
 
 
 class Watermark(GraphSerializable):
@@ -62,14 +63,11 @@ class Watermark(GraphSerializable):
             return None
 
     def get_watermark_model_key(self) -> str:
-        return Watermark.KEY_FORMAT.format(database=self.database,
-                                           cluster=self.cluster,
-                                           schema=self.schema,
-                                           table=self.table,
-                                           part_type=self.part_type)
+        return get_table_key_builder(self.database, self.cluster, self.schema, self.table) \
+            .get_table_child_key(f'{self.part_type}/')
 
     def get_metadata_model_key(self) -> str:
-        return f'{self.database}://{self.cluster}.{self.schema}/{self.table}'
+        return get_table_key_builder(self.database, self.cluster, self.schema, self.table).table_key
 
     def create_nodes(self) -> List[GraphNode]:
         """
@@ -2,9 +2,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import abc
-from typing import List
+from typing import List, Optional
 
 from pyhocon import ConfigTree
+from statsd import StatsClient
 
 from databuilder import Scoped
 from databuilder.callback import call_back
@@ -27,6 +28,7 @@ class Publisher(Scoped):
 
     def __init__(self) -> None:
         self.call_backs: List[Callback] = []
+        self.statsd: Optional[StatsClient] = None
 
     @abc.abstractmethod
     def init(self, conf: ConfigTree) -> None:
@@ -58,6 +60,14 @@ class Publisher(Scoped):
         """
         self.call_backs.append(callback)
 
+    def set_statsd(self, statsd: Optional[StatsClient]) -> None:
+        """
+        Set statsd client that publisher can emit its metrics through. It is called by the job before init.
+        :param statsd:
+        :return: None
+        """
+        self.statsd = statsd
+
     def get_scope(self) -> str:
         return 'publisher'
 
@@ -0,0 +1,301 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import logging
+import os
+import shlex
+import time
+from os import listdir
+from os.path import isfile, join
+from typing import (
+    IO, Any, Dict, List, Optional, Set, Tuple,
+)
+
+from pyhocon import ConfigFactory, ConfigTree
+
+from databuilder.publisher.base_publisher import Publisher
+from databuilder.publisher.neo4j_csv_publisher import (
+    JOB_PUBLISH_TAG, LAST_UPDATED_EPOCH_MS, NODE_FILES_DIR, NODE_KEY_KEY, NODE_LABEL_KEY, PUBLISHED_TAG_PROPERTY_NAME,
+    RELATION_END_KEY, RELATION_END_LABEL, RELATION_FILES_DIR, RELATION_REQUIRED_KEYS, RELATION_REVERSE_TYPE,
+    RELATION_START_KEY, RELATION_START_LABEL, RELATION_TYPE, UNQUOTED_SUFFIX,
+)
+from databuilder.utils import compressed_file
+from databuilder.utils.staging_files import CHECKPOINT_FILE_NAME, MANIFEST_FILE_NAME
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Neo4jAdminImportPublisher(Publisher):
+    """
+    A Publisher that converts node and relationship CSV files written by FsNeo4jCSVLoader into the format of
+    neo4j-admin import, Neo4j's offline importer, instead of publishing them via Cypher.
+    It is meant for initial load or rebuild of an empty graph, where it is orders of magnitude faster than MERGE.
+
+    Output directory will have:
+     - nodes/ and relationships/ with a header file and a data file per input file (and label / label pair)
+     - constraints.cypher with unique constraints to create once import is done
+     - import.sh with neo4j-admin import command
+
+    Keys are deduplicated during conversion, where the first occurrence wins. As Amundsen relations are
+    bi-directional, both TYPE and REVERSE_TYPE relationships are written.
+    Note that the command follows Neo4j 3.5 syntax.
+    """
+    # Config keys
+    # node_files_directory and relation_files_directory are shared with Neo4jCsvPublisher
+    OUTPUT_DIR = 'output_directory'
+    DATABASE_NAME = 'database_name'
+    NEO4J_ADMIN_PATH = 'neo4j_admin_path'
+
+    _DEFAULT_CONFIG = ConfigFactory.from_dict({
+        DATABASE_NAME: 'graph.db',
+        NEO4J_ADMIN_PATH: 'neo4j-admin',
+        JOB_PUBLISH_TAG: ''
+    })
+
+    IMPORT_SCRIPT_FILE_NAME = 'import.sh'
+    CONSTRAINTS_FILE_NAME = 'constraints.cypher'
+
+    def __init__(self) -> None:
+        super(Neo4jAdminImportPublisher, self).__init__()
+
+    def init(self, conf: ConfigTree) -> None:
+        conf = conf.with_fallback(Neo4jAdminImportPublisher._DEFAULT_CONFIG)
+
+        self._node_dir = conf.get_string(NODE_FILES_DIR)
+        self._relation_dir = conf.get_string(RELATION_FILES_DIR, None)
+        self._output_dir = conf.get_string(Neo4jAdminImportPublisher.OUTPUT_DIR)
+        self._database_name = conf.get_string(Neo4jAdminImportPublisher.DATABASE_NAME)
+        self._neo4j_admin_path = conf.get_string(Neo4jAdminImportPublisher.NEO4J_ADMIN_PATH)
+        self._publish_tag = conf.get_string(JOB_PUBLISH_TAG)
+        self._publish_epoch_ms = str(int(time.time() * 1000))
+
+        self._node_keys: Dict[str, Set[str]] = {}
+        self._relation_keys: Set[Tuple[str, str, str, str, str]] = set()
+
+    def publish_impl(self) -> None:
+        node_files = self._convert_files(self._node_dir, 'nodes', self._convert_node_file)
+        relation_files = self._convert_files(self._relation_dir, 'relationships', self._convert_relation_file)
+
+        self._write_constraints()
+        command = self._write_import_script(node_files, relation_files)
+        LOGGER.info('Converted %i node and %i relationship files for neo4j-admin import. Import command: %s',
+                    len(node_files), len(relation_files), command)
+
+    def get_scope(self) -> str:
+        return 'publisher.neo4j_admin_import'
+
+    def _convert_files(self,
+                       input_dir: Optional[str],
+                       output_sub_dir: str,
+                       convert: Any) -> List['_ImportFileWriter']:
+        if not input_dir:
+            return []
+
+        output_dir = join(self._output_dir, output_sub_dir)
+        os.makedirs(output_dir, exist_ok=True)
+
+        writers: List[_ImportFileWriter] = []
+        for file_name in sorted(listdir(input_dir)):
+            path = join(input_dir, file_name)
+            if not isfile(path) or file_name in (MANIFEST_FILE_NAME, CHECKPOINT_FILE_NAME):
+                continue
+
+            LOGGER.info('Converting %s', path)
+            with compressed_file.open_text(path, 'r', newline='') as input_csv:
+                output_prefix = os.path.splitext(compressed_file.strip_extension(file_name))[0]
+                writers.extend(convert(input_csv, join(output_dir, output_prefix)))
+        return writers
+
+    def _convert_node_file(self, input_csv: IO[str], output_prefix: str) -> List['_ImportFileWriter']:
+        """
+        Writes nodes of input_csv per label, skipping keys that are already written.
+        """
+        reader = csv.reader(input_csv)
+        header = next(reader, None)
+        if not header:
+            return []
+
+        label_index = header.index(NODE_LABEL_KEY)
+        key_index = header.index(NODE_KEY_KEY)
+        prop_indices = [i for i, k in enumerate(header) if k not in (NODE_LABEL_KEY, NODE_KEY_KEY)]
+
+        writers: Dict[str, _ImportFileWriter] = {}
+        duplicates = 0
+        try:
+            for row in reader:
+                label = row[label_index]
+                keys = self._node_keys.setdefault(label, set())
+                if row[key_index] in keys:
+                    duplicates += 1
+                    continue
+                keys.add(row[key_index])
+
+                writer = writers.get(label)
+                if writer is None:
+                    writer = _ImportFileWriter(f'{output_prefix}_{label}' if len(writers) else output_prefix,
+                                               id_header=[f'key:ID({label})'],
+                                               prop_header=[header[i] for i in prop_indices],
+                                               trailing_header=':LABEL',
+                                               extra_props=self._extra_props())
+                    writers[label] = writer
+                writer.write([row[key_index]], [row[i] for i in prop_indices], label)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        LOGGER.info('Skipped %i duplicate nodes', duplicates)
+        return list(writers.values())
+
+    def _convert_relation_file(self, input_csv: IO[str], output_prefix: str) -> List['_ImportFileWriter']:
+        """
+        Writes relationships of input_csv per label pair and direction, skipping relations that are already written.
+        """
+        reader = csv.reader(input_csv)
+        header = next(reader, None)
+        if not header:
+            return []
+
+        indices = {k: header.index(k) for k in RELATION_REQUIRED_KEYS}
+        prop_indices = [i for i, k in enumerate(header) if k not in RELATION_REQUIRED_KEYS]
+
+        writers: Dict[Tuple[str, str], _ImportFileWriter] = {}
+        duplicates = 0
+        try:
+            for row in reader:
+                start_label, start_key = row[indices[RELATION_START_LABEL]], row[indices[RELATION_START_KEY]]
+                end_label, end_key = row[indices[RELATION_END_LABEL]], row[indices[RELATION_END_KEY]]
+                props = [row[i] for i in prop_indices]
+
+                for from_label, from_key, to_label, to_key, rel_type in (
+                        (start_label, start_key, end_label, end_key, row[indices[RELATION_TYPE]]),
+                        (end_label, end_key, start_label, start_key, row[indices[RELATION_REVERSE_TYPE]])):
+                    relation_key = (from_label, from_key, to_label, to_key, rel_type)
+                    if relation_key in self._relation_keys:
+                        duplicates += 1
+                        continue
+                    self._relation_keys.add(relation_key)
+
+                    writer = writers.get((from_label, to_label))
+                    if writer is None:
+                        writer = _ImportFileWriter(f'{output_prefix}_{from_label}_{to_label}',
+                                                   id_header=[f':START_ID({from_label})', f':END_ID({to_label})'],
+                                                   prop_header=[header[i] for i in prop_indices],
+                                                   trailing_header=':TYPE',
+                                                   extra_props=self._extra_props())
+                        writers[(from_label, to_label)] = writer
+                    writer.write([from_key, to_key], props, rel_type)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        LOGGER.info('Skipped %i duplicate relationships', duplicates)
+        return list(writers.values())
+
+    def _extra_props(self) -> List[Tuple[str, str]]:
+        """
+        Properties Neo4jCsvPublisher sets on every node and relationship, so that staleness removal keeps working.
+        """
+        if not self._publish_tag:
+            return []
+        return [(PUBLISHED_TAG_PROPERTY_NAME, self._publish_tag),
+                (f'{LAST_UPDATED_EPOCH_MS}:long', self._publish_epoch_ms)]
+
+    def _write_constraints(self) -> None:
+        with open(join(self._output_dir, Neo4jAdminImportPublisher.CONSTRAINTS_FILE_NAME), 'w',
+                  encoding='utf8') as constraints_file:
+            for label in sorted(self._node_keys):
+                constraints_file.write(f'CREATE CONSTRAINT ON (node:{label}) ASSERT node.key IS UNIQUE;\n')
+
+    def _write_import_script(self,
+                             node_files: List['_ImportFileWriter'],
+                             relation_files: List['_ImportFileWriter']) -> str:
+        args = [f'--database={self._database_name}',
+                '--id-type=STRING',
+                '--multiline-fields=true']
+        args.extend(f'--nodes={f.header_path},{f.data_path}' for f in node_files)
+        args.extend(f'--relationships={f.header_path},{f.data_path}' for f in relation_files)
+
+        lines = [f'{shlex.quote(self._neo4j_admin_path)} import'] + [shlex.quote(arg) for arg in args]
+        command = ' '.join(lines)
+        script_path = join(self._output_dir, Neo4jAdminImportPublisher.IMPORT_SCRIPT_FILE_NAME)
+        with open(script_path, 'w', encoding='utf8') as script_file:
+            script_file.write('#!/bin/sh\n')
+            script_file.write(' \\\n    '.join(lines))
+            script_file.write('\n')
+        os.chmod(script_path, 0o755)
+        return command
+
+
+class _ImportFileWriter(object):
+    """
+    Writes data file for neo4j-admin import, and its header file once all rows are written.
+    Properties with UNQUOTED_SUFFIX are typed by the values written: boolean, long, or double.
+    """
+    _TYPE_ORDER = ['boolean', 'long', 'double', 'string']
+
+    def __init__(self,
+                 path_prefix: str,
+                 id_header: List[str],
+                 prop_header: List[str],
+                 trailing_header: str,
+                 extra_props: List[Tuple[str, str]]) -> None:
+        self.data_path = f'{path_prefix}.csv'
+        self.header_path = f'{path_prefix}_header.csv'
+        self._id_header = id_header
+        self._prop_header = prop_header
+        self._trailing_header = trailing_header
+        self._extra_props = extra_props
+        self._unquoted_indices = [i for i, k in enumerate(prop_header) if k.endswith(UNQUOTED_SUFFIX)]
+        self._types: Dict[int, Optional[str]] = {i: None for i in self._unquoted_indices}
+
+        self._file = open(self.data_path, 'w', encoding='utf8', newline='')
+        self._writer = csv.writer(self._file, quoting=csv.QUOTE_ALL)
+
+    def write(self, ids: List[str], props: List[str], trailing: str) -> None:
+        for i in self._unquoted_indices:
+            if props[i] != '':
+                self._types[i] = _widen_type(self._types[i], props[i])
+
+        self._writer.writerow(ids + props + [v for _, v in self._extra_props] + [trailing])
+
+    def close(self) -> None:
+        self._file.close()
+
+        header = list(self._id_header)
+        for i, k in enumerate(self._prop_header):
+            if i in self._types:
+                header.append(f'{k[:-len(UNQUOTED_SUFFIX)]}:{self._types[i] or "string"}')
+            else:
+                header.append(k)
+        header.extend(k for k, _ in self._extra_props)
+        header.append(self._trailing_header)
+
+        with open(self.header_path, 'w', encoding='utf8', newline='') as header_file:
+            csv.writer(header_file, quoting=csv.QUOTE_ALL).writerow(header)
+
+
+def _widen_type(current: Optional[str], value: str) -> str:
+    """
+    Returns the narrowest neo4j-admin type that holds both the current type and the value.
+    """
+    if value in ('True', 'False'):
+        value_type = 'boolean'
+    else:
+        try:
+            int(value)
+            value_type = 'long'
+        except ValueError:
+            try:
+                float(value)
+                value_type = 'double'
+            except ValueError:
+                value_type = 'string'
+
+    if current is None or current == value_type:
+        return value_type
+    if 'boolean' in (current, value_type):
+        # boolean does not mix with numbers
+        return 'string'
+    order = _ImportFileWriter._TYPE_ORDER
+    return max(current, value_type, key=order.index)
@@ -3,22 +3,47 @@
 
 import csv
 import ctypes
+import hashlib
+import itertools
+import json
 import logging
+import os
+import queue
+import random
+import threading
 import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from io import open
+from operator import itemgetter, methodcaller
 from os import listdir
-from os.path import isfile, join
-from typing import List, Set
+from os.path import (
+    basename, isfile, join,
+)
+from typing import (
+    IO, Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple,
+)
 
 import neo4j
 import pandas
 from jinja2 import Template
-from neo4j import GraphDatabase, Transaction
-from neo4j.exceptions import CypherError, TransientError
+from neo4j import (
+    GraphDatabase, Session, SessionExpired, Transaction,
+)
+from neo4j.exceptions import (
+    CypherError, ServiceUnavailable, TransientError,
+)
 from pyhocon import ConfigFactory, ConfigTree
 
 from databuilder.publisher.base_publisher import Publisher
 from databuilder.publisher.neo4j_preprocessor import NoopRelationPreprocessor
+from databuilder.publisher.publisher_metrics import PublisherMetrics
+from databuilder.utils import compressed_file, ready_file_queue
+from databuilder.utils.staging_files import (
+    CHECKPOINT_FILE_NAME, MANIFEST_FILE_NAME, PARQUET_EXTENSION,
+)
 
 # Setting field_size_limit to solve the error below
 # _csv.Error: field larger than field limit (131072)
@@ -41,12 +66,76 @@ NEO4J_RELATIONSHIP_CREATION_CONFIRM = 'neo4j_relationship_creation_confirm'
 
 NEO4J_MAX_CONN_LIFE_TIME_SEC = 'neo4j_max_conn_life_time_sec'
 
+# A number of rows that are sent to Neo4j within a single UNWIND statement.
+# When set to greater than 0, node rows that share LABEL and header, and relation rows that share labels, types and
+# header are published in batches instead of one statement per row.
+# Note that NEO4J_TRANSACTION_SIZE counts statements, so a batch counts as one.
+NEO4J_UNWIND_BATCH_SIZE = 'neo4j_unwind_batch_size'
+
+# A boolean flag to read CSV files row by row instead of loading a whole file with pandas.
+# This keeps memory usage independent of file size. Note that only columns with UNQUOTED_SUFFIX are converted to
+# bool or numeric values where pandas infers the type of every column.
+NEO4J_STREAMING_READ = 'neo4j_streaming_read'
+
+# A number of workers that publish concurrently, each on its own session and transactions.
+# Node files are grouped by label so that a label is only written by one worker.
+# Relation files are published after all node files are committed. Relation rows are partitioned by a hash of the key
+# of the node on the high fan-in side (NEO4J_DEADLOCK_NODE_LABELS, otherwise start node), so that no two workers write
+# relations of the same hot node. Relations are published by a single worker when RELATION_PREPROCESSOR is used.
+NEO4J_PUBLISHER_WORKERS = 'neo4j_publisher_workers'
+
+# A boolean flag to store a hash of each row's properties on the node and relationships, and to skip updating the
+# properties when the stored hash matches. Unchanged nodes and relationships then only get PUBLISHED_TAG_PROPERTY_NAME
+# and LAST_UPDATED_EPOCH_MS updated, or nothing at all if NEO4J_TOUCH_UNCHANGED is False.
+NEO4J_CHANGE_DETECTION = 'neo4j_change_detection'
+# A boolean flag to update published tag and last updated timestamp of unchanged nodes and relationships.
+# Only set it to False if stale data is not removed with published tag or last updated timestamp, as unchanged data
+# would look stale.
+NEO4J_TOUCH_UNCHANGED = 'neo4j_touch_unchanged'
+
+# A boolean flag to write a JSON report of the run, with counters per label and relation type, throughput, commit
+# latency and slowest statements, to NEO4J_RUN_REPORT_PATH.
+# The same metrics are emitted through the statsd client of the job regardless of this flag.
+NEO4J_RUN_REPORT = 'neo4j_run_report'
+# A path of the run report. Default: RUN_REPORT_FILE_NAME next to the node files directory. Without either one
+# (e.g: publishing from NEO4J_READY_FILE_QUEUE), the report is not written.
+NEO4J_RUN_REPORT_PATH = 'neo4j_run_report_path'
+# A number of slowest statements kept in the run report
+NEO4J_SLOWEST_STATEMENT_COUNT = 'neo4j_slowest_statement_count'
+
 # list of nodes that are create only, and not updated if match exists
 NEO4J_CREATE_ONLY_NODES = 'neo4j_create_only_nodes'
 
-# list of node labels that could attempt to be accessed simultaneously
+# list of node labels that could attempt to be accessed simultaneously.
+# With NEO4J_PUBLISHER_WORKERS, relations are partitioned by the node of these labels.
 NEO4J_DEADLOCK_NODE_LABELS = 'neo4j_deadlock_node_labels'
 
+# A number of times a transaction is replayed on transient errors (e.g: deadlock, leader switch) before failing.
+# Statements of the current transaction are kept until commit, so that they can be replayed in a new transaction.
+NEO4J_TRANSIENT_ERROR_RETRIES = 'neo4j_transient_error_retries'
+# A maximum number of rows kept for replay per transaction. With NEO4J_UNWIND_BATCH_SIZE, a transaction of
+# NEO4J_TRANSACTION_SIZE statements would otherwise keep up to NEO4J_TRANSACTION_SIZE * NEO4J_UNWIND_BATCH_SIZE rows in
+# memory until commit. The transaction is committed early once it reaches this many rows. 0 for unlimited.
+NEO4J_MAX_REPLAY_ROWS = 'neo4j_max_replay_rows'
+# Base and maximum seconds to wait before replaying. Wait time grows exponentially with jitter on each attempt.
+NEO4J_RETRY_BASE_DELAY_SEC = 'neo4j_retry_base_delay_sec'
+NEO4J_RETRY_MAX_DELAY_SEC = 'neo4j_retry_max_delay_sec'
+
+# A boolean flag to record, after each commit, how many rows of each file are committed in CHECKPOINT_FILE_NAME within
+# the node files directory. The checkpoint is removed once publish succeeds.
+NEO4J_CHECKPOINT = 'neo4j_checkpoint'
+# A boolean flag to resume from the checkpoint of a failed run by skipping committed files and rows. Run the publisher
+# on the same directories without re-running the loader. The publish tag of the failed run is reused so that
+# staleness removal sees both runs as one. Implies NEO4J_CHECKPOINT.
+# Note that relation files are only checkpointed as a whole when they are published by multiple workers or with
+# RELATION_PREPROCESSOR.
+NEO4J_RESUME = 'neo4j_resume'
+
+# A ReadyFileQueue shared with FsNeo4jCSVLoader, to publish files while the loader is still writing them. Files are
+# published in the order the loader hands them over, on a single session; NEO4J_PUBLISHER_WORKERS is ignored.
+# The loader hands over node files as they are complete, and relation files once all node files are.
+NEO4J_READY_FILE_QUEUE = ready_file_queue.READY_FILE_QUEUE
+
 NEO4J_USER = 'neo4j_user'
 NEO4J_PASSWORD = 'neo4j_password'
 NEO4J_ENCRYPTED = 'neo4j_encrypted'
@@ -63,8 +152,13 @@ PUBLISHED_TAG_PROPERTY_NAME = 'published_tag'
 # Neo4j property name for last updated timestamp
 LAST_UPDATED_EPOCH_MS = 'publisher_last_updated_epoch_ms'
 
+# Neo4j property name (and statement parameter name) for hash of properties, used with NEO4J_CHANGE_DETECTION
+CONTENT_HASH_PROPERTY_NAME = 'publisher_content_hash'
+
 RELATION_PREPROCESSOR = 'relation_preprocessor'
 
+RUN_REPORT_FILE_NAME = 'neo4j_publisher_run_report.json'
+
 # CSV HEADER
 # A header with this suffix will be pass to Neo4j statement without quote
 UNQUOTED_SUFFIX = ':UNQUOTED'
@@ -93,17 +187,41 @@ RELATION_REQUIRED_KEYS = {RELATION_START_LABEL, RELATION_START_KEY,
                           RELATION_END_LABEL, RELATION_END_KEY,
                           RELATION_TYPE, RELATION_REVERSE_TYPE}
 
+# transient error retries and sleep time
+RETRIES_NUMBER = 5
+SLEEP_TIME = 2
+
+# Errors where replaying the transaction can succeed
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
 DEFAULT_CONFIG = ConfigFactory.from_dict({NEO4J_TRANSACTION_SIZE: 500,
                                           NEO4J_PROGRESS_REPORT_FREQUENCY: 500,
                                           NEO4J_RELATIONSHIP_CREATION_CONFIRM: False,
+                                          NEO4J_UNWIND_BATCH_SIZE: 0,
+                                          NEO4J_STREAMING_READ: False,
+                                          NEO4J_PUBLISHER_WORKERS: 1,
+                                          NEO4J_CHANGE_DETECTION: False,
+                                          NEO4J_TOUCH_UNCHANGED: True,
+                                          NEO4J_CHECKPOINT: False,
+                                          NEO4J_RESUME: False,
+                                          NEO4J_RUN_REPORT: False,
+                                          NEO4J_SLOWEST_STATEMENT_COUNT: 10,
+                                          NEO4J_TRANSIENT_ERROR_RETRIES: RETRIES_NUMBER,
+                                          NEO4J_MAX_REPLAY_ROWS: 100000,
+                                          NEO4J_RETRY_BASE_DELAY_SEC: SLEEP_TIME,
+                                          NEO4J_RETRY_MAX_DELAY_SEC: 60,
                                           NEO4J_MAX_CONN_LIFE_TIME_SEC: 50,
                                           NEO4J_ENCRYPTED: True,
                                           NEO4J_VALIDATE_SSL: False,
                                           RELATION_PREPROCESSOR: NoopRelationPreprocessor()})
 
-# transient error retries and sleep time
-RETRIES_NUMBER = 5
-SLEEP_TIME = 2
+# Number of rows read from a Parquet file at a time
+PARQUET_READ_BATCH_SIZE = 10000
+
+# Number of relation rows handed over to a relation worker at a time. Rows within a chunk are sorted by start key.
+RELATION_PARTITION_CHUNK_SIZE = 1000
+# Number of chunks that can be queued for a relation worker
+RELATION_PARTITION_QUEUE_SIZE = 10
 
 LOGGER = logging.getLogger(__name__)
 
@@ -116,7 +234,12 @@ class Neo4jCsvPublisher(Publisher):
     Neo4j follows Label Node properties Graph and more information about this is in:
     https://neo4j.com/docs/developer-manual/current/introduction/graphdb-concepts/
 
-    #TODO User UNWIND batch operation for better performance
+    By default, one MERGE statement is executed per CSV row. Setting NEO4J_UNWIND_BATCH_SIZE makes publisher group
+    node and relation rows and send them with one parameterized UNWIND statement per batch.
+    With NEO4J_PUBLISHER_WORKERS, node files of different labels are published concurrently on separate sessions, and
+    relations are published concurrently in partitions that do not share hot nodes.
+    With NEO4J_CHANGE_DETECTION, properties of nodes and relations whose content hash did not change are not rewritten.
+    With NEO4J_READY_FILE_QUEUE, files are published as the loader completes them, overlapping extraction and writes.
     """
 
     def __init__(self) -> None:
@@ -126,12 +249,26 @@ class Neo4jCsvPublisher(Publisher):
         conf = conf.with_fallback(DEFAULT_CONFIG)
 
         self._count: int = 0
+        self._count_lock = threading.Lock()
+        # Session, number of statements in the session, statements and file progress of open transaction per worker
+        # thread
+        self._worker_local = threading.local()
         self._progress_report_frequency = conf.get_int(NEO4J_PROGRESS_REPORT_FREQUENCY)
+
+        resume = conf.get_bool(NEO4J_RESUME)
+        self._checkpoint_path = join(conf.get_string(NODE_FILES_DIR), CHECKPOINT_FILE_NAME) \
+            if NODE_FILES_DIR in conf and (resume or conf.get_bool(NEO4J_CHECKPOINT)) else None
+        self._checkpoint_lock = threading.Lock()
+        checkpoint = self._read_checkpoint() if resume else {}
+        self._committed_offsets: Dict[str, int] = checkpoint.get('offsets', {})
+        self._completed_files: Set[str] = set(checkpoint.get('completed', []))
+
         self._node_files = self._list_files(conf, NODE_FILES_DIR)
-        self._node_files_iter = iter(self._node_files)
+        self._node_manifest = self._read_manifest(conf, NODE_FILES_DIR)
+        self._node_files_iter = iter([f for f in self._node_files if f not in self._completed_files])
 
         self._relation_files = self._list_files(conf, RELATION_FILES_DIR)
-        self._relation_files_iter = iter(self._relation_files)
+        self._relation_files_iter = iter([f for f in self._relation_files if f not in self._completed_files])
 
         trust = neo4j.TRUST_SYSTEM_CA_SIGNED_CERTIFICATES if conf.get_bool(NEO4J_VALIDATE_SSL) \
             else neo4j.TRUST_ALL_CERTIFICATES
@@ -142,6 +279,15 @@ class Neo4jCsvPublisher(Publisher):
                                  encrypted=conf.get_bool(NEO4J_ENCRYPTED),
                                  trust=trust)
         self._transaction_size = conf.get_int(NEO4J_TRANSACTION_SIZE)
+        self._unwind_batch_size = conf.get_int(NEO4J_UNWIND_BATCH_SIZE)
+        self._streaming_read = conf.get_bool(NEO4J_STREAMING_READ)
+        self._worker_count = conf.get_int(NEO4J_PUBLISHER_WORKERS)
+        self._change_detection = conf.get_bool(NEO4J_CHANGE_DETECTION)
+        self._touch_unchanged = conf.get_bool(NEO4J_TOUCH_UNCHANGED)
+        self._transient_error_retries = conf.get_int(NEO4J_TRANSIENT_ERROR_RETRIES)
+        self._max_replay_rows = conf.get_int(NEO4J_MAX_REPLAY_ROWS)
+        self._retry_base_delay_sec = conf.get_float(NEO4J_RETRY_BASE_DELAY_SEC)
+        self._retry_max_delay_sec = conf.get_float(NEO4J_RETRY_MAX_DELAY_SEC)
         self._session = self._driver.session()
         self._confirm_rel_created = conf.get_bool(NEO4J_RELATIONSHIP_CREATION_CONFIRM)
 
@@ -150,11 +296,21 @@ class Neo4jCsvPublisher(Publisher):
         self.create_only_nodes = set(conf.get_list(NEO4J_CREATE_ONLY_NODES, default=[]))
         self.deadlock_node_labels = set(conf.get_list(NEO4J_DEADLOCK_NODE_LABELS, default=[]))
         self.labels: Set[str] = set()
-        self.publish_tag: str = conf.get_string(JOB_PUBLISH_TAG)
+        self._statement_cache: Dict[Any, _CompiledStatement] = {}
+        self.publish_tag: str = checkpoint.get('publish_tag') or conf.get_string(JOB_PUBLISH_TAG)
+        if checkpoint:
+            LOGGER.info('Resuming from checkpoint %s with publish tag %s. %i files are already published',
+                        self._checkpoint_path, self.publish_tag, len(self._completed_files))
         if not self.publish_tag:
             raise Exception(f'{JOB_PUBLISH_TAG} should not be empty')
 
         self._relation_preprocessor = conf.get(RELATION_PREPROCESSOR)
+        self._ready_file_queue = conf.get(NEO4J_READY_FILE_QUEUE, None)
+
+        self._metrics = PublisherMetrics(statsd=self.statsd,
+                                         prefix='neo4j_publisher',
+                                         slowest_statement_count=conf.get_int(NEO4J_SLOWEST_STATEMENT_COUNT))
+        self._run_report_path = self._get_run_report_path(conf) if conf.get_bool(NEO4J_RUN_REPORT) else None
 
         LOGGER.info('Publishing Node csv files %s, and Relation CSV files %s', self._node_files, self._relation_files)
 
@@ -169,7 +325,68 @@ class Neo4jCsvPublisher(Publisher):
             return []
 
         path = conf.get_string(path_key)
-        return [join(path, f) for f in listdir(path) if isfile(join(path, f))]
+        return [join(path, f) for f in listdir(path)
+                if isfile(join(path, f)) and f not in (MANIFEST_FILE_NAME, CHECKPOINT_FILE_NAME)]
+
+    def _read_manifest(self, conf: ConfigTree, path_key: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads manifest from directory, if exists.
+        :param conf:
+        :param path_key:
+        :return: A dict of file name to its manifest entry. Empty if there's no manifest.
+        """
+        if path_key not in conf:
+            return {}
+
+        manifest_path = join(conf.get_string(path_key), MANIFEST_FILE_NAME)
+        if not isfile(manifest_path):
+            return {}
+
+        with open(manifest_path, 'r', encoding='utf8') as manifest_file:
+            return json.load(manifest_file)
+
+    def _get_run_report_path(self, conf: ConfigTree) -> Optional[str]:
+        """
+        :param conf:
+        :return: NEO4J_RUN_REPORT_PATH, or RUN_REPORT_FILE_NAME next to the node files directory. None if neither is
+        configured.
+        """
+        if NEO4J_RUN_REPORT_PATH in conf:
+            return conf.get_string(NEO4J_RUN_REPORT_PATH)
+
+        if NODE_FILES_DIR in conf:
+            return join(os.path.dirname(os.path.normpath(conf.get_string(NODE_FILES_DIR))), RUN_REPORT_FILE_NAME)
+
+        LOGGER.warning('Not writing run report as neither %s nor %s is configured', NEO4J_RUN_REPORT_PATH,
+                       NODE_FILES_DIR)
+        return None
+
+    def _read_checkpoint(self) -> Dict[str, Any]:
+        """
+        Reads checkpoint of a previous run, if exists.
+        :return: Checkpoint, or empty dict if there's none
+        """
+        if not self._checkpoint_path or not isfile(self._checkpoint_path):
+            LOGGER.info('No checkpoint to resume from. Publishing all files.')
+            return {}
+
+        with open(self._checkpoint_path, 'r', encoding='utf8') as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def _write_checkpoint(self, checkpoint_path: str) -> None:
+        """
+        Writes checkpoint atomically by replacing it with a temporary file.
+        Expected to be called with _checkpoint_lock held.
+        :param checkpoint_path:
+        :return:
+        """
+        checkpoint = {'publish_tag': self.publish_tag,
+                      'offsets': self._committed_offsets,
+                      'completed': sorted(self._completed_files)}
+        tmp_path = f'{checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(tmp_path, checkpoint_path)
 
     def publish_impl(self) -> None:  # noqa: C901
         """
@@ -177,15 +394,22 @@ class Neo4jCsvPublisher(Publisher):
         :return:
         """
 
-        start = time.time()
-
         LOGGER.info('Creating indices using Node files: %s', self._node_files)
         for node_file in self._node_files:
             self._create_indices(node_file=node_file)
 
         LOGGER.info('Publishing Node files: %s', self._node_files)
+        tx: Optional[Transaction] = None
         try:
-            tx = self._session.begin_transaction()
+            if self._ready_file_queue:
+                tx = self._session.begin_transaction()
+                # The transaction left open by ready files carries on, as a session can't open another one
+                tx = self._publish_ready_files(tx)
+            else:
+                if self._worker_count > 1:
+                    self._publish_nodes_in_parallel()
+                tx = self._session.begin_transaction()
+
             while True:
                 try:
                     node_file = next(self._node_files_iter)
@@ -194,6 +418,9 @@ class Neo4jCsvPublisher(Publisher):
                     break
 
             LOGGER.info('Publishing Relationship files: %s', self._relation_files)
+            if self._worker_count > 1 and not self._relation_preprocessor.is_perform_preprocess():
+                self._publish_relations_in_parallel()
+
             while True:
                 try:
                     relation_file = next(self._relation_files_iter)
@@ -201,37 +428,283 @@ class Neo4jCsvPublisher(Publisher):
                 except StopIteration:
                     break
 
-            tx.commit()
+            self._commit(tx)
             LOGGER.info('Committed total %i statements', self._count)
+            if self._checkpoint_path and isfile(self._checkpoint_path):
+                os.remove(self._checkpoint_path)
 
-            # TODO: Add statsd support
-            LOGGER.info('Successfully published. Elapsed: %i seconds', time.time() - start)
+            report = self._finish_metrics(is_success=True)
+            LOGGER.info('Successfully published. Elapsed: %i seconds, %.1f statements per second',
+                        report['elapsed_sec'], report['statements_per_sec'])
         except Exception as e:
             LOGGER.exception('Failed to publish. Rolling back.')
-            if not tx.closed():
+            if tx and not tx.closed():
                 tx.rollback()
+            self._finish_metrics(is_success=False)
             raise e
 
+    def _publish_ready_files(self, tx: Transaction) -> Transaction:
+        """
+        Publishes files from NEO4J_READY_FILE_QUEUE as the loader completes them, until the loader closes the queue.
+        The loader hands over node files before the relation files that refer to them.
+        :param tx:
+        :return: The open transaction, which is rolled back instead on failure
+        """
+        try:
+            for ready_file in self._ready_file_queue:
+                if ready_file.kind == ready_file_queue.RELATION:
+                    tx = self._publish_relation(ready_file.path, tx=tx)
+                    continue
+
+                if ready_file.manifest_entry:
+                    self._node_manifest[basename(ready_file.path)] = ready_file.manifest_entry
+                if set(self._get_node_file_labels(ready_file.path)) - self.labels:
+                    # Commit before creating the index of a new label, so that it does not wait on this transaction
+                    self._commit(tx)
+                    tx = self._session.begin_transaction()
+                    self._create_indices(node_file=ready_file.path)
+                tx = self._publish_node(ready_file.path, tx=tx)
+        except Exception:
+            # The caller only knows the transaction it passed in
+            _rollback_quietly(tx)
+            raise
+
+        return tx
+
+    def _finish_metrics(self, is_success: bool) -> Dict[str, Any]:
+        """
+        Emits metrics of the run, and writes the run report with NEO4J_RUN_REPORT.
+        :param is_success:
+        :return: Run report
+        """
+        report = self._metrics.finish(is_success=is_success)
+        if self._run_report_path:
+            self._metrics.write_report(self._run_report_path)
+        return report
+
+    def _publish_nodes_in_parallel(self) -> None:
+        """
+        Publishes node files with NEO4J_PUBLISHER_WORKERS workers. Files sharing a label are grouped so that
+        different workers never write the same label. If a worker fails, groups that have not started are cancelled,
+        and the failure is raised once running workers finish.
+        :return:
+        """
+        groups: List[Tuple[Set[str], List[str]]] = []
+        for node_file in self._node_files_iter:
+            labels = set(self._get_node_file_labels(node_file))
+            overlapping = [group for group in groups if group[0] & labels]
+            for group in overlapping:
+                groups.remove(group)
+                labels |= group[0]
+            node_files = [f for group in overlapping for f in group[1]] + [node_file]
+            groups.append((labels, node_files))
+
+        LOGGER.info('Publishing %i groups of Node files with %i workers', len(groups), self._worker_count)
+        with ThreadPoolExecutor(max_workers=self._worker_count) as executor:
+            futures = [executor.submit(self._publish_node_group, node_files) for _, node_files in groups]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def _publish_node_group(self, node_files: List[str]) -> None:
+        """
+        Publishes node files within a worker thread, on its own session and transactions.
+        :param node_files:
+        :return:
+        """
+        self._worker_local.count = 0
+        self._worker_local.pending_statements = []
+        session: Optional[Session] = None
+        tx: Optional[Transaction] = None
+        try:
+            # Within try, so that the session is closed even if a transaction can't be begun
+            session = self._worker_local.session = self._driver.session()
+            tx = session.begin_transaction()
+            for node_file in node_files:
+                tx = self._publish_node(node_file, tx=tx)
+            self._commit(tx)
+        except Exception:
+            LOGGER.exception('Failed to publish %s. Rolling back.', node_files)
+            if tx and not tx.closed():
+                tx.rollback()
+            raise
+        finally:
+            if session:
+                session.close()
+                del self._worker_local.session
+            del self._worker_local.pending_statements
+            self._get_open_progress().clear()
+
+    def _publish_relations_in_parallel(self) -> None:
+        """
+        Publishes relation files with NEO4J_PUBLISHER_WORKERS workers. Relation rows are routed to a worker by a hash
+        of the hot node key so that a hot node (e.g: Tag, Badge, User) is only locked by one worker, which avoids
+        deadlocks among workers. If a worker fails, rows stop being routed, and the failure is raised once the other
+        workers finish.
+        :return:
+        """
+        partitions = [_RelationPartition() for _ in range(self._worker_count)]
+        failed = threading.Event()
+        relation_files = list(self._relation_files_iter)
+
+        LOGGER.info('Publishing Relationship files with %i workers', self._worker_count)
+        with ThreadPoolExecutor(max_workers=self._worker_count) as executor:
+            futures = [executor.submit(self._publish_relation_partition, partition, failed)
+                       for partition in partitions]
+            try:
+                self._partition_relations(relation_files, partitions, failed)
+            finally:
+                for partition in partitions:
+                    partition.close()
+
+            for future in futures:
+                future.result()
+
+        # Partitions commit independently, so relation files are only checkpointed once all of them are committed
+        if self._checkpoint_path:
+            with self._checkpoint_lock:
+                self._completed_files.update(relation_files)
+                self._write_checkpoint(self._checkpoint_path)
+
+    def _partition_relations(self,
+                             relation_files: List[str],
+                             partitions: List['_RelationPartition'],
+                             failed: threading.Event) -> None:
+        """
+        Routes relation rows to partitions in chunks sorted by start key, for page cache locality.
+        :param relation_files:
+        :param partitions:
+        :param failed: Set when any of the workers failed
+        :return:
+        """
+        chunks: List[List[dict]] = [[] for _ in partitions]
+        for relation_file in relation_files:
+            for rel_record in self._read_records(relation_file):
+                hot_key = self._get_hot_node_key(rel_record)
+                i = zlib.crc32(hot_key.encode('utf-8')) % len(partitions)
+                chunks[i].append(rel_record)
+                if len(chunks[i]) >= RELATION_PARTITION_CHUNK_SIZE:
+                    if failed.is_set():
+                        return
+                    partitions[i].put(sorted(chunks[i], key=itemgetter(RELATION_START_KEY)))
+                    chunks[i] = []
+
+        for partition, chunk in zip(partitions, chunks):
+            if chunk:
+                partition.put(sorted(chunk, key=itemgetter(RELATION_START_KEY)))
+
+    def _get_hot_node_key(self, rel_record: dict) -> str:
+        """
+        Provides key of the node on high fan-in side of the relation. A node with a label in
+        NEO4J_DEADLOCK_NODE_LABELS is considered hot, otherwise start node is.
+        :param rel_record:
+        :return:
+        """
+        if rel_record[RELATION_END_LABEL] in self.deadlock_node_labels \
+                and rel_record[RELATION_START_LABEL] not in self.deadlock_node_labels:
+            return str(rel_record[RELATION_END_KEY])
+        return str(rel_record[RELATION_START_KEY])
+
+    def _publish_relation_partition(self, partition: '_RelationPartition', failed: threading.Event) -> None:
+        """
+        Publishes relation rows of a partition within a worker thread, on its own session and transactions.
+        On failure, it keeps consuming the partition so that routing never blocks on it.
+        :param partition:
+        :param failed:
+        :return:
+        """
+        self._worker_local.count = 0
+        self._worker_local.pending_statements = []
+        session: Optional[Session] = None
+        tx: Optional[Transaction] = None
+        try:
+            # Within try, so that the partition is drained even if the connection can't be acquired
+            session = self._worker_local.session = self._driver.session()
+            tx = session.begin_transaction()
+            tx = self._publish_relation_records(partition, tx=tx)
+            self._commit(tx)
+        except Exception:
+            LOGGER.exception('Failed to publish relation partition. Rolling back.')
+            failed.set()
+            try:
+                if tx and not tx.closed():
+                    tx.rollback()
+            finally:
+                partition.drain()
+            raise
+        finally:
+            if session:
+                session.close()
+                del self._worker_local.session
+            del self._worker_local.pending_statements
+
+    def _get_session(self) -> Session:
+        return getattr(self._worker_local, 'session', self._session)
+
     def get_scope(self) -> str:
         return 'publisher.neo4j'
 
+    def _read_records(self, file_path: str) -> Iterator[dict]:
+        """
+        Reads CSV file and yields each row as a dict where keys are the header. Compressed file is decompressed by its
+        extension.
+        With NEO4J_STREAMING_READ, rows are parsed one at a time so that memory does not depend on the file size.
+        Otherwise the whole file is loaded via pandas.
+        Parquet file is always read in record batches, with values in their native types.
+        :param file_path:
+        :return:
+        """
+        if file_path.endswith(PARQUET_EXTENSION):
+            yield from _read_parquet_records(file_path)
+            return
+
+        if self._streaming_read:
+            with compressed_file.open_text(file_path, 'r', newline='') as csv_file:
+                yield from _stream_csv_records(csv_file)
+            return
+
+        with compressed_file.open_text(file_path, 'r') as csv_file:
+            yield from pandas.read_csv(csv_file, na_filter=False).to_dict(orient='records')
+
     def _create_indices(self, node_file: str) -> None:
         """
-        Go over the node file and try creating unique index
+        Try creating unique index for the labels of the node file
         :param node_file:
         :return:
         """
         LOGGER.info('Creating indices. (Existing indices will be ignored)')
 
-        with open(node_file, 'r', encoding='utf8') as node_csv:
-            for node_record in pandas.read_csv(node_csv, na_filter=False).to_dict(orient='records'):
-                label = node_record[NODE_LABEL_KEY]
-                if label not in self.labels:
-                    self._try_create_index(label)
-                    self.labels.add(label)
+        for label in self._get_node_file_labels(node_file):
+            if label not in self.labels:
+                self._try_create_index(label)
+                self.labels.add(label)
 
         LOGGER.info('Indices have been created.')
 
+    def _get_node_file_labels(self, node_file: str) -> List[str]:
+        """
+        Provides labels of the node file without scanning it. Labels come from the manifest written by the loader.
+        If the file is not in the manifest, label of the first row is used, as a node file written by
+        FsNeo4jCSVLoader has one label.
+        :param node_file:
+        :return:
+        """
+        entry = self._node_manifest.get(basename(node_file))
+        if entry:
+            return entry['labels']
+
+        if node_file.endswith(PARQUET_EXTENSION):
+            first_record = next(_read_parquet_records(node_file), None)
+            return [first_record[NODE_LABEL_KEY]] if first_record else []
+
+        with compressed_file.open_text(node_file, 'r', newline='') as node_csv:
+            first_record = next(_stream_csv_records(node_csv), None)
+        return [first_record[NODE_LABEL_KEY]] if first_record else []
+
     def _publish_node(self, node_file: str, tx: Transaction) -> Transaction:
         """
         Iterate over the csv records of a file, each csv record transform to Merge statement and will be executed.
@@ -249,14 +722,99 @@ class Neo4jCsvPublisher(Publisher):
         :param node_file:
         :return:
         """
+        progress = self._start_progress(node_file)
+        node_records = progress.track(self._read_records(node_file))
+        if self._unwind_batch_size > 0:
+            return self._publish_node_batches(node_records, progress, tx=tx)
+
+        for node_record in node_records:
+            self._metrics.incr(f'nodes.{node_record[NODE_LABEL_KEY]}')
+            compiled = self._get_node_statement(node_record)
+            tx = self._execute_statement(compiled.statement, tx, compiled.bind(node_record))
+        return tx
 
-        with open(node_file, 'r', encoding='utf8') as node_csv:
-            for node_record in pandas.read_csv(node_csv, na_filter=False).to_dict(orient="records"):
-                stmt = self.create_node_merge_statement(node_record=node_record)
-                params = self._create_props_param(node_record)
-                tx = self._execute_statement(stmt, tx, params)
+    def _publish_node_batches(self,
+                              node_records: Iterable[dict],
+                              progress: '_FileProgress',
+                              tx: Transaction) -> Transaction:
+        """
+        Same as _publish_node, but groups the csv records by LABEL and header, and executes one UNWIND statement per
+        batch of NEO4J_UNWIND_BATCH_SIZE records.
+        Example of Cypher query executed by this method:
+        UNWIND $batch AS row
+        MERGE (node:Column {key: row.KEY})
+        ON CREATE SET node.name = row.name,
+                      node.order_pos = row.order_pos,
+                      node.type = row.type
+        ON MATCH SET node.name = row.name,
+                     node.order_pos = row.order_pos,
+                     node.type = row.type
+
+        :param node_records:
+        :param progress: Progress of the node file
+        :param tx:
+        :return:
+        """
+        for batch in self._iter_batches(node_records, _node_batch_key, progress):
+            tx = self._execute_node_batch(batch, tx=tx)
         return tx
 
+    def _iter_batches(self,
+                      records: Iterable[dict],
+                      batch_key: Callable[[dict], Any],
+                      progress: Optional['_FileProgress'] = None) -> Iterator[List[dict]]:
+        """
+        Groups records by batch_key and yields a batch whenever it reaches NEO4J_UNWIND_BATCH_SIZE.
+        Remaining partial batches are yielded once records are exhausted.
+        :param records:
+        :param batch_key: A function that returns a key of the group the record belongs to
+        :param progress: Progress of the file records are tracked by, which is told where batches not yet yielded start
+        :return:
+        """
+        buffered = progress.buffered if progress else {}
+        batches: Dict[Any, List[dict]] = {}
+        for record in records:
+            key = batch_key(record)
+            batch = batches.get(key)
+            if batch is None:
+                batch = batches[key] = []
+                if progress:
+                    buffered[key] = progress.offset - 1
+            batch.append(record)
+            if len(batch) >= self._unwind_batch_size:
+                del batches[key]
+                buffered.pop(key, None)
+                yield batch
+
+        while batches:
+            key = next(iter(batches))
+            buffered.pop(key, None)
+            yield batches.pop(key)
+
+    def _execute_node_batch(self, batch: List[dict], tx: Transaction) -> Transaction:
+        self._metrics.incr(f'nodes.{batch[0][NODE_LABEL_KEY]}', len(batch))
+        compiled = self._get_node_statement(batch[0], unwind=True)
+        params = {'batch': [compiled.bind(node_record) for node_record in batch]}
+        return self._execute_statement(compiled.statement, tx, params)
+
+    def _get_node_statement(self, node_record: dict, unwind: bool = False) -> '_CompiledStatement':
+        """
+        Returns node merge statement compiled for the shape of node_record. Statement is rendered only once per
+        LABEL, header and create only flag, and cached for the rest of the records.
+        :param node_record:
+        :param unwind: True for the UNWIND statement that takes a batch of records
+        :return:
+        """
+        header = tuple(node_record.keys())
+        cache_key = (unwind, node_record[NODE_LABEL_KEY], header, self.is_create_only_node(node_record))
+        compiled = self._statement_cache.get(cache_key)
+        if compiled is None:
+            stmt = self.create_node_unwind_statement(node_record) if unwind \
+                else self.create_node_merge_statement(node_record)
+            compiled = _CompiledStatement(stmt, header, self._get_content_hash_keys(node_record, NODE_REQUIRED_KEYS))
+            self._statement_cache[cache_key] = compiled
+        return compiled
+
     def is_create_only_node(self, node_record: dict) -> bool:
         """
         Check if node can be updated
@@ -276,15 +834,80 @@ class Neo4jCsvPublisher(Publisher):
         """
         template = Template("""
             MERGE (node:{{ LABEL }} {key: $KEY})
-            ON CREATE SET {{ PROP_BODY }}
-            {% if update %} ON MATCH SET {{ PROP_BODY }} {% endif %}
+            {{ SET_CLAUSE }}
         """)
 
-        prop_body = self._create_props_body(node_record, NODE_REQUIRED_KEYS, 'node')
+        return template.render(LABEL=node_record["LABEL"],
+                               SET_CLAUSE=self._create_node_set_clause(node_record, param_prefix='$'))
+
+    def create_node_unwind_statement(self, node_record: dict) -> str:
+        """
+        Creates node merge statement that UNWINDs a batch of records sharing LABEL and header with node_record
+        :param node_record: Any record of the batch
+        :return:
+        """
+        template = Template("""
+            UNWIND $batch AS row
+            MERGE (node:{{ LABEL }} {key: row.KEY})
+            {{ SET_CLAUSE }}
+        """)
 
         return template.render(LABEL=node_record["LABEL"],
-                               PROP_BODY=prop_body,
-                               update=(not self.is_create_only_node(node_record)))
+                               SET_CLAUSE=self._create_node_set_clause(node_record, param_prefix='row.'))
+
+    def _create_node_set_clause(self, node_record: dict, param_prefix: str) -> str:
+        """
+        Creates SET clauses that follow node MERGE. With NEO4J_CHANGE_DETECTION, properties of an existing node are
+        only set when its stored content hash differs from the record's.
+        :param node_record:
+        :param param_prefix: how a value is referenced in CYPHER query. '$' for parameter, 'row.' for UNWIND row.
+        :return:
+        """
+        prop_body = self._create_props_body(node_record, NODE_REQUIRED_KEYS, 'node', param_prefix=param_prefix)
+        if self.is_create_only_node(node_record):
+            return f'ON CREATE SET {prop_body}'
+        if not self._change_detection:
+            return f'ON CREATE SET {prop_body} ON MATCH SET {prop_body}'
+
+        return self._create_change_detection_set_clause(['node'], prop_body, param_prefix)
+
+    def _create_change_detection_set_clause(self, identifiers: List[str], prop_body: str, param_prefix: str) -> str:
+        """
+        Creates SET clauses that store the content hash on creation, and only update properties on match when the
+        hash stored on the first identifier differs. FOREACH is used instead of WITH ... WHERE so that the statement
+        still returns a row for unchanged records.
+
+        e.g:
+        ON CREATE SET node.name = $name, ..., node.publisher_content_hash = $publisher_content_hash
+        ON MATCH SET node.published_tag = 'tag', node.publisher_last_updated_epoch_ms = timestamp()
+        FOREACH (_ IN CASE WHEN coalesce(node.publisher_content_hash, '') <> $publisher_content_hash
+                 THEN [1] ELSE [] END |
+                 SET node.name = $name, ..., node.publisher_content_hash = $publisher_content_hash)
+
+        :param identifiers: identifiers of node or relationships that the properties are set on
+        :param prop_body: Properties body from _create_props_body
+        :param param_prefix: how a value is referenced in CYPHER query. '$' for parameter, 'row.' for UNWIND row.
+        :return:
+        """
+        content_hash = f'{param_prefix}{CONTENT_HASH_PROPERTY_NAME}'
+        hash_body = ', '.join(f'{identifier}.{CONTENT_HASH_PROPERTY_NAME} = {content_hash}'
+                              for identifier in identifiers)
+
+        clauses = [f'ON CREATE SET {prop_body}, {hash_body}']
+        if self._touch_unchanged:
+            touch_body = ', '.join(self._create_publish_tag_body(identifier) for identifier in identifiers)
+            clauses.append(f'ON MATCH SET {touch_body}')
+        clauses.append(f"FOREACH (_ IN CASE WHEN coalesce({identifiers[0]}.{CONTENT_HASH_PROPERTY_NAME}, '') "
+                       f"<> {content_hash} THEN [1] ELSE [] END | SET {prop_body}, {hash_body})")
+        return '\n'.join(clauses)
+
+    def _get_content_hash_keys(self, record: dict, excludes: Set) -> Optional[List[str]]:
+        """
+        Returns header keys of record that the content hash is computed from, or None without NEO4J_CHANGE_DETECTION.
+        """
+        if not self._change_detection:
+            return None
+        return sorted(k for k in record.keys() if k not in excludes)
 
     def _publish_relation(self, relation_file: str, tx: Transaction) -> Transaction:
         """
@@ -297,52 +920,194 @@ class Neo4jCsvPublisher(Publisher):
         MERGE (n1)-[r1:COLUMN]->(n2)-[r2:BELONG_TO_TABLE]->(n1)
         RETURN n1.key, n2.key
 
+        With RELATION_PREPROCESSOR, pre-processing statements of all the relations in the file are executed before any
+        of them is merged, so that pre-processing (e.g: delete) never undoes a relation merged from the same file.
+
+        :param relation_file:
+        :return:
+        """
+        preprocess = self._relation_preprocessor.is_perform_preprocess()
+        if preprocess:
+            tx = self._preprocess_relations(relation_file, tx=tx)
+
+        # Relations of a committed prefix would be pre-processed again on resume, which could undo them.
+        # The file can only be resumed as a whole.
+        progress = self._start_progress(relation_file, resumable=not preprocess)
+        return self._publish_relation_records(progress.track(self._read_records(relation_file)), tx=tx,
+                                              progress=progress)
+
+    def _publish_relation_records(self,
+                                  rel_records: Iterable[dict],
+                                  tx: Transaction,
+                                  progress: Optional['_FileProgress'] = None) -> Transaction:
+        """
+        Creates relations of the records, either one statement per record or in UNWIND batches.
+        :param rel_records:
+        :param tx:
+        :param progress: Progress of the relation file the records are from, if any
+        :return:
+        """
+        if self._unwind_batch_size > 0:
+            return self._publish_relation_batches(rel_records, tx=tx, progress=progress)
+
+        for rel_record in rel_records:
+            self._metrics.incr(f'relations.{rel_record[RELATION_TYPE]}')
+            compiled = self._get_relation_statement(rel_record)
+            tx = self._execute_statement(compiled.statement, tx, compiled.bind(rel_record),
+                                         expect_result=self._confirm_rel_created)
+
+        return tx
+
+    def _publish_relation_batches(self,
+                                  rel_records: Iterable[dict],
+                                  tx: Transaction,
+                                  progress: Optional['_FileProgress'] = None) -> Transaction:
+        """
+        Same as _publish_relation_records, but groups the records by labels, types and header, and executes one UNWIND
+        statement per batch of NEO4J_UNWIND_BATCH_SIZE records.
+
+        Example of Cypher query executed by this method:
+        UNWIND $batch AS row
+        MATCH (n1:Table {key: row.START_KEY}), (n2:Column {key: row.END_KEY})
+        MERGE (n1)-[r1:COLUMN]->(n2)-[r2:BELONG_TO_TABLE]->(n1)
+        RETURN count(*) AS count
+
+        :param rel_records:
+        :param tx:
+        :param progress:
+        :return:
+        """
+        for batch in self._iter_batches(rel_records, _relation_batch_key, progress):
+            tx = self._execute_relation_batch(batch, tx=tx)
+
+        return tx
+
+    def _preprocess_relations(self, relation_file: str, tx: Transaction) -> Transaction:
+        """
+        Executes pre-processing statements for the relations of the file, in batches of NEO4J_UNWIND_BATCH_SIZE
+        relations sharing types (or one by one without UNWIND batches). A relation is pre-processed once regardless of
+        its direction, as the same relation may be listed from both of its ends (e.g: lineage between tables).
         :param relation_file:
+        :param tx:
         :return:
         """
+        LOGGER.info('Pre-processing relation with %s', self._relation_preprocessor)
+
+        preprocessed: Set[FrozenSet[Tuple[str, str]]] = set()
+        for rel_records in self._iter_batches(self._read_records(relation_file), _relation_types_key):
+            relations = []
+            for rel_record in rel_records:
+                ends = frozenset(((rel_record[RELATION_START_LABEL], rel_record[RELATION_START_KEY]),
+                                  (rel_record[RELATION_END_LABEL], rel_record[RELATION_END_KEY])))
+                if ends not in preprocessed:
+                    preprocessed.add(ends)
+                    relations.append((rel_record[RELATION_START_LABEL], rel_record[RELATION_END_LABEL],
+                                      rel_record[RELATION_START_KEY], rel_record[RELATION_END_KEY]))
+
+            if not relations:
+                continue
 
-        if self._relation_preprocessor.is_perform_preprocess():
-            LOGGER.info('Pre-processing relation with %s', self._relation_preprocessor)
-
-            count = 0
-            with open(relation_file, 'r', encoding='utf8') as relation_csv:
-                for rel_record in pandas.read_csv(relation_csv, na_filter=False).to_dict(orient="records"):
-                    # TODO not sure if deadlock on badge node arises in preporcessing or not
-                    stmt, params = self._relation_preprocessor.preprocess_cypher(
-                        start_label=rel_record[RELATION_START_LABEL],
-                        end_label=rel_record[RELATION_END_LABEL],
-                        start_key=rel_record[RELATION_START_KEY],
-                        end_key=rel_record[RELATION_END_KEY],
-                        relation=rel_record[RELATION_TYPE],
-                        reverse_relation=rel_record[RELATION_REVERSE_TYPE])
-
-                    if stmt:
-                        tx = self._execute_statement(stmt, tx=tx, params=params)
-                        count += 1
-
-            LOGGER.info('Executed pre-processing Cypher statement %i times', count)
-
-        with open(relation_file, 'r', encoding='utf8') as relation_csv:
-            for rel_record in pandas.read_csv(relation_csv, na_filter=False).to_dict(orient="records"):
-                exception_exists = True
-                retries_for_exception = RETRIES_NUMBER
-                while exception_exists and retries_for_exception > 0:
-                    try:
-                        stmt = self.create_relationship_merge_statement(rel_record=rel_record)
-                        params = self._create_props_param(rel_record)
-                        tx = self._execute_statement(stmt, tx, params,
-                                                     expect_result=self._confirm_rel_created)
-                        exception_exists = False
-                    except TransientError as e:
-                        if rel_record[RELATION_START_LABEL] in self.deadlock_node_labels \
-                                or rel_record[RELATION_END_LABEL] in self.deadlock_node_labels:
-                            time.sleep(SLEEP_TIME)
-                            retries_for_exception -= 1
-                        else:
-                            raise e
+            for stmt, params in self._relation_preprocessor.preprocess_cypher_batch(
+                    relations,
+                    relation=rel_records[0][RELATION_TYPE],
+                    reverse_relation=rel_records[0][RELATION_REVERSE_TYPE]):
+                tx = self._execute_statement(stmt, tx=tx, params=params)
 
+        LOGGER.info('Pre-processed %i relations of %s', len(preprocessed), relation_file)
         return tx
 
+    def _execute_relation_batch(self, batch: List[dict], tx: Transaction) -> Transaction:
+        self._metrics.incr(f'relations.{batch[0][RELATION_TYPE]}', len(batch))
+        compiled = self._get_relation_statement(batch[0], unwind=True)
+        params = {'batch': [compiled.bind(rel_record) for rel_record in batch]}
+
+        result_validator = partial(self._confirm_relation_batch_created, batch[0], params) \
+            if self._confirm_rel_created else None
+        return self._execute_statement(compiled.statement, tx, params, result_validator=result_validator)
+
+    def _confirm_relation_batch_created(self,
+                                        rel_record: dict,
+                                        params: dict,
+                                        tx: Transaction,
+                                        result: Any) -> None:
+        """
+        Compares the number of matched node pairs returned by the UNWIND statement with the batch size. If some are
+        missing, it looks up which keys do not exist so that they can be reported.
+        :param rel_record: Any record of the batch
+        :param params: Parameters used for the batch
+        :param tx:
+        :param result: Result of UNWIND statement
+        :return:
+        """
+        record = result.single()
+        matched = record['count'] if record else 0
+        if matched == len(params['batch']):
+            return
+
+        stmt = self.create_unmatched_relationship_statement(rel_record=rel_record)
+        missing = [(r['start_key'], r['end_key']) for r in tx.run(stmt.encode('utf-8', 'ignore'), parameters=params)]
+        raise RuntimeError(f'Failed to create {len(params["batch"]) - matched} relation(s) '
+                           f'({rel_record[RELATION_START_LABEL]})-[{rel_record[RELATION_TYPE]}]->'
+                           f'({rel_record[RELATION_END_LABEL]}). Missing nodes for (START_KEY, END_KEY): {missing}')
+
+    def create_relationship_unwind_statement(self, rel_record: dict) -> str:
+        """
+        Creates relationship merge statement that UNWINDs a batch of records sharing labels, types and header with
+        rel_record. It returns number of matched node pairs.
+        :param rel_record: Any record of the batch
+        :return:
+        """
+        template = Template("""
+            UNWIND $batch AS row
+            MATCH (n1:{{ START_LABEL }} {key: row.START_KEY}), (n2:{{ END_LABEL }} {key: row.END_KEY})
+            MERGE (n1)-[r1:{{ TYPE }}]->(n2)-[r2:{{ REVERSE_TYPE }}]->(n1)
+            {{ SET_CLAUSE }}
+            RETURN count(*) AS count
+        """)
+
+        return template.render(START_LABEL=rel_record["START_LABEL"],
+                               END_LABEL=rel_record["END_LABEL"],
+                               TYPE=rel_record["TYPE"],
+                               REVERSE_TYPE=rel_record["REVERSE_TYPE"],
+                               SET_CLAUSE=self._create_relation_set_clause(rel_record, param_prefix='row.'))
+
+    def create_unmatched_relationship_statement(self, rel_record: dict) -> str:
+        """
+        Creates a statement that returns keys of the batch whose start or end node does not exist.
+        :param rel_record: Any record of the batch
+        :return:
+        """
+        template = Template("""
+            UNWIND $batch AS row
+            OPTIONAL MATCH (n1:{{ START_LABEL }} {key: row.START_KEY})
+            OPTIONAL MATCH (n2:{{ END_LABEL }} {key: row.END_KEY})
+            WITH row, n1, n2 WHERE n1 IS NULL OR n2 IS NULL
+            RETURN row.START_KEY AS start_key, row.END_KEY AS end_key
+        """)
+
+        return template.render(START_LABEL=rel_record["START_LABEL"],
+                               END_LABEL=rel_record["END_LABEL"])
+
+    def _get_relation_statement(self, rel_record: dict, unwind: bool = False) -> '_CompiledStatement':
+        """
+        Returns relationship merge statement compiled for the shape of rel_record. Statement is rendered only once per
+        labels, types and header, and cached for the rest of the records.
+        :param rel_record:
+        :param unwind: True for the UNWIND statement that takes a batch of records
+        :return:
+        """
+        header = tuple(rel_record.keys())
+        cache_key = (unwind, rel_record[RELATION_START_LABEL], rel_record[RELATION_END_LABEL],
+                     rel_record[RELATION_TYPE], rel_record[RELATION_REVERSE_TYPE], header)
+        compiled = self._statement_cache.get(cache_key)
+        if compiled is None:
+            stmt = self.create_relationship_unwind_statement(rel_record) if unwind \
+                else self.create_relationship_merge_statement(rel_record)
+            compiled = _CompiledStatement(stmt, header,
+                                          self._get_content_hash_keys(rel_record, RELATION_REQUIRED_KEYS))
+            self._statement_cache[cache_key] = compiled
+        return compiled
+
     def create_relationship_merge_statement(self, rel_record: dict) -> str:
         """
         Creates relationship merge statement
@@ -352,37 +1117,36 @@ class Neo4jCsvPublisher(Publisher):
         template = Template("""
             MATCH (n1:{{ START_LABEL }} {key: $START_KEY}), (n2:{{ END_LABEL }} {key: $END_KEY})
             MERGE (n1)-[r1:{{ TYPE }}]->(n2)-[r2:{{ REVERSE_TYPE }}]->(n1)
-            {% if update_prop_body %}
-            ON CREATE SET {{ prop_body }}
-            ON MATCH SET {{ prop_body }}
-            {% endif %}
+            {{ SET_CLAUSE }}
             RETURN n1.key, n2.key
         """)
 
-        prop_body_r1 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r1')
-        prop_body_r2 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r2')
-        prop_body = ' , '.join([prop_body_r1, prop_body_r2])
-
         return template.render(START_LABEL=rel_record["START_LABEL"],
                                END_LABEL=rel_record["END_LABEL"],
                                TYPE=rel_record["TYPE"],
                                REVERSE_TYPE=rel_record["REVERSE_TYPE"],
-                               update_prop_body=prop_body_r1,
-                               prop_body=prop_body)
+                               SET_CLAUSE=self._create_relation_set_clause(rel_record, param_prefix='$'))
 
-    def _create_props_param(self, record_dict: dict) -> dict:
-        params = {}
-        for k, v in record_dict.items():
-            if k.endswith(UNQUOTED_SUFFIX):
-                k = k[:-len(UNQUOTED_SUFFIX)]
+    def _create_relation_set_clause(self, rel_record: dict, param_prefix: str) -> str:
+        """
+        Creates SET clauses that follow relationship MERGE, setting the same properties on both directions.
+        :param rel_record:
+        :param param_prefix: how a value is referenced in CYPHER query. '$' for parameter, 'row.' for UNWIND row.
+        :return:
+        """
+        prop_body_r1 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r1', param_prefix=param_prefix)
+        prop_body_r2 = self._create_props_body(rel_record, RELATION_REQUIRED_KEYS, 'r2', param_prefix=param_prefix)
+        prop_body = ' , '.join([prop_body_r1, prop_body_r2])
+        if not self._change_detection:
+            return f'ON CREATE SET {prop_body} ON MATCH SET {prop_body}'
 
-            params[k] = v
-        return params
+        return self._create_change_detection_set_clause(['r1', 'r2'], prop_body, param_prefix)
 
     def _create_props_body(self,
                            record_dict: dict,
                            excludes: Set,
-                           identifier: str) -> str:
+                           identifier: str,
+                           param_prefix: str = '$') -> str:
         """
         Creates properties body with params required for resolving template.
 
@@ -392,6 +1156,7 @@ class Neo4jCsvPublisher(Publisher):
         :param record_dict: A dict represents CSV row
         :param excludes: set of excluded columns that does not need to be in properties (e.g: KEY, LABEL ...)
         :param identifier: identifier that will be used in CYPHER query as shown on above example
+        :param param_prefix: how a value is referenced in CYPHER query. '$' for parameter, 'row.' for UNWIND row.
         :return: Properties body for Cypher statement
         """
         props = []
@@ -399,21 +1164,23 @@ class Neo4jCsvPublisher(Publisher):
             if k in excludes:
                 continue
 
-            if k.endswith(UNQUOTED_SUFFIX):
-                k = k[:-len(UNQUOTED_SUFFIX)]
+            k = _to_param_key(k)
+            props.append(f'{identifier}.{k} = {param_prefix}{k}')
 
-            props.append(f'{identifier}.{k} = ${k}')
-
-        props.append(f"{identifier}.{PUBLISHED_TAG_PROPERTY_NAME} = '{self.publish_tag}'")
-        props.append(f"{identifier}.{LAST_UPDATED_EPOCH_MS} = timestamp()")
+        props.append(self._create_publish_tag_body(identifier))
 
         return ', '.join(props)
 
+    def _create_publish_tag_body(self, identifier: str) -> str:
+        return f"{identifier}.{PUBLISHED_TAG_PROPERTY_NAME} = '{self.publish_tag}', " \
+               f"{identifier}.{LAST_UPDATED_EPOCH_MS} = timestamp()"
+
     def _execute_statement(self,
                            stmt: str,
                            tx: Transaction,
                            params: dict = None,
-                           expect_result: bool = False) -> Transaction:
+                           expect_result: bool = False,
+                           result_validator: Optional[Callable[[Transaction, Any], None]] = None) -> Transaction:
         """
         Executes statement against Neo4j. If execution fails, it rollsback and raise exception.
         If 'expect_result' flag is True, it confirms if result object is not null.
@@ -421,23 +1188,37 @@ class Neo4jCsvPublisher(Publisher):
         :param tx:
         :param count:
         :param expect_result: By having this True, it will validate if result object is not None.
+        :param result_validator: A function called with transaction and result before it is committed. It is expected
+        to raise an exception if result is not valid.
         :return:
         """
+        statement = _PendingStatement(stmt, params, expect_result, result_validator)
         try:
             LOGGER.debug('Executing statement: %s with params %s', stmt, params)
 
-            result = tx.run(str(stmt).encode('utf-8', 'ignore'), parameters=params)
-            if expect_result and not result.single():
-                raise RuntimeError(f'Failed to executed statement: {stmt}')
-
-            self._count += 1
-            if self._count > 1 and self._count % self._transaction_size == 0:
-                tx.commit()
-                LOGGER.info(f'Committed {self._count} statements so far')
-                return self._session.begin_transaction()
-
-            if self._count > 1 and self._count % self._progress_report_frequency == 0:
-                LOGGER.info(f'Processed {self._count} statements so far')
+            start = time.time()
+            tx = self._run_with_retry(tx, partial(self._run_statement, statement))
+            self._metrics.record_statement(stmt, params, time.time() - start)
+            self._get_pending_statements().append(statement)
+            pending_rows = getattr(self._worker_local, 'pending_rows', 0) + _count_rows(params)
+            self._worker_local.pending_rows = pending_rows
+
+            with self._count_lock:
+                self._count += 1
+                count = self._count
+
+            # Commit cadence is per session so that each worker commits its own transactions
+            session_count = getattr(self._worker_local, 'count', 0) + 1
+            self._worker_local.count = session_count
+            # Committed early as well once the statements kept for replay hold NEO4J_MAX_REPLAY_ROWS rows
+            if (session_count > 1 and session_count % self._transaction_size == 0) \
+                    or 0 < self._max_replay_rows <= pending_rows:
+                self._commit(tx)
+                LOGGER.info(f'Committed {count} statements so far')
+                return self._get_session().begin_transaction()
+
+            if count > 1 and count % self._progress_report_frequency == 0:
+                LOGGER.info(f'Processed {count} statements so far')
 
             return tx
         except Exception as e:
@@ -446,6 +1227,120 @@ class Neo4jCsvPublisher(Publisher):
                 tx.rollback()
             raise e
 
+    def _run_statement(self, statement: '_PendingStatement', tx: Transaction) -> None:
+        result = tx.run(str(statement.stmt).encode('utf-8', 'ignore'), parameters=statement.params)
+        if statement.expect_result and not result.single():
+            raise RuntimeError(f'Failed to executed statement: {statement.stmt}')
+
+        if statement.result_validator:
+            statement.result_validator(tx, result)
+
+    def _commit(self, tx: Transaction) -> None:
+        """
+        Commits transaction. Transient failure on commit is retried by replaying the transaction.
+        :param tx:
+        :return:
+        """
+        start = time.time()
+        try:
+            self._run_with_retry(tx, methodcaller('commit'))
+        finally:
+            self._get_pending_statements().clear()
+            self._worker_local.pending_rows = 0
+        self._metrics.record_commit(time.time() - start)
+        self._checkpoint_committed_progress()
+
+    def _start_progress(self, file_path: str, resumable: bool = True) -> '_FileProgress':
+        """
+        Starts tracking how many rows of the file are published in this thread. With checkpoint, the progress is
+        recorded on commit, and rows committed by the previous run are skipped on resume.
+        :param file_path:
+        :param resumable: False if the file can only be checkpointed once it's completely published
+        :return:
+        """
+        progress = _FileProgress(file_path, self._committed_offsets.get(file_path, 0) if resumable else 0, resumable)
+        if progress.offset:
+            LOGGER.info('Skipping %i rows of %s committed by previous run', progress.offset, file_path)
+        if self._checkpoint_path:
+            self._get_open_progress().append(progress)
+        return progress
+
+    def _checkpoint_committed_progress(self) -> None:
+        """
+        Records progress of files that the just committed transaction of this thread published.
+        :return:
+        """
+        open_progress = self._get_open_progress()
+        if not open_progress or not self._checkpoint_path:
+            return
+
+        with self._checkpoint_lock:
+            for progress in open_progress:
+                if progress.is_completed():
+                    self._completed_files.add(progress.file_path)
+                    self._committed_offsets.pop(progress.file_path, None)
+                elif progress.resumable:
+                    self._committed_offsets[progress.file_path] = progress.committed_offset()
+            self._write_checkpoint(self._checkpoint_path)
+        open_progress[:] = [progress for progress in open_progress if not progress.is_completed()]
+
+    def _get_open_progress(self) -> List['_FileProgress']:
+        open_progress = getattr(self._worker_local, 'open_progress', None)
+        if open_progress is None:
+            open_progress = self._worker_local.open_progress = []
+        return open_progress
+
+    def _run_with_retry(self, tx: Transaction, action: Callable[[Transaction], None]) -> Transaction:
+        """
+        Performs action on the transaction. On a transient error, the transaction is rolled back and, after an
+        exponential backoff with jitter, statements executed so far in the transaction are replayed in a new
+        transaction before performing action again. Fails once NEO4J_TRANSIENT_ERROR_RETRIES is exhausted.
+        If it fails after a replay, the new transaction is rolled back, as the caller only knows the one it passed.
+        :param tx:
+        :param action:
+        :return: The transaction the action succeeded on
+        """
+        attempt = 0
+        replay = False
+        while True:
+            try:
+                if replay:
+                    for statement in self._get_pending_statements():
+                        self._run_statement(statement, tx)
+                action(tx)
+                return tx
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self._transient_error_retries:
+                    LOGGER.error('Transient error persisted after %i retries', attempt)
+                    _rollback_quietly(tx)
+                    raise e
+
+                attempt += 1
+                self._metrics.incr('retries')
+                delay = self._get_retry_delay(attempt)
+                LOGGER.warning('Transient error: %s. Replaying %i statements in a new transaction in %.1f seconds '
+                               '(retry %i of %i)', e, len(self._get_pending_statements()), delay, attempt,
+                               self._transient_error_retries)
+                _rollback_quietly(tx)
+                time.sleep(delay)
+                tx = self._get_session().begin_transaction()
+                replay = True
+            except Exception:
+                if replay:
+                    _rollback_quietly(tx)
+                raise
+
+    def _get_retry_delay(self, attempt: int) -> float:
+        # Exponential backoff with equal jitter
+        delay = min(self._retry_max_delay_sec, self._retry_base_delay_sec * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _get_pending_statements(self) -> List['_PendingStatement']:
+        pending_statements = getattr(self._worker_local, 'pending_statements', None)
+        if pending_statements is None:
+            pending_statements = self._worker_local.pending_statements = []
+        return pending_statements
+
     def _try_create_index(self, label: str) -> None:
         """
         For any label seen first time for this publisher it will try to create unique index.
@@ -465,3 +1360,179 @@ class Neo4jCsvPublisher(Publisher):
                 if 'An equivalent constraint already exists' not in e.__str__():
                     raise
                 # Else, swallow the exception, to make this function idempotent.
+
+
+class _CompiledStatement(object):
+    """
+    A Cypher statement rendered for a record shape, together with the mapping from CSV header to statement parameter.
+    Records of the same shape only need parameter binding, and Neo4j can reuse its query plan as the statement text is
+    identical across records.
+    """
+    __slots__ = ('statement', '_param_keys', '_content_hash_keys')
+
+    def __init__(self,
+                 statement: str,
+                 header: Iterable[str],
+                 content_hash_keys: Optional[List[str]] = None) -> None:
+        self.statement = statement
+        self._param_keys = [(k, _to_param_key(k)) for k in header]
+        self._content_hash_keys = content_hash_keys
+
+    def bind(self, record: dict) -> dict:
+        params = {param_key: record[k] for k, param_key in self._param_keys}
+        if self._content_hash_keys is not None:
+            params[CONTENT_HASH_PROPERTY_NAME] = _content_hash(record, self._content_hash_keys)
+        return params
+
+
+def _content_hash(record: dict, keys: List[str]) -> str:
+    """
+    Returns a hash of the values of keys in record that is stable across runs and processes.
+    """
+    content = '\x1e'.join(f'{k}\x1f{record[k]}' for k in keys)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _to_param_key(header_key: str) -> str:
+    if header_key.endswith(UNQUOTED_SUFFIX):
+        return header_key[:-len(UNQUOTED_SUFFIX)]
+    return header_key
+
+
+class _FileProgress(object):
+    """
+    Tracks rows of a file handed over for publishing. A row is not committed until the transaction it's executed in
+    is committed, and rows buffered in a partial UNWIND batch are not executed yet, so the committed prefix of the
+    file ends at the first buffered row.
+    """
+
+    def __init__(self, file_path: str, offset: int, resumable: bool) -> None:
+        self.file_path = file_path
+        # Number of rows read, including skipped ones
+        self.offset = offset
+        self.resumable = resumable
+        self.finished = False
+        # Offset of the first row of each partial batch
+        self.buffered: Dict[Any, int] = {}
+
+    def track(self, records: Iterable[dict]) -> Iterator[dict]:
+        """
+        Skips rows before the offset, and counts rows as they're read.
+        """
+        for record in itertools.islice(records, self.offset, None):
+            self.offset += 1
+            yield record
+        self.finished = True
+
+    def committed_offset(self) -> int:
+        return min(self.buffered.values(), default=self.offset)
+
+    def is_completed(self) -> bool:
+        return self.finished and not self.buffered
+
+
+_PendingStatement = namedtuple('_PendingStatement', ['stmt', 'params', 'expect_result', 'result_validator'])
+
+
+def _count_rows(params: Optional[dict]) -> int:
+    """
+    Number of rows the statement is executed with, which is the size of the batch for an UNWIND statement
+    """
+    if params and 'batch' in params:
+        return len(params['batch'])
+    return 1
+
+
+def _rollback_quietly(tx: Transaction) -> None:
+    try:
+        if not tx.closed():
+            tx.rollback()
+    except Exception:
+        LOGGER.warning('Failed to roll back transaction', exc_info=True)
+
+
+class _RelationPartition(object):
+    """
+    A bounded queue of relation row chunks consumed by one relation worker. Iterating it yields rows until closed.
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=RELATION_PARTITION_QUEUE_SIZE)
+        self._exhausted = False
+
+    def put(self, chunk: List[dict]) -> None:
+        self._queue.put(chunk)
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def __iter__(self) -> Iterator[dict]:
+        for chunk in iter(self._queue.get, None):
+            yield from chunk
+        self._exhausted = True
+
+    def drain(self) -> None:
+        """
+        Discards remaining chunks until it's closed.
+        """
+        if self._exhausted:
+            return
+        while self._queue.get() is not None:
+            pass
+        self._exhausted = True
+
+
+def _stream_csv_records(csv_file: IO[str]) -> Iterator[dict]:
+    """
+    Lazily parses CSV rows into dicts. Values of columns with UNQUOTED_SUFFIX are converted back to bool or number.
+    """
+    reader = csv.reader(csv_file)
+    header = next(reader, None)
+    if not header:
+        return
+
+    unquoted_indices = [i for i, k in enumerate(header) if k.endswith(UNQUOTED_SUFFIX)]
+    for row in reader:
+        for i in unquoted_indices:
+            row[i] = _parse_unquoted_value(row[i])
+        yield dict(zip(header, row))
+
+
+def _read_parquet_records(file_path: str) -> Iterator[dict]:
+    """
+    Reads Parquet file in record batches of PARQUET_READ_BATCH_SIZE rows. Requires pyarrow package.
+    :param file_path:
+    :return:
+    """
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=PARQUET_READ_BATCH_SIZE):
+        yield from batch.to_pylist()
+
+
+def _parse_unquoted_value(value: str) -> Any:
+    if value == 'True':
+        return True
+    if value == 'False':
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _node_batch_key(node_record: dict) -> Any:
+    return node_record[NODE_LABEL_KEY], tuple(node_record.keys())
+
+
+def _relation_batch_key(rel_record: dict) -> Any:
+    return (rel_record[RELATION_START_LABEL], rel_record[RELATION_END_LABEL],
+            rel_record[RELATION_TYPE], rel_record[RELATION_REVERSE_TYPE], tuple(rel_record.keys()))
+
+
+def _relation_types_key(rel_record: dict) -> Any:
+    return rel_record[RELATION_TYPE], rel_record[RELATION_REVERSE_TYPE]
@@ -5,7 +5,7 @@ import abc
 import logging
 import textwrap
 from typing import (
-    Dict, List, Optional, Tuple,
+    Any, Dict, List, Optional, Tuple,
 )
 
 LOGGER = logging.getLogger(__name__)
@@ -15,7 +15,8 @@ class RelationPreprocessor(object, metaclass=abc.ABCMeta):
     """
     A Preprocessor for relations. Prior to publish Neo4j relations, RelationPreprocessor will be used for
     pre-processing.
-    Neo4j Publisher will iterate through relation file and call preprocess_cypher to perform any pre-process requested.
+    Neo4j Publisher will iterate through relation file and call preprocess_cypher_batch, with the relations about to be
+    published, to perform any pre-process requested.
 
     For example, if you need current job's relation data to be desired state, you can add delete statement in
     pre-process_cypher method. With preprocess_cypher defined, and with long transaction size, Neo4j publisher will
@@ -55,6 +56,31 @@ class RelationPreprocessor(object, metaclass=abc.ABCMeta):
                                                reverse_relation=reverse_relation)
         return None
 
+    def preprocess_cypher_batch(self,
+                                relations: List[Tuple[str, str, str, str]],
+                                relation: str,
+                                reverse_relation: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Provides Cypher statements that will be executed before publishing a batch of relations.
+        By default, it is one statement per relation from preprocess_cypher. Override it to pre-process the batch
+        with fewer statements.
+        :param relations: A list of (start_label, end_label, start_key, end_key)
+        :param relation:
+        :param reverse_relation:
+        :return: A list of Cypher statement and its params
+        """
+        statements = []
+        for start_label, end_label, start_key, end_key in relations:
+            statement = self.preprocess_cypher(start_label=start_label,
+                                               end_label=end_label,
+                                               start_key=start_key,
+                                               end_key=end_key,
+                                               relation=relation,
+                                               reverse_relation=reverse_relation)
+            if statement:
+                statements.append(statement)
+        return statements
+
     @abc.abstractmethod
     def preprocess_cypher_impl(self,
                                start_label: str,
@@ -133,6 +159,9 @@ class DeleteRelationPreprocessor(RelationPreprocessor):
     Amundsen data is not complete, you can increase Neo4jPublisher's transaction size to make it atomic. However,
     note that you should not set transaction size too big as Neo4j uses memory to store transaction and this use case
     is proper for small size of batch job.
+
+    Neo4jPublisher calls preprocess_cypher_batch, which deletes the relations of a batch with one UNWIND statement per
+    pair of labels. Calling preprocess_cypher directly still provides one DELETE statement per relation.
     """
     RELATION_MERGE_TEMPLATE = textwrap.dedent("""
     MATCH (n1:{start_label} {{key: $start_key }})-[r]-(n2:{end_label} {{key: $end_key }})
@@ -142,6 +171,17 @@ class DeleteRelationPreprocessor(RelationPreprocessor):
     RETURN count(*) as count;
     """)
 
+    # Same as RELATION_MERGE_TEMPLATE, for a batch of start and end keys sharing labels
+    RELATION_BATCH_DELETE_TEMPLATE = textwrap.dedent("""
+    UNWIND $batch AS row
+    MATCH (n1:{start_label} {{key: row.start_key }})-[r]-(n2:{end_label} {{key: row.end_key }})
+    {where_clause}
+    WITH row, collect(r)[..2] AS rels
+    UNWIND rels AS r
+    DELETE r
+    RETURN count(*) as count;
+    """)
+
     def __init__(self,
                  label_tuples: List[Tuple[str, str]] = None,
                  where_clause: str = '') -> None:
@@ -151,6 +191,8 @@ class DeleteRelationPreprocessor(RelationPreprocessor):
         reversed_label_tuples = [(t2, t1) for t1, t2 in self._label_tuples]
         self._label_tuples.update(reversed_label_tuples)
         self._where_clause = where_clause
+        # Statements rendered per template and label pair
+        self._statements: Dict[Tuple[str, str, str], str] = {}
 
     def preprocess_cypher_impl(self,
                                start_label: str,
@@ -170,13 +212,49 @@ class DeleteRelationPreprocessor(RelationPreprocessor):
         :return:
         """
 
-        if not (start_label or end_label or start_key or end_key):
+        if not (start_label and end_label and start_key and end_key):
             raise Exception(f'all labels and keys are required: {locals()}')
 
         params = {'start_key': start_key, 'end_key': end_key}
-        return DeleteRelationPreprocessor.RELATION_MERGE_TEMPLATE.format(start_label=start_label,
-                                                                         end_label=end_label,
-                                                                         where_clause=self._where_clause), params
+        return self._get_statement(DeleteRelationPreprocessor.RELATION_MERGE_TEMPLATE, start_label, end_label), params
+
+    def preprocess_cypher_batch(self,
+                                relations: List[Tuple[str, str, str, str]],
+                                relation: str,
+                                reverse_relation: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Provides one UNWIND DELETE Relation Cypher query per pair of labels in the batch.
+        :param relations: A list of (start_label, end_label, start_key, end_key)
+        :param relation:
+        :param reverse_relation:
+        :return:
+        """
+        batches: Dict[Tuple[str, str], List[Dict[str, str]]] = {}
+        for start_label, end_label, start_key, end_key in relations:
+            if not self.filter(start_label=start_label,
+                               end_label=end_label,
+                               start_key=start_key,
+                               end_key=end_key,
+                               relation=relation,
+                               reverse_relation=reverse_relation):
+                continue
+
+            if not (start_label and end_label and start_key and end_key):
+                raise Exception(f'all labels and keys are required: {(start_label, end_label, start_key, end_key)}')
+
+            batches.setdefault((start_label, end_label), []).append({'start_key': start_key, 'end_key': end_key})
+
+        return [(self._get_statement(DeleteRelationPreprocessor.RELATION_BATCH_DELETE_TEMPLATE, start_label, end_label),
+                 {'batch': batch})
+                for (start_label, end_label), batch in batches.items()]
+
+    def _get_statement(self, template: str, start_label: str, end_label: str) -> str:
+        key = (template, start_label, end_label)
+        statement = self._statements.get(key)
+        if statement is None:
+            statement = template.format(start_label=start_label, end_label=end_label, where_clause=self._where_clause)
+            self._statements[key] = statement
+        return statement
 
     def is_perform_preprocess(self) -> bool:
         return True
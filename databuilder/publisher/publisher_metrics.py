@@ -0,0 +1,153 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import bisect
+import heapq
+import itertools
+import json
+import logging
+import reprlib
+import threading
+import time
+from collections import Counter
+from typing import (
+    Any, Dict, List, Optional, Tuple,
+)
+
+from statsd import StatsClient
+
+LOGGER = logging.getLogger(__name__)
+
+# Upper bounds of commit latency histogram buckets
+COMMIT_LATENCY_BUCKETS_SEC = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60]
+
+MAX_STATEMENT_LENGTH = 500
+
+# Limits how much of the statement params is kept for slowest statements, as an UNWIND batch can be large
+_PARAMS_REPR = reprlib.Repr()
+_PARAMS_REPR.maxlevel = 3
+_PARAMS_REPR.maxdict = 10
+_PARAMS_REPR.maxlist = 3
+_PARAMS_REPR.maxstring = 100
+_PARAMS_REPR.maxother = 100
+
+
+class PublisherMetrics(object):
+    """
+    Collects counters, statement latencies and commit latencies of a publish run. Commit latencies are emitted through
+    statsd as they happen, and the rest once the run finishes, if statsd client is provided.
+    The run is also summarized as a report that can be written as a JSON file.
+    It is thread safe so that publisher workers can share it.
+    """
+
+    def __init__(self,
+                 statsd: Optional[StatsClient] = None,
+                 prefix: str = 'publisher',
+                 slowest_statement_count: int = 10) -> None:
+        self._statsd = statsd
+        self._prefix = prefix
+        self._slowest_statement_count = slowest_statement_count
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+        self._commit_latencies: List[float] = []
+        # Min-heap of (duration, sequence, statement, params) so that the fastest of the slowest is replaced first
+        self._slowest_statements: List[Tuple[float, int, str, str]] = []
+        self._sequence = itertools.count()
+        self._start = time.time()
+        self._end: Optional[float] = None
+        self._is_success: Optional[bool] = None
+
+    def incr(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += count
+
+    def record_statement(self, stmt: str, params: Optional[dict], duration_sec: float) -> None:
+        """
+        Counts a statement, and keeps it if it is one of the slowest so far with its params truncated.
+        """
+        with self._lock:
+            self._counters['statements'] += 1
+            if len(self._slowest_statements) >= self._slowest_statement_count:
+                if not self._slowest_statements or duration_sec <= self._slowest_statements[0][0]:
+                    return
+                heapq.heappop(self._slowest_statements)
+
+            heapq.heappush(self._slowest_statements,
+                           (duration_sec,
+                            next(self._sequence),
+                            ' '.join(stmt.split())[:MAX_STATEMENT_LENGTH],
+                            _PARAMS_REPR.repr(params)))
+
+    def record_commit(self, duration_sec: float) -> None:
+        with self._lock:
+            self._counters['commits'] += 1
+            self._commit_latencies.append(duration_sec)
+
+        if self._statsd:
+            self._statsd.timing(f'{self._prefix}.commit', duration_sec * 1000)
+
+    def finish(self, is_success: bool) -> Dict[str, Any]:
+        """
+        Marks the end of the run and emits counters, throughput and elapsed time through statsd.
+        :param is_success:
+        :return: Run report
+        """
+        self._end = time.time()
+        self._is_success = is_success
+        report = self.get_report()
+
+        if self._statsd:
+            with self._statsd.pipeline() as pipe:
+                for name, count in report['counters'].items():
+                    pipe.incr(f'{self._prefix}.{name}', count)
+                pipe.gauge(f'{self._prefix}.statements_per_sec', report['statements_per_sec'])
+                pipe.timing(f'{self._prefix}.elapsed', report['elapsed_sec'] * 1000)
+
+        return report
+
+    def get_report(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = (self._end or time.time()) - self._start
+            counters = dict(sorted(self._counters.items()))
+            commit_latencies = sorted(self._commit_latencies)
+            slowest_statements = sorted(self._slowest_statements, reverse=True)
+
+        return {
+            'success': self._is_success,
+            'elapsed_sec': elapsed,
+            'statements_per_sec': counters.get('statements', 0) / elapsed if elapsed > 0 else 0.0,
+            'counters': counters,
+            'commit_latency': _summarize_latencies(commit_latencies),
+            'slowest_statements': [{'duration_sec': duration, 'statement': stmt, 'params': params}
+                                   for duration, _, stmt, params in slowest_statements],
+        }
+
+    def write_report(self, path: str) -> None:
+        LOGGER.info('Writing run report to %s', path)
+        with open(path, 'w', encoding='utf8') as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+
+
+def _summarize_latencies(sorted_latencies: List[float]) -> Dict[str, Any]:
+    """
+    Summarizes latencies with percentiles and a histogram over COMMIT_LATENCY_BUCKETS_SEC.
+    """
+    histogram = Counter(bisect.bisect_left(COMMIT_LATENCY_BUCKETS_SEC, latency) for latency in sorted_latencies)
+    bucket_names = [f'<={bound}' for bound in COMMIT_LATENCY_BUCKETS_SEC] + [f'>{COMMIT_LATENCY_BUCKETS_SEC[-1]}']
+
+    summary: Dict[str, Any] = {'count': len(sorted_latencies)}
+    if sorted_latencies:
+        summary.update({
+            'mean_sec': sum(sorted_latencies) / len(sorted_latencies),
+            'p50_sec': _percentile(sorted_latencies, 0.5),
+            'p95_sec': _percentile(sorted_latencies, 0.95),
+            'p99_sec': _percentile(sorted_latencies, 0.99),
+            'max_sec': sorted_latencies[-1],
+        })
+    summary['histogram'] = {name: histogram[i] for i, name in enumerate(bucket_names)}
+    return summary
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    # Nearest-rank percentile
+    return sorted_values[max(0, int(round(percentile * len(sorted_values))) - 1)]
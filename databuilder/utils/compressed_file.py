@@ -0,0 +1,88 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import io
+from typing import (
+    IO, Any, Optional,
+)
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+# File extension of each compression. Readers pick the compression by the extension.
+EXTENSIONS = {GZIP: '.gz', ZSTD: '.zst'}
+
+GZIP_COMPRESS_LEVEL = 6
+ZSTD_COMPRESS_LEVEL = 3
+
+
+def get_extension(compression: Optional[str]) -> str:
+    """
+    :param compression: None, GZIP or ZSTD
+    :return: File extension of the compression, empty for None
+    """
+    if not compression:
+        return ''
+
+    if compression not in EXTENSIONS:
+        raise ValueError(f'Unsupported compression {compression}. Supported: {sorted(EXTENSIONS)}')
+    return EXTENSIONS[compression]
+
+
+def strip_extension(file_name: str) -> str:
+    """
+    Removes the compression extension from the file name, if any.
+    """
+    for extension in EXTENSIONS.values():
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+
+def open_text(path: str,
+              mode: str = 'r',
+              encoding: str = 'utf8',
+              newline: Optional[str] = None,
+              buffering: int = -1) -> IO[str]:
+    """
+    Opens a text file that is compressed according to its extension, or a plain file otherwise.
+    Appending adds a new gzip member or zstd frame, which are read back as one stream.
+    zstd requires zstandard package (pip install amundsen-databuilder[zstd]).
+    :param path:
+    :param mode: 'r', 'w' or 'a'
+    :param encoding:
+    :param newline:
+    :param buffering: Buffer size of the underlying file in bytes
+    :return:
+    """
+    if path.endswith(EXTENSIONS[GZIP]):
+        binary: Any = _GzipFile(open(path, f'{mode}b', buffering=buffering), mode)
+    elif path.endswith(EXTENSIONS[ZSTD]):
+        import zstandard
+
+        file_obj = open(path, f'{mode}b', buffering=buffering)
+        if mode == 'r':
+            binary = zstandard.ZstdDecompressor().stream_reader(file_obj, read_across_frames=True, closefd=True)
+        else:
+            binary = zstandard.ZstdCompressor(level=ZSTD_COMPRESS_LEVEL).stream_writer(file_obj, closefd=True)
+    else:
+        return open(path, mode, encoding=encoding, newline=newline, buffering=buffering)
+
+    return io.TextIOWrapper(binary, encoding=encoding, newline=newline)
+
+
+class _GzipFile(gzip.GzipFile):
+    """
+    GzipFile that also closes the file object it's given, so that it can be opened with a buffer size.
+    """
+
+    def __init__(self, file_obj: IO[bytes], mode: str) -> None:
+        super(_GzipFile, self).__init__(fileobj=file_obj, mode=f'{mode}b', compresslevel=GZIP_COMPRESS_LEVEL)
+        self._file_obj = file_obj
+
+    def close(self) -> None:
+        try:
+            super(_GzipFile, self).close()
+        finally:
+            self._file_obj.close()
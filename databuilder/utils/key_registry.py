@@ -0,0 +1,71 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class KeyRegistry(object):
+    """
+    Remembers keys of nodes and relations that models already serialized in a job run, so that a node or relation
+    shared by many records (e.g. Database, Cluster and Schema of tables) is serialized once.
+    Memory is bounded by keeping up to max_keys keys, evicting the least recently used one. An evicted key is
+    serialized again the next time it's seen, which is harmless as publishers merge nodes and relations by key.
+    With hash_keys, keys are kept as 128 bit digests instead of the keys themselves.
+    """
+
+    def __init__(self,
+                 max_keys: int = 100000,
+                 hash_keys: bool = False) -> None:
+        self._max_keys = max_keys
+        self._hash_keys = hash_keys
+        self._keys: OrderedDict = OrderedDict()
+
+    def add(self, key: Hashable) -> bool:
+        """
+        Remembers the key.
+        :param key:
+        :return: True if the key was not remembered before, i.e. it should be serialized
+        """
+        if self._hash_keys:
+            key = hashlib.blake2b(repr(key).encode('utf8'), digest_size=16).digest()
+
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return False
+
+        self._keys[key] = None
+        if len(self._keys) > self._max_keys:
+            self._keys.popitem(last=False)
+        return True
+
+    def clear(self) -> None:
+        self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+_key_registry = KeyRegistry()
+
+
+def get_key_registry() -> KeyRegistry:
+    """
+    :return: KeyRegistry of the current job run, shared by all models
+    """
+    return _key_registry
+
+
+def reset_key_registry(key_registry: Optional[KeyRegistry] = None) -> None:
+    """
+    Starts over with the given KeyRegistry, or an empty default one, so that keys serialized in a previous job run
+    are neither suppressed nor kept in memory. DefaultJob resets it when it's launched and when it's done.
+    :param key_registry:
+    :return:
+    """
+    global _key_registry
+    if key_registry is None:
+        key_registry = KeyRegistry()
+    key_registry.clear()
+    _key_registry = key_registry
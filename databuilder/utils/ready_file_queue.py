@@ -0,0 +1,79 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import queue
+import threading
+from collections import namedtuple
+from typing import (
+    Any, Dict, Iterator, Optional,
+)
+
+# Config key of the ReadyFileQueue, shared by the loader and the publisher it hands files over to.
+READY_FILE_QUEUE = 'ready_file_queue'
+
+NODE = 'node'
+RELATION = 'relation'
+
+ReadyFile = namedtuple('ReadyFile', ['kind', 'path', 'manifest_entry'])
+
+
+class ReadyFileQueue(object):
+    """
+    Hands over completed staging files from a loader to a publisher that runs concurrently, in the order they are
+    completed. Iterating the queue blocks until the next file is ready, and ends once the loader closes it.
+    If extraction fails, the job aborts the queue so that the publisher rolls back its open transaction and stops.
+    Files committed before then stay published, so a failed job can leave partial data behind, as with a publisher
+    failing midway. If the publisher fails, the job rejects the queue so that the loader, and the task, stop too.
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue = queue.Queue()
+        self._aborted = threading.Event()
+        self._rejected = threading.Event()
+        self._closed = threading.Event()
+
+    def __copy__(self) -> 'ReadyFileQueue':
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'ReadyFileQueue':
+        # Config is copied when scoped or merged with defaults, while loader and publisher need the same queue
+        return self
+
+    def put(self, kind: str, path: str, manifest_entry: Optional[Dict[str, Any]] = None) -> None:
+        """
+        :param kind: NODE or RELATION
+        :param path: Path of a file that is completely written
+        :param manifest_entry: Manifest entry of the file, same as the one in the loader's manifest
+        """
+        if self._rejected.is_set():
+            raise RuntimeError('Ready file queue is rejected as the publisher stopped')
+        self._queue.put(ReadyFile(kind, path, manifest_entry))
+
+    def close(self) -> None:
+        """
+        Ends iteration after the files put so far. Closing more than once is a no-op, as both the loader and the job
+        close it.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._queue.put(None)
+
+    def abort(self) -> None:
+        self._aborted.set()
+        self._queue.put(None)
+
+    def reject(self) -> None:
+        """
+        Makes further put fail, once nothing consumes the queue anymore.
+        """
+        self._rejected.set()
+
+    def __iter__(self) -> Iterator[ReadyFile]:
+        for ready_file in iter(self._queue.get, None):
+            if self._aborted.is_set():
+                break
+            yield ready_file
+
+        if self._aborted.is_set():
+            raise RuntimeError('Ready file queue is aborted')
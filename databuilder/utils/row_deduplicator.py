@@ -0,0 +1,103 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import logging
+import math
+from typing import (
+    Any, Iterator, Optional, Set, Tuple,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RowDeduplicator(object):
+    """
+    Tells whether a row was seen before. Rows are remembered by a 128 bit digest of their representation, exactly
+    until max_exact_rows are remembered. Beyond it, digests spill into a Bloom filter so that memory stays bounded,
+    at the cost of dropping a unique row with probability of bloom_error_rate while the filter holds no more than
+    bloom_capacity rows.
+    """
+
+    def __init__(self,
+                 max_exact_rows: int = 1000000,
+                 bloom_capacity: int = 10000000,
+                 bloom_error_rate: float = 1e-6) -> None:
+        self._max_exact_rows = max_exact_rows
+        self._bloom_capacity = bloom_capacity
+        self._bloom_error_rate = bloom_error_rate
+        self._digests: Set[bytes] = set()
+        self._bloom_filter: Optional[BloomFilter] = None
+        self.row_count = 0
+        self.duplicate_count = 0
+
+    def is_duplicate(self, row: Tuple[Any, ...]) -> bool:
+        """
+        Remembers the row, and tells whether it was seen before.
+        :param row: A tuple that identifies the file (or header) of the row, and values of the row.
+        :return:
+        """
+        self.row_count += 1
+        digest = hashlib.blake2b(repr(row).encode('utf8'), digest_size=16).digest()
+
+        if self._bloom_filter is not None:
+            is_duplicate = self._bloom_filter.add(digest)
+        elif digest in self._digests:
+            is_duplicate = True
+        else:
+            is_duplicate = False
+            self._digests.add(digest)
+            if len(self._digests) >= self._max_exact_rows:
+                self._spill()
+
+        if is_duplicate:
+            self.duplicate_count += 1
+        return is_duplicate
+
+    def _spill(self) -> None:
+        LOGGER.info('Deduplicating more than %i rows. Spilling into Bloom filter with capacity %i, error rate %s',
+                    self._max_exact_rows, self._bloom_capacity, self._bloom_error_rate)
+        self._bloom_filter = BloomFilter(self._bloom_capacity, self._bloom_error_rate)
+        for digest in self._digests:
+            self._bloom_filter.add(digest)
+        self._digests = set()
+
+
+class BloomFilter(object):
+    """
+    Bloom filter over digests of at least 16 bytes, sized for capacity and error rate. Bit positions are derived from
+    the digest by double hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self._bit_count = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self._hash_count = max(1, int(round(self._bit_count / capacity * math.log(2))))
+        self._bits = bytearray((self._bit_count + 7) // 8)
+        self._capacity = capacity
+        self._count = 0
+
+    def add(self, digest: bytes) -> bool:
+        """
+        Adds the digest.
+        :param digest:
+        :return: True if the digest was (possibly) added before
+        """
+        exists = True
+        for position in self._positions(digest):
+            byte_index, bit = divmod(position, 8)
+            mask = 1 << bit
+            if not self._bits[byte_index] & mask:
+                exists = False
+                self._bits[byte_index] |= mask
+
+        if not exists:
+            self._count += 1
+            if self._count == self._capacity + 1:
+                LOGGER.warning('Bloom filter exceeds its capacity %i. Error rate will increase.', self._capacity)
+        return exists
+
+    def _positions(self, digest: bytes) -> Iterator[int]:
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        for i in range(self._hash_count):
+            yield (h1 + i * h2) % self._bit_count
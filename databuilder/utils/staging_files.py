@@ -0,0 +1,16 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+# Names of the staging files shared by the loaders that write node and relation files and the publishers that read
+# them.
+
+# A file written by FsNeo4jCSVLoader in each of node and relation directories. It maps a file name to its
+# labels (or start label, end label and type for relations), header and row count.
+MANIFEST_FILE_NAME = '_manifest.json'
+
+# A file written by publisher in node directory with NEO4J_CHECKPOINT. It has the publish tag, committed row offsets of
+# partially published files and the list of published files.
+CHECKPOINT_FILE_NAME = '_checkpoint.json'
+
+# Extension of files written by FsNeo4jParquetLoader. These are read in record batches instead of as CSV.
+PARQUET_EXTENSION = '.parquet'
@@ -0,0 +1,64 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This is a benchmark script measuring the memory held by ColumnMetadata.
+
+It builds 10000 TableMetadata records with 20 columns each, the way an
+extractor such as CsvTableColumnExtractor keeps them in memory, and reports
+the bytes allocated per column with tracemalloc, including each column's
+share of its table. Column types, descriptions and badges are created as
+distinct but equal strings, as they would be when parsed from a source, and
+half of the descriptions are repeated. Run it on two revisions to compare
+them:
+
+    python example/scripts/benchmark_column_metadata_memory.py
+"""
+
+import gc
+import tracemalloc
+from typing import List, Optional
+
+from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+
+COLUMN_COUNT = 200000
+COLUMNS_PER_TABLE = 20
+TYPES = ['string', 'bigint', 'timestamp', 'double', 'boolean']
+DESCRIPTIONS = ['Partition date', 'Primary key', 'Created at', None]
+
+
+def parsed(value: str) -> str:
+    # Strings parsed from an extractor source are distinct objects even when they are equal
+    return (value + '.')[:-1]
+
+
+def create_tables() -> List[TableMetadata]:
+    tables = []
+    for t in range(COLUMN_COUNT // COLUMNS_PER_TABLE):
+        columns = []
+        for c in range(COLUMNS_PER_TABLE):
+            i = t * COLUMNS_PER_TABLE + c
+            description: Optional[str] = f'Column {i} of the table'
+            if i % 2:
+                repeated = DESCRIPTIONS[i % 4]
+                description = parsed(repeated) if repeated is not None else None
+            badges = [parsed('pii')] if i % 10 == 0 else None
+            columns.append(ColumnMetadata(f'col_{c}', description, parsed(TYPES[i % 5]), c, badges))
+        tables.append(TableMetadata('bigquery', 'gold', f'schema_{t % 10}', f'table_{t}', None, columns))
+    return tables
+
+
+def main() -> None:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tables = create_tables()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print(f'{len(tables)} tables, {size / COLUMN_COUNT:.0f} bytes per column, '
+          f'{size / 2 ** 20:.1f} MiB for {COLUMN_COUNT} columns')
+
+
+if __name__ == '__main__':
+    main()
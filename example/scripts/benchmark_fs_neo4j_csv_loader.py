@@ -0,0 +1,76 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This is a benchmark script measuring the throughput of FsNeo4jCSVLoader.
+
+It loads 2000 TableMetadata records with 20 columns each into a temporary
+staging directory and reports the best of 3 runs, including the time the
+models spend generating their nodes and relations. Run it on two revisions
+to compare them:
+
+    python example/scripts/benchmark_fs_neo4j_csv_loader.py
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import (
+    Iterator, List, Tuple,
+)
+
+from pyhocon import ConfigFactory
+
+from databuilder.loader.file_system_neo4j_csv_loader import FsNeo4jCSVLoader
+from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+from databuilder.utils.staging_files import MANIFEST_FILE_NAME
+
+TABLE_COUNT = 2000
+COLUMN_COUNT = 20
+RUN_COUNT = 3
+
+
+def create_tables(count: int) -> Iterator[TableMetadata]:
+    for i in range(count):
+        columns = [ColumnMetadata(f'col{j}', f'col description {j}', 'bigint', j) for j in range(COLUMN_COUNT)]
+        yield TableMetadata('hive', 'gold', f'schema{i % 10}', f'table{i}', f'description {i}', columns,
+                            tags=['tag1', 'tag2'])
+
+
+def count_rows(staging_dir: str) -> int:
+    rows = 0
+    for sub_dir in ('nodes', 'relationships'):
+        with open(os.path.join(staging_dir, sub_dir, MANIFEST_FILE_NAME)) as manifest:
+            rows += sum(entry['row_count'] for entry in json.load(manifest).values())
+    return rows
+
+
+def run_once(records: List[TableMetadata]) -> Tuple[float, int]:
+    staging_dir = tempfile.mkdtemp()
+    try:
+        loader = FsNeo4jCSVLoader()
+        loader.init(ConfigFactory.from_dict({
+            FsNeo4jCSVLoader.NODE_DIR_PATH: os.path.join(staging_dir, 'nodes'),
+            FsNeo4jCSVLoader.RELATION_DIR_PATH: os.path.join(staging_dir, 'relationships'),
+            FsNeo4jCSVLoader.SHOULD_DELETE_CREATED_DIR: False,
+        }))
+        start = time.perf_counter()
+        for record in records:
+            loader.load(record)
+        loader.close()
+        elapsed = time.perf_counter() - start
+        return elapsed, count_rows(staging_dir)
+    finally:
+        shutil.rmtree(staging_dir)
+
+
+def main() -> None:
+    # Records are created up front and not reused, since each one serializes only once
+    best, row_count = min(run_once(list(create_tables(TABLE_COUNT))) for _ in range(RUN_COUNT))
+    print(f'{row_count} rows, best of {RUN_COUNT}: {best:.3f}s, {row_count / best:,.0f} rows/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -69,8 +69,19 @@ atlas = [
     'pyatlasclient==1.1.2'
 ]
 
+# To compress FsNeo4jCSVLoader staging files with zstd
+zstd = [
+    'zstandard>=0.15.0'
+]
+
+# To stage files in Parquet with FsNeo4jParquetLoader. iter_batches and RecordBatch.to_pylist need pyarrow 7, which
+# has no Python 3.6 wheels
+parquet = [
+    'pyarrow>=7.0.0; python_version>="3.7"'
+]
+
 all_deps = requirements + kafka + cassandra + glue + snowflake + athena + \
-    bigquery + jsonpath + db2 + dremio + druid + spark + feast
+    bigquery + jsonpath + db2 + dremio + druid + spark + feast + zstd + parquet
 
 setup(
     name='amundsen-databuilder',
@@ -97,7 +108,9 @@ setup(
         'druid': druid,
         'delta': spark,
         'feast': feast,
-        'atlas': atlas
+        'atlas': atlas,
+        'zstd': zstd,
+        'parquet': parquet
     },
     classifiers=[
         'Programming Language :: Python :: 3.6',
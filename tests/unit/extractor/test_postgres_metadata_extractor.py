@@ -3,14 +3,20 @@
 
 import logging
 import unittest
-from typing import Any, Dict
+from typing import (
+    Any, Dict, Iterable, List,
+)
 
 from mock import MagicMock, patch
 from pyhocon import ConfigFactory
 
 from databuilder.extractor.postgres_metadata_extractor import PostgresMetadataExtractor
 from databuilder.extractor.sql_alchemy_extractor import SQLAlchemyExtractor
+from databuilder.models.graph_serializable import GraphSerializable
 from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+from databuilder.models.table_metadata_batch import TableMetadataBatch
+from databuilder.serializers import neo4_serializer
+from databuilder.utils.key_registry import reset_key_registry
 
 
 class TestPostgresMetadataExtractor(unittest.TestCase):
@@ -208,6 +214,43 @@ class TestPostgresMetadataExtractor(unittest.TestCase):
             self.assertIsNone(extractor.extract())
             self.assertIsNone(extractor.extract())
 
+    def test_extraction_with_table_metadata_batch(self) -> None:
+        with patch.object(SQLAlchemyExtractor, '_get_connection') as mock_connection:
+            tables = [{'schema': 'test_schema1', 'name': f'test_table{i}', 'description': f'test table {i}',
+                       'cluster': self.conf[PostgresMetadataExtractor.CLUSTER_KEY]} for i in range(3)]
+            column_counts = [3, 1, 1]
+            mock_connection.return_value.execute.return_value = [
+                self._union({'col_name': f'col{j}',
+                             'col_type': 'varchar',
+                             'col_description': f'description of col{j}' if j else None,
+                             'col_sort_order': j}, table)
+                for table, column_count in zip(tables, column_counts) for j in range(column_count)]
+
+            conf = self.conf.copy()
+            conf.put(PostgresMetadataExtractor.TABLE_METADATA_BATCH_SIZE, 2)
+            extractor = PostgresMetadataExtractor()
+            extractor.init(conf)
+
+            # Batches end at a table boundary once they have 2 columns
+            batches = []
+            record = extractor.extract()
+            while isinstance(record, TableMetadataBatch):
+                batches.append(record)
+                record = extractor.extract()
+            self.assertIsNone(record)
+            self.assertEqual([repr(batch) for batch in batches],
+                             ['TableMetadataBatch(3 columns)', 'TableMetadataBatch(2 columns)'])
+
+            reset_key_registry()
+            actual = _serialize(batches)
+            reset_key_registry()
+            expected = _serialize([
+                TableMetadata('postgres', 'MY_CLUSTER', 'test_schema1', f'test_table{i}', f'test table {i}',
+                              [ColumnMetadata(f'col{j}', f'description of col{j}' if j else None, 'varchar', j)
+                               for j in range(column_count)])
+                for i, column_count in enumerate(column_counts)])
+            self.assertEqual(actual, expected)
+
     def _union(self,
                target: Dict[Any, Any],
                extra: Dict[Any, Any]) -> Dict[Any, Any]:
@@ -282,6 +325,14 @@ class TestPostgresMetadataExtractorNoClusterKeyNoTableCatalog(unittest.TestCase)
             self.assertTrue(PostgresMetadataExtractor.DEFAULT_CLUSTER_NAME in extractor.sql_stmt)
 
 
+def _serialize(records: Iterable[GraphSerializable]) -> List[List[Dict[str, Any]]]:
+    records = list(records)
+    nodes = [neo4_serializer.serialize_node(node) for record in records for node in record.iter_nodes()]
+    relations = [neo4_serializer.serialize_relationship(relation)
+                 for record in records for relation in record.iter_relations()]
+    return [sorted(nodes, key=repr), sorted(relations, key=repr)]
+
+
 class TestPostgresMetadataExtractorTableCatalogEnabled(unittest.TestCase):
     # test when USE_CATALOG_AS_CLUSTER_NAME is true (CLUSTER_KEY should be ignored)
     def setUp(self) -> None:
@@ -3,8 +3,11 @@
 
 import collections
 import csv
+import gzip
+import json
 import logging
 import os
+import shutil
 import unittest
 from operator import itemgetter
 from os import listdir
@@ -13,6 +16,9 @@ from typing import (
     Any, Callable, Dict, Iterable, Optional, Union,
 )
 
+import pytest
+from mock import MagicMock, patch
+from neo4j import GraphDatabase
 from pyhocon import ConfigFactory, ConfigTree
 
 from databuilder.job.base_job import Job
@@ -20,7 +26,12 @@ from databuilder.loader.file_system_neo4j_csv_loader import FsNeo4jCSVLoader
 from databuilder.models.graph_serializable import (
     GraphNode, GraphRelationship, GraphSerializable,
 )
-from tests.unit.models.test_graph_serializable import (
+from databuilder.publisher import neo4j_csv_publisher
+from databuilder.publisher.neo4j_csv_publisher import Neo4jCsvPublisher
+from databuilder.utils.ready_file_queue import ReadyFileQueue
+from databuilder.utils.row_deduplicator import RowDeduplicator
+from databuilder.utils.staging_files import CHECKPOINT_FILE_NAME, MANIFEST_FILE_NAME
+from tests.unit.models.movie import (
     Actor, City, Movie,
 )
 
@@ -60,6 +71,178 @@ class TestFsNeo4jCSVLoader(unittest.TestCase):
                                               itemgetter('START_KEY', 'END_KEY'))
         self.assertEqual(expected_relations, actual_relations)
 
+    def test_load_with_max_open_files(self) -> None:
+        people = [
+            Person("Taylor", job="Engineer"),
+            Person("Griffin", pet="Lion"),
+            Person("Casey", job="Pilot"),
+        ]
+
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('people_max_open_files')
+        conf.put(FsNeo4jCSVLoader.MAX_OPEN_FILES, 1)
+
+        loader.init(conf)
+        # Casey is written after the file of Taylor is closed for Griffin's
+        for person in people:
+            loader.load(person)
+            self.assertEqual(len(loader._file_outs), 1)
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        with open(join(node_dir, 'Person_0.csv')) as node_file:
+            self.assertEqual([row['name'] for row in csv.DictReader(node_file)], ['Taylor', 'Casey'])
+
+        with open(join(node_dir, MANIFEST_FILE_NAME)) as manifest_file:
+            self.assertEqual(json.load(manifest_file)['Person_0.csv']['row_count'], 2)
+
+    def test_load_with_gzip(self) -> None:
+        people = [
+            Person("Taylor", job="Engineer"),
+            Person("Griffin", pet="Lion"),
+            Person("Casey", job="Pilot"),
+        ]
+
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('people_gzip')
+        conf.put(FsNeo4jCSVLoader.COMPRESSION, 'gzip')
+        # Reopening in append mode adds a gzip member
+        conf.put(FsNeo4jCSVLoader.MAX_OPEN_FILES, 1)
+
+        loader.init(conf)
+        for person in people:
+            loader.load(person)
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        with gzip.open(join(node_dir, 'Person_0.csv.gz'), 'rt') as node_file:
+            self.assertEqual([row['name'] for row in csv.DictReader(node_file)], ['Taylor', 'Casey'])
+
+        with open(join(node_dir, MANIFEST_FILE_NAME)) as manifest_file:
+            self.assertEqual(sorted(json.load(manifest_file)), ['Person_0.csv.gz', 'Person_1.csv.gz'])
+
+    def test_load_with_zstd_and_publish(self) -> None:
+        pytest.importorskip('zstandard')
+
+        movies = [Movie('Top Gun', [Actor('Tom Cruise'), Actor('Meg Ryan')], [City('San Diego'), City('Oakland')]),
+                  Movie('Jaws', [Actor('Roy Scheider'), Actor('Robert Shaw')], [City('Edgartown'), City('Menemsha')])]
+
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('movies_zstd')
+        conf.put(FsNeo4jCSVLoader.COMPRESSION, 'zstd')
+        # Reopening in append mode adds a zstd frame
+        conf.put(FsNeo4jCSVLoader.MAX_OPEN_FILES, 1)
+
+        loader.init(conf)
+        for movie in movies:
+            loader.load(movie)
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        self.assertEqual(sorted(f for f in listdir(node_dir) if f != MANIFEST_FILE_NAME),
+                         ['Actor_0.csv.zst', 'City_0.csv.zst', 'Movie_0.csv.zst'])
+
+        for streaming_read in (False, True):
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_transaction = MagicMock()
+                mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: node_dir,
+                     neo4j_csv_publisher.RELATION_FILES_DIR: conf.get_string(FsNeo4jCSVLoader.RELATION_DIR_PATH),
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_STREAMING_READ: streaming_read,
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: 'unit_test'}))
+                publisher.publish()
+
+            # All frames of each file are read: 2 movies with 5 nodes and 4 relations each
+            keys = sorted(c[1]['parameters'].get('KEY') or c[1]['parameters']['START_KEY']
+                          for c in mock_transaction.run.call_args_list)
+            self.assertEqual(len(keys), 18)
+            self.assertIn('actor://Robert Shaw', keys)
+            self.assertEqual(publisher.labels, {'Movie', 'Actor', 'City'})
+
+    def test_load_with_deduplicate(self) -> None:
+        actors = [Actor('Tom Cruise'), Actor('Meg Ryan')]
+        cities = [City('San Diego'), City('Oakland')]
+
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('movies_deduplicate')
+        conf.put(FsNeo4jCSVLoader.DEDUPLICATE, True)
+
+        loader.init(conf)
+        loader.load(Movie('Top Gun', actors, cities))
+        loader.load(Movie('Top Gun', actors, cities))
+        loader.close()
+
+        with open(join(conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH), MANIFEST_FILE_NAME)) as manifest_file:
+            node_manifest = json.load(manifest_file)
+        self.assertEqual({entry['labels'][0]: entry['row_count'] for entry in node_manifest.values()},
+                         {'Movie': 1, 'Actor': 2, 'City': 2})
+
+        with open(join(conf.get_string(FsNeo4jCSVLoader.RELATION_DIR_PATH), MANIFEST_FILE_NAME)) as manifest_file:
+            self.assertEqual(sum(entry['row_count'] for entry in json.load(manifest_file).values()), 4)
+
+    def test_row_deduplicator_spill(self) -> None:
+        deduplicator = RowDeduplicator(max_exact_rows=2, bloom_capacity=100, bloom_error_rate=1e-6)
+        rows = [('User', f'key{i}') for i in range(10)]
+
+        self.assertEqual([deduplicator.is_duplicate(row) for row in rows], [False] * 10)
+        # Rows remembered exactly before spilling are still detected
+        self.assertEqual([deduplicator.is_duplicate(row) for row in rows], [True] * 10)
+        self.assertFalse(deduplicator.is_duplicate(('User', 'key10')))
+        self.assertEqual(deduplicator.duplicate_count, 10)
+
+    def test_load_with_max_rows_per_file(self) -> None:
+        people = [
+            Person("Taylor", job="Engineer"),
+            Person("Griffin", pet="Lion"),
+            Person("Casey", job="Pilot"),
+            Person("Jordan", job="Chef"),
+        ]
+
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('people_max_rows_per_file')
+        conf.put(FsNeo4jCSVLoader.MAX_ROWS_PER_FILE, 2)
+
+        loader.init(conf)
+        for person in people:
+            loader.load(person)
+        loader.close()
+
+        with open(join(conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH), MANIFEST_FILE_NAME)) as manifest_file:
+            node_manifest = json.load(manifest_file)
+
+        self.assertEqual({file_name: entry['row_count'] for file_name, entry in node_manifest.items()}, {
+            'Person_0.part-00000.csv': 2,
+            'Person_0.part-00001.csv': 1,
+            'Person_1.part-00000.csv': 1,
+        })
+
+    def test_load_with_max_bytes_per_file(self) -> None:
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('people_max_bytes_per_file')
+        # Header and a row exceed it, so that each part has a row
+        conf.put(FsNeo4jCSVLoader.MAX_BYTES_PER_FILE, 40)
+
+        loader.init(conf)
+        loader.load(Person("Taylor", job="Engineer"))
+        loader.load(Person("Casey", job="Pilot"))
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        self.assertEqual(sorted(f for f in listdir(node_dir) if f != MANIFEST_FILE_NAME),
+                         ['Person_0.part-00000.csv', 'Person_0.part-00001.csv'])
+
     def test_load_disjoint_properties(self) -> None:
         people = [
             Person("Taylor", job="Engineer"),
@@ -82,6 +265,112 @@ class TestFsNeo4jCSVLoader(unittest.TestCase):
                                           itemgetter('KEY'))
         self.assertEqual(expected_nodes, actual_nodes)
 
+    def test_load_manifest(self) -> None:
+        people = [
+            Person("Taylor", job="Engineer"),
+            Person("Griffin", pet="Lion"),
+            Person("Casey", job="Pilot"),
+        ]
+
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('people_manifest')
+
+        loader.init(conf)
+        for person in people:
+            loader.load(person)
+        loader.close()
+
+        with open(join(conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH), MANIFEST_FILE_NAME)) as manifest_file:
+            node_manifest = json.load(manifest_file)
+
+        self.assertEqual(node_manifest, {
+            'Person_0.csv': {'labels': ['Person'], 'header': ['LABEL', 'KEY', 'name', 'job'], 'row_count': 2},
+            'Person_1.csv': {'labels': ['Person'], 'header': ['LABEL', 'KEY', 'name', 'pet'], 'row_count': 1},
+        })
+
+        with open(join(conf.get_string(FsNeo4jCSVLoader.RELATION_DIR_PATH), MANIFEST_FILE_NAME)) as manifest_file:
+            self.assertEqual(json.load(manifest_file), {})
+
+    def test_keep_directories_with_checkpoint(self) -> None:
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('people_checkpoint')
+
+        loader.init(conf)
+        loader.load(Person("Taylor", job="Engineer"))
+        loader.close()
+
+        node_dir = conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH)
+        relation_dir = conf.get_string(FsNeo4jCSVLoader.RELATION_DIR_PATH)
+        with open(join(node_dir, CHECKPOINT_FILE_NAME), 'w') as checkpoint_file:
+            checkpoint_file.write('{}')
+
+        Job.closer.close()
+        self.assertTrue(os.path.exists(node_dir))
+        self.assertTrue(os.path.exists(relation_dir))
+
+        shutil.rmtree(os.path.dirname(node_dir))
+
+    def test_load_with_ready_file_queue(self) -> None:
+        actors = [Actor('Tom Cruise'), Actor('Meg Ryan')]
+        cities = [City('San Diego'), City('Oakland')]
+        movie = Movie('Top Gun', actors, cities)
+
+        ready_file_queue = ReadyFileQueue()
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('movies_ready_file_queue')
+        conf.put(FsNeo4jCSVLoader.READY_FILE_QUEUE, ready_file_queue)
+        conf.put(FsNeo4jCSVLoader.READY_FILE_ROW_COUNT, 2)
+
+        loader.init(conf)
+        loader.load(movie)
+        loader.close()
+
+        ready_files = list(ready_file_queue)
+        # Movie node file is handed over before the first relation file of Movie, although it has less rows
+        self.assertEqual([(ready_file.kind, os.path.basename(ready_file.path)) for ready_file in ready_files], [
+            ('node', 'Actor_0.part-00000.csv'),
+            ('node', 'City_0.part-00000.csv'),
+            ('node', 'Movie_0.part-00000.csv'),
+            ('relation', 'Movie_Actor_ACTOR.part-00000.csv'),
+            ('relation', 'Movie_City_FILMED_AT.part-00000.csv'),
+        ])
+        self.assertEqual(ready_files[2].manifest_entry,
+                         {'labels': ['Movie'], 'header': ['LABEL', 'KEY', 'name'], 'row_count': 1})
+
+        with open(join(conf.get_string(FsNeo4jCSVLoader.NODE_DIR_PATH), MANIFEST_FILE_NAME)) as manifest_file:
+            self.assertEqual(len(json.load(manifest_file)), 3)
+
+    def test_load_with_ready_file_queue_later_nodes(self) -> None:
+        movies = [Movie('Top Gun', [Actor('Tom Cruise'), Actor('Meg Ryan')], [City('San Diego')]),
+                  Movie('Jaws', [Actor('Roy Scheider')], [City('Edgartown')])]
+
+        ready_file_queue = ReadyFileQueue()
+        loader = FsNeo4jCSVLoader()
+
+        conf = self._make_conf('movies_ready_file_queue_later_nodes')
+        conf.put(FsNeo4jCSVLoader.READY_FILE_QUEUE, ready_file_queue)
+        conf.put(FsNeo4jCSVLoader.READY_FILE_ROW_COUNT, 2)
+
+        loader.init(conf)
+        for movie in movies:
+            loader.load(movie)
+        loader.close()
+
+        # Movie_Actor_ACTOR part of Top Gun is complete before Jaws nodes are written, but it's handed over after them
+        ready_files = [(ready_file.kind, os.path.basename(ready_file.path)) for ready_file in ready_file_queue]
+        self.assertEqual(ready_files, [
+            ('node', 'Actor_0.part-00000.csv'),
+            ('node', 'Movie_0.part-00000.csv'),
+            ('node', 'City_0.part-00000.csv'),
+            ('node', 'Actor_0.part-00001.csv'),
+            ('relation', 'Movie_Actor_ACTOR.part-00000.csv'),
+            ('relation', 'Movie_City_FILMED_AT.part-00000.csv'),
+            ('relation', 'Movie_Actor_ACTOR.part-00001.csv'),
+        ])
+
     def _make_conf(self, test_name: str) -> ConfigTree:
         prefix = '/var/tmp/TestFsNeo4jCSVLoader'
 
@@ -94,7 +383,7 @@ class TestFsNeo4jCSVLoader(unittest.TestCase):
     def _get_csv_rows(self,
                       path: str,
                       sorting_key_getter: Callable) -> Iterable[Dict[str, Any]]:
-        files = [join(path, f) for f in listdir(path) if isfile(join(path, f))]
+        files = [join(path, f) for f in listdir(path) if isfile(join(path, f)) and f != MANIFEST_FILE_NAME]
 
         result = []
         for f in files:
@@ -0,0 +1,150 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import shutil
+import tempfile
+import unittest
+import uuid
+from os.path import join
+from typing import (
+    Any, Dict, Iterable, Union,
+)
+
+import pytest
+from mock import MagicMock, patch
+from neo4j import GraphDatabase
+from pyhocon import ConfigFactory
+
+from databuilder.job.base_job import Job
+from databuilder.models.graph_node import GraphNode
+from databuilder.models.graph_relationship import GraphRelationship
+from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+from databuilder.publisher import neo4j_csv_publisher
+from databuilder.publisher.neo4j_csv_publisher import Neo4jCsvPublisher
+from databuilder.utils.ready_file_queue import ReadyFileQueue
+from databuilder.utils.staging_files import MANIFEST_FILE_NAME
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from databuilder.loader.file_system_neo4j_parquet_loader import FsNeo4jParquetLoader  # noqa: E402
+
+
+class TestFsNeo4jParquetLoader(unittest.TestCase):
+    def setUp(self) -> None:
+        logging.basicConfig(level=logging.INFO)
+        self._staging_dir = tempfile.mkdtemp()
+        self._node_dir = join(self._staging_dir, 'nodes')
+        self._relation_dir = join(self._staging_dir, 'relationships')
+
+    def tearDown(self) -> None:
+        Job.closer.close()
+        shutil.rmtree(self._staging_dir)
+
+    def _load(self, records: Iterable[GraphSerializable] = (), **conf: Any) -> None:
+        loader = FsNeo4jParquetLoader()
+        loader.init(ConfigFactory.from_dict(dict({
+            FsNeo4jParquetLoader.NODE_DIR_PATH: self._node_dir,
+            FsNeo4jParquetLoader.RELATION_DIR_PATH: self._relation_dir,
+            FsNeo4jParquetLoader.SHOULD_DELETE_CREATED_DIR: False,
+            FsNeo4jParquetLoader.ROW_GROUP_SIZE: 2
+        }, **conf)))
+        for record in records or [
+            TableMetadata('hive', 'gold', 'test_schema', 'test_table', 'test_table description',
+                          [ColumnMetadata('col1', 'col1 description', 'string', 0),
+                           ColumnMetadata('col2', 'col2 description', 'int', 1),
+                           ColumnMetadata('col3', 'col3 description', 'int', 2)])]:
+            loader.load(record)
+        loader.close()
+
+    def _read_node_manifest(self) -> Dict[str, Any]:
+        with open(join(self._node_dir, MANIFEST_FILE_NAME)) as manifest_file:
+            return json.load(manifest_file)
+
+    def test_load(self) -> None:
+        self._load()
+
+        node_manifest = self._read_node_manifest()
+        column_files = [name for name, entry in node_manifest.items() if entry['labels'] == ['Column']]
+        self.assertEqual(len(column_files), 1)
+        self.assertTrue(column_files[0].endswith('.parquet'))
+        self.assertEqual(node_manifest[column_files[0]]['row_count'], 3)
+
+        parquet_file = pq.ParquetFile(join(self._node_dir, column_files[0]))
+        # 3 rows in row groups of 2
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        columns = parquet_file.read().to_pydict()
+        self.assertEqual(columns['sort_order'], [0, 1, 2])
+        self.assertEqual(columns['name'], ['col1', 'col2', 'col3'])
+
+    def test_load_value_types(self) -> None:
+        # None in the first row group, then values of different types for the same property
+        self._load([_Node('Movie', f'movie{i}', {'rating': rating})
+                    for i, rating in enumerate([None, None, None, 3, 4, 'good'])])
+
+        node_manifest = self._read_node_manifest()
+        self.assertEqual(sorted(entry['row_count'] for entry in node_manifest.values()), [1, 2, 3])
+        ratings = sorted((pq.read_table(join(self._node_dir, name)).to_pydict()['rating'] for name in node_manifest),
+                         key=len)
+        self.assertEqual(ratings, [['good'], [3, 4], [None, None, None]])
+
+    def test_max_open_files(self) -> None:
+        self._load([_Node(label, f'{label}{i}', {'name': f'{label} {i}'})
+                    for i in range(3) for label in ('Movie', 'Actor')],
+                   **{FsNeo4jParquetLoader.MAX_OPEN_FILES: 1, FsNeo4jParquetLoader.ROW_GROUP_SIZE: 1})
+
+        # Files are completed when the other label is written, and continued in new parts
+        node_manifest = self._read_node_manifest()
+        self.assertEqual(len(node_manifest), 6)
+        self.assertIn('Movie_0.part-00002.parquet', node_manifest)
+        names = sorted(name for file_name in node_manifest
+                       for name in pq.read_table(join(self._node_dir, file_name)).to_pydict()['name'])
+        self.assertEqual(names, sorted(f'{label} {i}' for i in range(3) for label in ('Movie', 'Actor')))
+
+    def test_unsupported_config(self) -> None:
+        for key, value in ((FsNeo4jParquetLoader.READY_FILE_QUEUE, ReadyFileQueue()),
+                           (FsNeo4jParquetLoader.MAX_ROWS_PER_FILE, 100),
+                           (FsNeo4jParquetLoader.MAX_BYTES_PER_FILE, 1024),
+                           (FsNeo4jParquetLoader.COMPRESSION, 'gzip')):
+            with self.assertRaisesRegex(ValueError, key):
+                self._load((), **{key: value})
+
+    def test_publish(self) -> None:
+        self._load()
+
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_transaction = MagicMock()
+            mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+            publisher = Neo4jCsvPublisher()
+            publisher.init(ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: self._node_dir,
+                 neo4j_csv_publisher.RELATION_FILES_DIR: self._relation_dir,
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            ))
+            publisher.publish()
+
+        self.assertIn('Column', publisher.labels)
+        column_params = [c[1]['parameters'] for c in mock_transaction.run.call_args_list
+                         if b':Column {key: $KEY}' in c[0][0]]
+        self.assertEqual([params['sort_order'] for params in column_params], [0, 1, 2])
+
+
+class _Node(GraphSerializable):
+    def __init__(self, label: str, key: str, attributes: Dict[str, Any]) -> None:
+        self._nodes = iter([GraphNode(key=key, label=label, attributes=attributes)])
+
+    def create_next_node(self) -> Union[GraphNode, None]:
+        return next(self._nodes, None)
+
+    def create_next_relation(self) -> Union[GraphRelationship, None]:
+        return None
+
+
+if __name__ == '__main__':
+    unittest.main()
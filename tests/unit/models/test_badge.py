@@ -3,7 +3,9 @@
 
 import unittest
 
-from databuilder.models.badge import Badge, BadgeMetadata
+from databuilder.models.badge import (
+    Badge, BadgeMetadata, get_badge,
+)
 from databuilder.models.graph_serializable import (
     NODE_KEY, NODE_LABEL, RELATION_END_KEY, RELATION_END_LABEL, RELATION_REVERSE_TYPE, RELATION_START_KEY,
     RELATION_START_LABEL, RELATION_TYPE,
@@ -29,6 +31,12 @@ class TestBadge(unittest.TestCase):
         badge_key = self.badge_metada.get_badge_key(badge1.name)
         self.assertEqual(badge_key, badge1.name)
 
+    def test_badge_is_shared(self) -> None:
+        self.assertIs(get_badge('pii', 'column'), get_badge('pii', 'column'))
+        self.assertEqual(get_badge('pii', 'column'), Badge('pii', 'column'))
+        with self.assertRaises(AttributeError):
+            badge1.name = 'badge3'  # type: ignore
+
     def test_create_nodes(self) -> None:
         nodes = self.badge_metada.create_nodes()
         self.assertEqual(len(nodes), 2)
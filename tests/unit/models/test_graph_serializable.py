@@ -2,12 +2,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import unittest
-from typing import Iterable, Union
+from typing import Iterable
 
 from databuilder.models.graph_node import GraphNode
-from databuilder.models.graph_relationship import GraphRelationship
-from databuilder.models.graph_serializable import GraphSerializable
 from databuilder.serializers import neo4_serializer
+from tests.unit.models.movie import (
+    Actor, City, Movie,
+)
 
 
 class TestSerialize(unittest.TestCase):
@@ -54,109 +55,29 @@ class TestSerialize(unittest.TestCase):
         ]
         self.assertEqual(expected, actual)
 
+    def test_iter(self) -> None:
+        movie = Movie('Top Gun', [Actor('Tom Cruise')], [City('San Diego')])
+        first_node = movie.next_node()
 
-class Actor(object):
-    LABEL = 'Actor'
-    KEY_FORMAT = 'actor://{}'
+        # Iterates the remaining records
+        self.assertEqual([first_node] + list(movie.iter_nodes()),
+                         list(Movie('Top Gun', [Actor('Tom Cruise')], [City('San Diego')]).iter_nodes()))
+        self.assertEqual([relation.type for relation in movie.iter_relations()], ['ACTOR', 'FILMED_AT'])
+        self.assertIsNone(movie.next_relation())
 
-    def __init__(self, name: str) -> None:
-        self.name = name
+    def test_invalid_label(self) -> None:
+        movie = Movie('Top Gun', [Actor('Tom Cruise')], [City('San Diego')])
+        list(movie.iter_nodes())
 
+        # Valid labels are cached, while invalid ones are still rejected
+        invalid_movie = InvalidMovie('Top Gun', [Actor('Tom Cruise')], [City('San Diego')])
+        with self.assertRaisesRegex(RuntimeError, 'LABEL should only have upper case character on its first one'):
+            list(invalid_movie.iter_nodes())
 
-class City(object):
-    LABEL = 'City'
-    KEY_FORMAT = 'city://{}'
-
-    def __init__(self, name: str) -> None:
-        self.name = name
-
-
-class Movie(GraphSerializable):
-    LABEL = 'Movie'
-    KEY_FORMAT = 'movie://{}'
-    MOVIE_ACTOR_RELATION_TYPE = 'ACTOR'
-    ACTOR_MOVIE_RELATION_TYPE = 'ACTED_IN'
-    MOVIE_CITY_RELATION_TYPE = 'FILMED_AT'
-    CITY_MOVIE_RELATION_TYPE = 'APPEARS_IN'
-
-    def __init__(self,
-                 name: str,
-                 actors: Iterable[Actor],
-                 cities: Iterable[City]) -> None:
-        self._name = name
-        self._actors = actors
-        self._cities = cities
-        self._node_iter = iter(self.create_nodes())
-        self._relation_iter = iter(self.create_relation())
-
-    def create_next_node(self) -> Union[GraphNode, None]:
-        try:
-            return next(self._node_iter)
-        except StopIteration:
-            return None
-
-    def create_next_relation(self) -> Union[GraphRelationship, None]:
-        try:
-            return next(self._relation_iter)
-        except StopIteration:
-            return None
 
+class InvalidMovie(Movie):
     def create_nodes(self) -> Iterable[GraphNode]:
-        result = [GraphNode(
-            key=Movie.KEY_FORMAT.format(self._name),
-            label=Movie.LABEL,
-            attributes={
-                'name': self._name
-            }
-        )]
-
-        for actor in self._actors:
-            actor_node = GraphNode(
-                key=Actor.KEY_FORMAT.format(actor.name),
-                label=Actor.LABEL,
-                attributes={
-                    'name': self._name
-                }
-            )
-            result.append(actor_node)
-
-        for city in self._cities:
-            city_node = GraphNode(
-                key=City.KEY_FORMAT.format(city.name),
-                label=City.LABEL,
-                attributes={
-                    'name': self._name
-                }
-            )
-            result.append(city_node)
-        return result
-
-    def create_relation(self) -> Iterable[GraphRelationship]:
-        result = []
-        for actor in self._actors:
-            movie_actor_relation = GraphRelationship(
-                start_key=Movie.KEY_FORMAT.format(self._name),
-                end_key=Actor.KEY_FORMAT.format(actor.name),
-                start_label=Movie.LABEL,
-                end_label=Actor.LABEL,
-                type=Movie.MOVIE_ACTOR_RELATION_TYPE,
-                reverse_type=Movie.ACTOR_MOVIE_RELATION_TYPE,
-                attributes={}
-            )
-            result.append(movie_actor_relation)
-
-        for city in self._cities:
-            city_movie_relation = GraphRelationship(
-                start_key=City.KEY_FORMAT.format(self._name),
-                end_key=City.KEY_FORMAT.format(city.name),
-                start_label=Movie.LABEL,
-                end_label=City.LABEL,
-                type=Movie.MOVIE_CITY_RELATION_TYPE,
-                reverse_type=Movie.CITY_MOVIE_RELATION_TYPE,
-                attributes={}
-            )
-            result.append(city_movie_relation)
-        return result
+        return [GraphNode(key=Movie.KEY_FORMAT.format(self._name), label='MOVIE', attributes={})]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,36 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import unittest
+
+from databuilder.models.table_key_builder import TableKeyBuilder, get_table_key_builder
+from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+
+
+class TestTableKeyBuilder(unittest.TestCase):
+    def test_keys(self) -> None:
+        key_builder = TableKeyBuilder('hive', 'gold', 'test_schema', 'test_table')
+
+        self.assertEqual(key_builder.database_key, TableMetadata.DATABASE_KEY_FORMAT.format(db='hive'))
+        self.assertEqual(key_builder.cluster_key, TableMetadata.CLUSTER_KEY_FORMAT.format(db='hive', cluster='gold'))
+        self.assertEqual(key_builder.schema_key,
+                         TableMetadata.SCHEMA_KEY_FORMAT.format(db='hive', cluster='gold', schema='test_schema'))
+        self.assertEqual(key_builder.table_key,
+                         TableMetadata.TABLE_KEY_FORMAT.format(db='hive', cluster='gold', schema='test_schema',
+                                                               tbl='test_table'))
+        self.assertEqual(key_builder.get_column_key('test_col'),
+                         ColumnMetadata.COLUMN_KEY_FORMAT.format(db='hive', cluster='gold', schema='test_schema',
+                                                                 tbl='test_table', col='test_col'))
+        self.assertEqual(key_builder.get_table_child_key('_description'),
+                         'hive://gold.test_schema/test_table/_description')
+
+    def test_shared_keys(self) -> None:
+        self.assertIs(get_table_key_builder('hive', 'gold', 'test_schema', 'test_table'),
+                      get_table_key_builder('hive', 'gold', 'test_schema', 'test_table'))
+        # Schema key is interned, so that tables of the schema share it
+        self.assertIs(TableKeyBuilder('hive', 'gold', 'test_schema', 'test_table1').schema_key,
+                      TableKeyBuilder('hive', 'gold', 'test_schema', 'test_table2').schema_key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,16 +3,17 @@
 
 import copy
 import unittest
+from typing import List
 
 from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
 from databuilder.serializers import neo4_serializer
+from databuilder.utils.key_registry import KeyRegistry, reset_key_registry
 
 
 class TestTableMetadata(unittest.TestCase):
     def setUp(self) -> None:
         super(TestTableMetadata, self).setUp()
-        TableMetadata.serialized_nodes_keys = set()
-        TableMetadata.serialized_rels_keys = set()
+        reset_key_registry()
 
     def test_serialize(self) -> None:
         self.table_metadata = TableMetadata('hive', 'gold', 'test_schema1', 'test_table1', 'test_table1', [
@@ -145,6 +146,26 @@ class TestTableMetadata(unittest.TestCase):
 
         self.assertEqual(self.expected_rels_deduped, actual)
 
+    def test_key_registry(self) -> None:
+        def node_labels(table_metadata: TableMetadata) -> List[str]:
+            return [node.label for node in iter(table_metadata.next_node, None)]
+
+        self.assertIn('Schema', node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table1', None)))
+        self.assertNotIn('Schema', node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table2', None)))
+
+        # A new job run serializes them again
+        reset_key_registry(KeyRegistry(max_keys=2, hash_keys=True))
+        self.assertIn('Schema', node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table3', None)))
+        # Database node is evicted by schema node, and evicts cluster node in turn
+        self.assertEqual(node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table4', None)),
+                         ['Table', 'Database', 'Cluster', 'Schema'])
+        self.assertEqual(node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table5', None)),
+                         ['Table', 'Database', 'Cluster', 'Schema'])
+
+        reset_key_registry(KeyRegistry(max_keys=3, hash_keys=True))
+        node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table6', None))
+        self.assertEqual(node_labels(TableMetadata('hive', 'gold', 'test_schema1', 'test_table7', None)), ['Table'])
+
     def test_table_attributes(self) -> None:
         self.table_metadata3 = TableMetadata('hive', 'gold', 'test_schema3', 'test_table3', 'test_table3', [
             ColumnMetadata('test_id1', 'description of test_table1', 'bigint', 0),
@@ -222,6 +243,15 @@ class TestTableMetadata(unittest.TestCase):
         self.assertEqual(actual[2], expected_tab_tag_rel1)
         self.assertEqual(actual[3], expected_tab_tag_rel2)
 
+    def test_columns_share_descriptions_and_badges(self) -> None:
+        col1 = ColumnMetadata('ds', 'Partition date', 'varchar', 0, ['partition'])
+        col2 = ColumnMetadata('ds', 'Partition date', ''.join(['var', 'char']), 0, ['partition'])
+
+        self.assertIs(col1.description, col2.description)
+        self.assertIs(col1.badges[0], col2.badges[0])
+        self.assertIs(col1.type, col2.type)
+        self.assertEqual(ColumnMetadata('id', None, 'bigint', 1).badges, ())
+
     def test_col_badge_field(self) -> None:
         self.table_metadata4 = TableMetadata('hive', 'gold', 'test_schema4', 'test_table4', 'test_table4', [
             ColumnMetadata('test_id1', 'description of test_table1', 'bigint', 0, ['col-badge1', 'col-badge2'])],
@@ -0,0 +1,70 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import unittest
+from typing import (
+    Any, Dict, List,
+)
+
+import pandas
+
+from databuilder.models.graph_serializable import GraphSerializable
+from databuilder.models.table_metadata import ColumnMetadata, TableMetadata
+from databuilder.models.table_metadata_batch import TableMetadataBatch
+from databuilder.serializers import neo4_serializer
+from databuilder.utils.key_registry import reset_key_registry
+
+
+class TestTableMetadataBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        reset_key_registry()
+
+    def _serialize(self, records: List[GraphSerializable]) -> List[List[Dict[str, Any]]]:
+        nodes = [neo4_serializer.serialize_node(node) for record in records for node in record.iter_nodes()]
+        relations = [neo4_serializer.serialize_relationship(relation)
+                     for record in records for relation in record.iter_relations()]
+        return [sorted(nodes, key=repr), sorted(relations, key=repr)]
+
+    def test_serialize(self) -> None:
+        batch = TableMetadataBatch(pandas.DataFrame({
+            TableMetadataBatch.DATABASE: ['hive', 'hive', 'hive', 'hive'],
+            TableMetadataBatch.CLUSTER: ['gold', 'gold', 'gold', 'gold'],
+            TableMetadataBatch.SCHEMA: ['test_schema1', 'test_schema1', 'test_schema2', 'test_schema1'],
+            TableMetadataBatch.TABLE: ['test_table1', 'test_table2', 'test_table3', 'test_table1'],
+            TableMetadataBatch.TABLE_DESCRIPTION: ['table1 description', None, None, 'table1 description'],
+            TableMetadataBatch.IS_VIEW: [False, True, False, False],
+            TableMetadataBatch.COLUMN_NAME: ['col1', 'col1', 'col1', 'col2'],
+            TableMetadataBatch.COLUMN_TYPE: ['string', 'bigint', 'string', 'int'],
+            TableMetadataBatch.SORT_ORDER: [0, 0, 0, 1],
+            TableMetadataBatch.COLUMN_DESCRIPTION: ['col1 description', None, '', 'col2 description']
+        }))
+        actual = self._serialize([batch])
+
+        reset_key_registry()
+        expected = self._serialize([
+            TableMetadata('hive', 'gold', 'test_schema1', 'test_table1', 'table1 description',
+                          [ColumnMetadata('col1', 'col1 description', 'string', 0),
+                           ColumnMetadata('col2', 'col2 description', 'int', 1)]),
+            TableMetadata('hive', 'gold', 'test_schema1', 'test_table2', None,
+                          [ColumnMetadata('col1', None, 'bigint', 0)], is_view=True),
+            TableMetadata('hive', 'gold', 'test_schema2', 'test_table3', None,
+                          [ColumnMetadata('col1', '', 'string', 0)])
+        ])
+
+        self.assertEqual(actual, expected)
+        # sort_order is a Python int rather than numpy int64, so that it's unquoted like TableMetadata's
+        self.assertIn({'KEY': 'hive://gold.test_schema1/test_table1/col2', 'LABEL': 'Column', 'name': 'col2',
+                       'type': 'int', 'sort_order:UNQUOTED': 1}, actual[0])
+
+    def test_missing_columns(self) -> None:
+        with self.assertRaisesRegex(ValueError, 'sort_order'):
+            TableMetadataBatch(pandas.DataFrame({TableMetadataBatch.DATABASE: ['hive'],
+                                                 TableMetadataBatch.CLUSTER: ['gold'],
+                                                 TableMetadataBatch.SCHEMA: ['test_schema'],
+                                                 TableMetadataBatch.TABLE: ['test_table'],
+                                                 TableMetadataBatch.COLUMN_NAME: ['col1'],
+                                                 TableMetadataBatch.COLUMN_TYPE: ['string']}))
+
+
+if __name__ == '__main__':
+    unittest.main()
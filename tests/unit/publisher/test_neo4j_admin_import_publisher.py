@@ -0,0 +1,108 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import csv
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from typing import List
+
+from pyhocon import ConfigFactory
+
+from databuilder.publisher import neo4j_csv_publisher
+from databuilder.publisher.neo4j_admin_import_publisher import Neo4jAdminImportPublisher, _widen_type
+
+here = os.path.dirname(__file__)
+
+
+class TestNeo4jAdminImportPublisher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(level=logging.INFO)
+        self._resource_path = os.path.join(here, '../resources/csv_publisher')
+        self._output_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._output_dir)
+
+    def _publish(self, node_dir: str, relation_dir: str) -> None:
+        publisher = Neo4jAdminImportPublisher()
+        conf = ConfigFactory.from_dict(
+            {neo4j_csv_publisher.NODE_FILES_DIR: node_dir,
+             neo4j_csv_publisher.RELATION_FILES_DIR: relation_dir,
+             Neo4jAdminImportPublisher.OUTPUT_DIR: self._output_dir,
+             neo4j_csv_publisher.JOB_PUBLISH_TAG: 'unit_test'}
+        )
+        publisher.init(conf)
+        publisher.publish()
+
+    def _read_csv(self, *path: str) -> List[List[str]]:
+        with open(os.path.join(self._output_dir, *path), newline='') as f:
+            return list(csv.reader(f))
+
+    def test_publish(self) -> None:
+        self._publish(f'{self._resource_path}/nodes', f'{self._resource_path}/relations')
+
+        self.assertEqual(self._read_csv('nodes', 'test_column_header.csv'),
+                         [['key:ID(Column)', 'name', 'order_pos:long', 'type', 'published_tag',
+                           'publisher_last_updated_epoch_ms:long', ':LABEL']])
+        column_rows = self._read_csv('nodes', 'test_column.csv')
+        self.assertEqual(len(column_rows), 2)
+        self.assertEqual(column_rows[0][:5], ['presto://gold.test_schema1/test_table1/test_id1', 'test_id1', '1',
+                                              'bigint', 'unit_test'])
+        self.assertEqual(column_rows[0][-1], 'Column')
+
+        self.assertEqual(self._read_csv('relationships', 'test_edge_short_Table_Column_header.csv'),
+                         [[':START_ID(Table)', ':END_ID(Column)', 'published_tag',
+                           'publisher_last_updated_epoch_ms:long', ':TYPE']])
+        self.assertEqual(self._read_csv('relationships', 'test_edge_short_Column_Table_header.csv')[0][:2],
+                         [':START_ID(Column)', ':END_ID(Table)'])
+        reverse_rows = self._read_csv('relationships', 'test_edge_short_Column_Table.csv')
+        self.assertEqual([row[-1] for row in reverse_rows], ['BELONG_TO_TABLE', 'BELONG_TO_TABLE'])
+
+        with open(os.path.join(self._output_dir, Neo4jAdminImportPublisher.CONSTRAINTS_FILE_NAME)) as f:
+            self.assertEqual(f.read(), 'CREATE CONSTRAINT ON (node:Column) ASSERT node.key IS UNIQUE;\n'
+                                       'CREATE CONSTRAINT ON (node:Table) ASSERT node.key IS UNIQUE;\n')
+
+        with open(os.path.join(self._output_dir, Neo4jAdminImportPublisher.IMPORT_SCRIPT_FILE_NAME)) as f:
+            script = f.read()
+        self.assertIn('neo4j-admin import', script)
+        self.assertIn('--id-type=STRING', script)
+        self.assertEqual(script.count('--nodes='), 2)
+        self.assertEqual(script.count('--relationships='), 2)
+
+    def test_publish_deduplicates(self) -> None:
+        node_dir = tempfile.mkdtemp()
+        relation_dir = tempfile.mkdtemp()
+        try:
+            for directory in (node_dir, relation_dir):
+                os.rmdir(directory)
+            shutil.copytree(f'{self._resource_path}/nodes', node_dir)
+            shutil.copytree(f'{self._resource_path}/relations', relation_dir)
+            shutil.copy(f'{node_dir}/test_column.csv', f'{node_dir}/test_column_copy.csv')
+            shutil.copy(f'{relation_dir}/test_edge_short.csv', f'{relation_dir}/test_edge_short_copy.csv')
+
+            self._publish(node_dir, relation_dir)
+        finally:
+            shutil.rmtree(node_dir)
+            shutil.rmtree(relation_dir)
+
+        self.assertEqual(len(self._read_csv('nodes', 'test_column.csv')), 2)
+        self.assertFalse(os.path.exists(os.path.join(self._output_dir, 'nodes', 'test_column_copy.csv')))
+        self.assertEqual(len(self._read_csv('relationships', 'test_edge_short_Table_Column.csv')), 2)
+        self.assertFalse(os.path.exists(os.path.join(self._output_dir, 'relationships',
+                                                     'test_edge_short_copy_Table_Column.csv')))
+
+    def test_widen_type(self) -> None:
+        self.assertEqual(_widen_type(None, '1'), 'long')
+        self.assertEqual(_widen_type('long', '1.5'), 'double')
+        self.assertEqual(_widen_type('double', '2'), 'double')
+        self.assertEqual(_widen_type(None, 'True'), 'boolean')
+        self.assertEqual(_widen_type('boolean', '1'), 'string')
+        self.assertEqual(_widen_type('long', 'abc'), 'string')
+
+
+if __name__ == '__main__':
+    unittest.main()
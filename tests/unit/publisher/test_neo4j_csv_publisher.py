@@ -1,17 +1,29 @@
 # Copyright Contributors to the Amundsen project.
 # SPDX-License-Identifier: Apache-2.0
 
+import gzip
+import io
+import json
 import logging
 import os
+import shutil
+import tempfile
+import threading
 import unittest
 import uuid
+from operator import itemgetter
+from typing import Any, List
 
 from mock import MagicMock, patch
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, TransactionError
+from neo4j.exceptions import ServiceUnavailable, TransientError
 from pyhocon import ConfigFactory
 
 from databuilder.publisher import neo4j_csv_publisher
 from databuilder.publisher.neo4j_csv_publisher import Neo4jCsvPublisher
+from databuilder.publisher.neo4j_preprocessor import DeleteRelationPreprocessor
+from databuilder.utils import ready_file_queue
+from databuilder.utils.ready_file_queue import ReadyFileQueue
 
 here = os.path.dirname(__file__)
 
@@ -53,6 +65,896 @@ class TestPublish(unittest.TestCase):
             # 2 node files, 1 relation file
             self.assertEqual(mock_commit.call_count, 1)
 
+    def test_publisher_ready_file_queue(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            queue = ReadyFileQueue()
+            queue.put(ready_file_queue.NODE, f'{self._resource_path}/nodes/test_table.csv')
+            queue.put(ready_file_queue.NODE, f'{self._resource_path}/nodes/test_column.csv')
+            queue.put(ready_file_queue.RELATION, f'{self._resource_path}/relations/test_edge_short.csv')
+            queue.close()
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_READY_FILE_QUEUE: queue,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            self.assertEqual(mock_transaction.run.call_count, 6)
+            # Committed before creating index of each new label, and at the end
+            self.assertEqual(mock_transaction.commit.call_count, 3)
+            self.assertEqual(publisher.labels, {'Table', 'Column'})
+
+    def test_publisher_ready_file_queue_single_open_transaction(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            transactions: List[MagicMock] = []
+
+            def begin_transaction() -> Any:
+                # Same as neo4j driver, a session can't begin a transaction while another one is open
+                if transactions and not transactions[-1].closed():
+                    raise TransactionError('Explicit transaction already open')
+                transaction = MagicMock()
+                transaction.closed.return_value = False
+                transaction.commit.side_effect = lambda: setattr(transaction.closed, 'return_value', True)
+                transactions.append(transaction)
+                return transaction
+
+            mock_driver.return_value.session.return_value.begin_transaction.side_effect = begin_transaction
+
+            queue = ReadyFileQueue()
+            queue.put(ready_file_queue.NODE, f'{self._resource_path}/nodes/test_table.csv')
+            queue.put(ready_file_queue.NODE, f'{self._resource_path}/nodes/test_column.csv')
+            queue.put(ready_file_queue.RELATION, f'{self._resource_path}/relations/test_edge_short.csv')
+            queue.close()
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_READY_FILE_QUEUE: queue,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            self.assertEqual(sum(transaction.run.call_count for transaction in transactions), 6)
+            # The last transaction, with the relations, is committed as well
+            transactions[-1].commit.assert_called_once()
+            self.assertTrue(all(transaction.closed() for transaction in transactions))
+
+    def test_publisher_aborted_ready_file_queue(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_transaction.rollback.side_effect = lambda: setattr(mock_transaction.closed, 'return_value', True)
+            mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+            queue = ReadyFileQueue()
+            queue.put(ready_file_queue.NODE, f'{self._resource_path}/nodes/test_table.csv')
+            queue.abort()
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_READY_FILE_QUEUE: queue,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            self.assertRaises(RuntimeError, publisher.publish)
+            mock_transaction.rollback.assert_called_once()
+
+    def test_publisher_statement_cache(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            # One compiled statement per record shape: Column, Table and Table -> Column
+            self.assertEqual(len(publisher._statement_cache), 3)
+
+            column_calls = [c for c in mock_run.call_args_list if b':Column {key: $KEY}' in c[0][0]]
+            self.assertEqual(len(column_calls), 2)
+            self.assertEqual(column_calls[0][0][0], column_calls[1][0][0])
+            self.assertEqual(column_calls[0][1]['parameters'],
+                             {'KEY': 'presto://gold.test_schema1/test_table1/test_id1',
+                              'name': 'test_id1',
+                              'order_pos': 1,
+                              'type': 'bigint',
+                              'LABEL': 'Column'})
+
+    def test_publisher_unwind_batch(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            # 1 UNWIND statement per node file, 1 UNWIND statement for the relation file
+            self.assertEqual(mock_run.call_count, 3)
+
+            node_calls = [c for c in mock_run.call_args_list if b'MERGE (node:' in c[0][0]]
+            self.assertEqual(len(node_calls), 2)
+            column_batch = [c[1]['parameters']['batch'] for c in node_calls if b':Column' in c[0][0]][0]
+            self.assertEqual([row['KEY'] for row in column_batch],
+                             ['presto://gold.test_schema1/test_table1/test_id1',
+                              'presto://gold.test_schema1/test_table1/test_id2'])
+            self.assertEqual(column_batch[0]['order_pos'], 1)
+
+            relation_call = mock_run.call_args_list[-1]
+            self.assertIn(b'MATCH (n1:Table {key: row.START_KEY}), (n2:Column {key: row.END_KEY})', relation_call[0][0])
+            self.assertEqual(len(relation_call[1]['parameters']['batch']), 2)
+
+            self.assertEqual(mock_commit.call_count, 1)
+
+    def test_publisher_change_detection(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.NEO4J_CHANGE_DETECTION: True,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: 'unit_test'}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            column_call = [c for c in mock_run.call_args_list if b'MERGE (node:Column' in c[0][0]][0]
+            stmt = column_call[0][0].decode('utf-8')
+            self.assertIn("ON MATCH SET node.published_tag = 'unit_test'", stmt)
+            self.assertIn("FOREACH (_ IN CASE WHEN coalesce(node.publisher_content_hash, '') "
+                          "<> row.publisher_content_hash THEN [1] ELSE [] END | SET node.name = row.name", stmt)
+            self.assertNotIn('ON MATCH SET node.name', stmt)
+
+            column_batch = column_call[1]['parameters']['batch']
+            hashes = [row[neo4j_csv_publisher.CONTENT_HASH_PROPERTY_NAME] for row in column_batch]
+            self.assertEqual(len(set(hashes)), 2)
+
+            relation_stmt = mock_run.call_args_list[-1][0][0].decode('utf-8')
+            self.assertIn('r1.publisher_content_hash = row.publisher_content_hash, '
+                          'r2.publisher_content_hash = row.publisher_content_hash', relation_stmt)
+            self.assertIn('RETURN count(*) AS count', relation_stmt)
+
+    def test_content_hash(self) -> None:
+        record = {'KEY': 'k', 'name': 'foo', 'order_pos:UNQUOTED': 1, 'LABEL': 'Column'}
+        reordered = {'LABEL': 'Column', 'order_pos:UNQUOTED': 1, 'name': 'foo', 'KEY': 'k'}
+        keys = ['name', 'order_pos:UNQUOTED']
+
+        self.assertEqual(neo4j_csv_publisher._content_hash(record, keys),
+                         neo4j_csv_publisher._content_hash(reordered, keys))
+        self.assertNotEqual(neo4j_csv_publisher._content_hash(record, keys),
+                            neo4j_csv_publisher._content_hash(dict(record, name='bar'), keys))
+
+    def test_publisher_unwind_batch_missing_relation_nodes(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+            mock_transaction.closed.return_value = False
+
+            missing_key = 'presto://gold.test_schema1/test_table1/test_id2'
+
+            def run(stmt: Any, parameters: Any) -> Any:
+                if b'RETURN count(*) AS count' in stmt:
+                    # Only one of two pairs matched
+                    result = MagicMock()
+                    result.single.return_value = {'count': 1}
+                    return result
+                if b'OPTIONAL MATCH' in stmt:
+                    return [{'start_key': 'presto://gold.test_schema1/test_table1', 'end_key': missing_key}]
+                return MagicMock()
+
+            mock_transaction.run.side_effect = run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                 neo4j_csv_publisher.NEO4J_RELATIONSHIP_CREATION_CONFIRM: True,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            with self.assertRaises(RuntimeError) as context:
+                publisher.publish()
+
+            self.assertIn(missing_key, str(context.exception))
+            mock_transaction.rollback.assert_called()
+            mock_transaction.commit.assert_not_called()
+
+    def test_publisher_streaming_read(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_STREAMING_READ: True,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            self.assertEqual(mock_run.call_count, 6)
+            column_params = [c[1]['parameters'] for c in mock_run.call_args_list if b':Column {key: $KEY}' in c[0][0]]
+            self.assertEqual(column_params[1],
+                             {'KEY': 'presto://gold.test_schema1/test_table1/test_id2',
+                              'name': 'test_id2',
+                              'order_pos': 2,
+                              'type': 'bigint',
+                              'LABEL': 'Column'})
+
+    def test_publisher_compressed_files(self) -> None:
+        staging_dir = tempfile.mkdtemp()
+        try:
+            for sub_dir in ('nodes', 'relations'):
+                os.makedirs(f'{staging_dir}/{sub_dir}')
+                for file_name in os.listdir(f'{self._resource_path}/{sub_dir}'):
+                    with open(f'{self._resource_path}/{sub_dir}/{file_name}', 'rb') as plain_file, \
+                            gzip.open(f'{staging_dir}/{sub_dir}/{file_name}.gz', 'wb') as gzip_file:
+                        shutil.copyfileobj(plain_file, gzip_file)
+
+            for streaming_read in (False, True):
+                with patch.object(GraphDatabase, 'driver') as mock_driver:
+                    mock_transaction = MagicMock()
+                    mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+                    publisher = Neo4jCsvPublisher()
+
+                    conf = ConfigFactory.from_dict(
+                        {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                         neo4j_csv_publisher.NODE_FILES_DIR: f'{staging_dir}/nodes',
+                         neo4j_csv_publisher.RELATION_FILES_DIR: f'{staging_dir}/relations',
+                         neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                         neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                         neo4j_csv_publisher.NEO4J_STREAMING_READ: streaming_read,
+                         neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+                    )
+                    publisher.init(conf)
+                    publisher.publish()
+
+                    self.assertEqual(mock_transaction.run.call_count, 6)
+                    self.assertEqual(publisher.labels, {'Table', 'Column'})
+        finally:
+            shutil.rmtree(staging_dir)
+
+    def test_stream_csv_records(self) -> None:
+        csv_file = io.StringIO('"KEY","description","count:UNQUOTED","is_view:UNQUOTED","LABEL"\r\n'
+                               '"k1","multi\nline",3,True,"Table"\r\n'
+                               '"k2","123",1.5,False,"Table"\r\n')
+
+        actual = list(neo4j_csv_publisher._stream_csv_records(csv_file))
+
+        self.assertEqual(actual, [
+            {'KEY': 'k1', 'description': 'multi\nline', 'count:UNQUOTED': 3, 'is_view:UNQUOTED': True,
+             'LABEL': 'Table'},
+            {'KEY': 'k2', 'description': '123', 'count:UNQUOTED': 1.5, 'is_view:UNQUOTED': False,
+             'LABEL': 'Table'},
+        ])
+
+    def test_create_node_unwind_statement(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher.publish_tag = 'foo'
+        publisher.create_only_nodes = {'Column'}
+
+        stmt = publisher.create_node_unwind_statement({'KEY': 'k', 'LABEL': 'Column', 'order_pos:UNQUOTED': 1})
+
+        self.assertIn('UNWIND $batch AS row', stmt)
+        self.assertIn('MERGE (node:Column {key: row.KEY})', stmt)
+        self.assertIn('node.order_pos = row.order_pos', stmt)
+        self.assertNotIn('ON MATCH SET', stmt)
+
+    def test_publisher_parallel_nodes(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            mock_run = MagicMock()
+            mock_transaction.run = mock_run
+            mock_commit = MagicMock()
+            mock_transaction.commit = mock_commit
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_PUBLISHER_WORKERS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            self.assertEqual(mock_run.call_count, 6)
+            # Relations are published after all nodes
+            self.assertTrue(all(b'MERGE (node:' in c[0][0] for c in mock_run.call_args_list[:4]))
+
+            # 1 commit per node group (Column, Table), 1 per relation partition, 1 on main session
+            self.assertEqual(mock_commit.call_count, 5)
+            # 4 worker sessions are closed
+            self.assertEqual(mock_session.close.call_count, 4)
+
+    def test_publisher_parallel_relations_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+            mock_transaction.closed.return_value = False
+
+            def run(stmt: Any, parameters: Any) -> Any:
+                if b'MERGE (n1)' in stmt:
+                    raise RuntimeError('foo')
+                return MagicMock()
+
+            mock_transaction.run.side_effect = run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_PUBLISHER_WORKERS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            with patch.object(neo4j_csv_publisher, 'RELATION_PARTITION_CHUNK_SIZE', 1):
+                self.assertRaises(RuntimeError, publisher.publish)
+            mock_transaction.rollback.assert_called()
+
+    def test_publisher_parallel_relations_begin_transaction_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_PUBLISHER_WORKERS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher._read_records = MagicMock(return_value=[  # type: ignore
+                {'START_LABEL': 'Table', 'START_KEY': f'table{i}', 'END_LABEL': 'Column', 'END_KEY': f'column{i}',
+                 'TYPE': 'COLUMN', 'REVERSE_TYPE': 'BELONG_TO_TABLE'}
+                for i in range(30)
+            ])
+            # Connection can't be acquired by the relation workers
+            mock_session.begin_transaction.side_effect = ServiceUnavailable('foo')
+
+            errors = []
+
+            def publish_relations() -> None:
+                try:
+                    publisher._publish_relations_in_parallel()
+                except Exception as e:
+                    errors.append(e)
+
+            # Routing would block on the full queues of the failed workers
+            with patch.object(neo4j_csv_publisher, 'RELATION_PARTITION_CHUNK_SIZE', 1), \
+                    patch.object(neo4j_csv_publisher, 'RELATION_PARTITION_QUEUE_SIZE', 1):
+                thread = threading.Thread(target=publish_relations, daemon=True)
+                thread.start()
+                thread.join(timeout=10)
+
+            self.assertFalse(thread.is_alive())
+            self.assertEqual([type(e) for e in errors], [ServiceUnavailable])
+            # Sessions of both workers are closed
+            self.assertEqual(mock_session.close.call_count, 2)
+
+    def test_partition_relations(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher.deadlock_node_labels = {'Tag'}
+        publisher._read_records = MagicMock(return_value=[  # type: ignore
+            {'START_LABEL': 'Table', 'START_KEY': f'table{i % 2}', 'END_LABEL': 'Tag', 'END_KEY': f'tag{i % 3}',
+             'TYPE': 'TAGGED_BY', 'REVERSE_TYPE': 'TAG'}
+            for i in range(30)
+        ])
+
+        partitions = [neo4j_csv_publisher._RelationPartition() for _ in range(2)]
+        publisher._partition_relations([f'{self._resource_path}/relations/test_edge_short.csv'], partitions,
+                                       threading.Event())
+        for partition in partitions:
+            partition.close()
+
+        partitioned = [list(partition) for partition in partitions]
+        self.assertEqual(sum(len(rows) for rows in partitioned), 30)
+        for rows in partitioned:
+            # Rows are sorted by start key
+            self.assertEqual(rows, sorted(rows, key=lambda row: row['START_KEY']))
+        # A tag is only in one partition
+        tags = [{row['END_KEY'] for row in rows} for rows in partitioned]
+        self.assertFalse(tags[0] & tags[1])
+
+    def test_publisher_parallel_nodes_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+            mock_transaction.closed.return_value = False
+
+            def run(stmt: Any, parameters: Any) -> Any:
+                if b':Column' in stmt:
+                    raise RuntimeError('foo')
+                return MagicMock()
+
+            mock_transaction.run.side_effect = run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_PUBLISHER_WORKERS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            self.assertRaises(RuntimeError, publisher.publish)
+            mock_transaction.rollback.assert_called()
+            # Relations are not published
+            self.assertFalse(any(b'MERGE (n1)' in c[0][0] for c in mock_transaction.run.call_args_list))
+
+    def test_publisher_parallel_nodes_begin_transaction_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            worker_sessions = []
+
+            def session() -> Any:
+                # Main session comes first, then sessions which can't begin a transaction
+                mock_session = MagicMock()
+                if mock_driver.return_value.session.call_count > 1:
+                    mock_session.begin_transaction.side_effect = ServiceUnavailable('connection lost')
+                    worker_sessions.append(mock_session)
+                return mock_session
+
+            mock_driver.return_value.session.side_effect = session
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_PUBLISHER_WORKERS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            self.assertRaises(ServiceUnavailable, publisher.publish)
+            # Sessions of the node groups that started (the other one may be cancelled) are closed
+            worker_sessions = [s for s in worker_sessions if s.begin_transaction.called]
+            self.assertTrue(worker_sessions)
+            for worker_session in worker_sessions:
+                worker_session.close.assert_called_once()
+
+    def test_publisher_transient_error_replay(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver, \
+                patch.object(neo4j_csv_publisher.time, 'sleep') as mock_sleep:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+            mock_transaction.closed.return_value = False
+
+            failures = [TransientError('deadlock')]
+
+            def run(stmt: Any, parameters: Any) -> Any:
+                if parameters.get('KEY') == 'presto://gold.test_schema1/test_table1/test_id2' and failures:
+                    raise failures.pop()
+                return MagicMock()
+
+            mock_transaction.run.side_effect = run
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            publisher.publish()
+
+            calls = mock_transaction.run.call_args_list
+            failed_at = [c[1]['parameters'].get('KEY') for c in calls].index(
+                'presto://gold.test_schema1/test_table1/test_id2')
+            # Statements of the transaction are replayed, followed by the failed one
+            self.assertEqual(calls[failed_at + 1:2 * failed_at + 2], calls[:failed_at + 1])
+            self.assertEqual(len(calls), 6 + failed_at + 1)
+
+            self.assertEqual(mock_transaction.rollback.call_count, 1)
+            self.assertEqual(mock_sleep.call_count, 1)
+            self.assertEqual(mock_transaction.commit.call_count, 1)
+
+    def test_publisher_max_replay_rows(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_MAX_REPLAY_ROWS: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+            # Rows kept for replay when each transaction is committed
+            replay_rows = []
+            mock_transaction.commit.side_effect = \
+                lambda: replay_rows.append(len(publisher._get_pending_statements()))
+            publisher.publish()
+
+            self.assertEqual(mock_transaction.run.call_count, 6)
+            # Committed every 2 rows well before NEO4J_TRANSACTION_SIZE, and at the end
+            self.assertEqual(replay_rows, [2, 2, 2, 0])
+
+    def test_publisher_transient_error_retries_exhausted(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver, \
+                patch.object(neo4j_csv_publisher.time, 'sleep') as mock_sleep:
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            mock_transaction = MagicMock()
+            mock_session.begin_transaction.return_value = mock_transaction
+            mock_transaction.commit.side_effect = TransientError('leader switch')
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                 neo4j_csv_publisher.RELATION_FILES_DIR: f'{self._resource_path}/relations',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.NEO4J_TRANSIENT_ERROR_RETRIES: 2,
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            self.assertRaises(TransientError, publisher.publish)
+            self.assertEqual(mock_sleep.call_count, 2)
+            self.assertEqual(mock_transaction.commit.call_count, 3)
+            # All 6 statements are replayed on each retry
+            self.assertEqual(mock_transaction.run.call_count, 6 * 3)
+
+    def test_publisher_transient_error_replay_validation_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver, \
+                patch.object(neo4j_csv_publisher.time, 'sleep'):
+            mock_session = MagicMock()
+            mock_driver.return_value.session.return_value = mock_session
+
+            failed_transaction = MagicMock()
+            failed_transaction.closed.return_value = False
+            failed_transaction.run.side_effect = TransientError('deadlock')
+            failed_transaction.rollback.side_effect = \
+                lambda: setattr(failed_transaction.closed, 'return_value', True)
+            replayed_transaction = MagicMock()
+            replayed_transaction.closed.return_value = False
+            mock_session.begin_transaction.side_effect = [failed_transaction, replayed_transaction]
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            def validate(tx: Any, result: Any) -> None:
+                raise ValueError('invalid result')
+
+            with self.assertRaisesRegex(ValueError, 'invalid result'):
+                publisher._execute_statement('MATCH (n) RETURN n', tx=mock_session.begin_transaction(),
+                                             result_validator=validate)
+
+            # Transaction the statement was replayed in is rolled back, besides the one that failed transiently
+            failed_transaction.rollback.assert_called_once()
+            replayed_transaction.rollback.assert_called_once()
+
+    def test_get_retry_delay(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher._retry_base_delay_sec = 2
+        publisher._retry_max_delay_sec = 10
+
+        for attempt, max_delay in [(1, 2), (2, 4), (3, 8), (4, 10), (10, 10)]:
+            delay = publisher._get_retry_delay(attempt)
+            self.assertTrue(max_delay / 2 <= delay <= max_delay)
+
+    def test_publisher_resume_from_checkpoint(self) -> None:
+        staging_dir = tempfile.mkdtemp()
+        try:
+            shutil.copytree(f'{self._resource_path}/nodes', f'{staging_dir}/nodes')
+            shutil.copytree(f'{self._resource_path}/relations', f'{staging_dir}/relations')
+            checkpoint_path = f'{staging_dir}/nodes/{neo4j_csv_publisher.CHECKPOINT_FILE_NAME}'
+
+            def fail_on_relation(stmt: bytes, parameters: Any = None) -> Any:
+                if b'MERGE (n1)' in stmt:
+                    raise RuntimeError('test')
+                return MagicMock()
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_transaction = MagicMock()
+                mock_transaction.closed.return_value = False
+                mock_transaction.run.side_effect = fail_on_relation
+                mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(self._resume_conf(staging_dir, neo4j_csv_publisher.NEO4J_CHECKPOINT, 'first_run'))
+                self.assertRaises(RuntimeError, publisher.publish)
+
+            with open(checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            self.assertEqual(checkpoint['publish_tag'], 'first_run')
+            # All 4 node rows are committed, the last node file is completed once its end is reached
+            self.assertEqual(len(checkpoint['completed']), 1)
+            self.assertEqual(list(checkpoint['offsets'].values()), [2])
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_transaction = MagicMock()
+                mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                publisher.init(self._resume_conf(staging_dir, neo4j_csv_publisher.NEO4J_RESUME, 'second_run'))
+                publisher.publish()
+
+                self.assertEqual(publisher.publish_tag, 'first_run')
+                statements = [c[0][0] for c in mock_transaction.run.call_args_list]
+                self.assertEqual(len(statements), 2)
+                self.assertTrue(all(b'MERGE (n1)' in stmt for stmt in statements))
+                self.assertFalse(os.path.exists(checkpoint_path))
+        finally:
+            shutil.rmtree(staging_dir)
+
+    def _resume_conf(self, staging_dir: str, checkpoint_key: str, publish_tag: str) -> Any:
+        return ConfigFactory.from_dict(
+            {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+             neo4j_csv_publisher.NODE_FILES_DIR: f'{staging_dir}/nodes',
+             neo4j_csv_publisher.RELATION_FILES_DIR: f'{staging_dir}/relations',
+             neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+             neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+             neo4j_csv_publisher.NEO4J_TRANSACTION_SIZE: 1,
+             neo4j_csv_publisher.NEO4J_TRANSIENT_ERROR_RETRIES: 0,
+             checkpoint_key: True,
+             neo4j_csv_publisher.JOB_PUBLISH_TAG: publish_tag}
+        )
+
+    def test_file_progress_with_batches(self) -> None:
+        publisher = Neo4jCsvPublisher()
+        publisher._unwind_batch_size = 2
+        progress = neo4j_csv_publisher._FileProgress('file', 0, True)
+        records = [{'group': g} for g in 'abaccb']
+
+        batches = publisher._iter_batches(progress.track(records), itemgetter('group'), progress)
+
+        self.assertEqual(next(batches), [{'group': 'a'}, {'group': 'a'}])
+        # Row 1 (b) is still buffered
+        self.assertEqual(progress.committed_offset(), 1)
+        self.assertEqual(next(batches), [{'group': 'c'}, {'group': 'c'}])
+        self.assertEqual(progress.committed_offset(), 1)
+        self.assertEqual(next(batches), [{'group': 'b'}, {'group': 'b'}])
+        self.assertEqual(progress.committed_offset(), 6)
+        self.assertEqual(list(batches), [])
+        self.assertTrue(progress.is_completed())
+
+    def test_publisher_run_report(self) -> None:
+        staging_dir = tempfile.mkdtemp()
+        try:
+            shutil.copytree(f'{self._resource_path}/nodes', f'{staging_dir}/nodes')
+            shutil.copytree(f'{self._resource_path}/relations', f'{staging_dir}/relations')
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_transaction = MagicMock()
+                mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+                mock_statsd = MagicMock()
+                publisher.set_statsd(mock_statsd)
+
+                conf = ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{staging_dir}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: f'{staging_dir}/relations',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_RUN_REPORT: True,
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+                )
+                publisher.init(conf)
+                publisher.publish()
+
+            with open(f'{staging_dir}/{neo4j_csv_publisher.RUN_REPORT_FILE_NAME}') as report_file:
+                report = json.load(report_file)
+        finally:
+            shutil.rmtree(staging_dir)
+
+        self.assertTrue(report['success'])
+        self.assertEqual(report['counters'], {'commits': 1, 'nodes.Column': 2, 'nodes.Table': 2,
+                                              'relations.COLUMN': 2, 'statements': 6})
+        self.assertEqual(len(report['slowest_statements']), 6)
+        mock_statsd.timing.assert_called_once()
+        mock_statsd.pipeline.return_value.__enter__.return_value.incr.assert_any_call(
+            'neo4j_publisher.nodes.Column', 2)
+
+    def test_publisher_run_report_ready_file_queue(self) -> None:
+        with patch.object(GraphDatabase, 'driver'), tempfile.TemporaryDirectory() as tmp_dir:
+            report_path = os.path.join(tmp_dir, 'report.json')
+            for run_report_conf in ({}, {neo4j_csv_publisher.NEO4J_RUN_REPORT_PATH: report_path}):
+                queue = ReadyFileQueue()
+                queue.put(ready_file_queue.NODE, f'{self._resource_path}/nodes/test_table.csv')
+                queue.close()
+
+                publisher = Neo4jCsvPublisher()
+
+                conf = ConfigFactory.from_dict(dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.NEO4J_READY_FILE_QUEUE: queue,
+                     neo4j_csv_publisher.NEO4J_RUN_REPORT: True,
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}, **run_report_conf)
+                )
+                # Without node files directory, the report is only written to the configured path
+                publisher.init(conf)
+                publisher.publish()
+
+                self.assertEqual(os.path.isfile(report_path), bool(run_report_conf))
+
+            with open(report_path) as report_file:
+                self.assertEqual(json.load(report_file)['counters']['nodes.Table'], 2)
+
+    def test_create_indices_from_manifest(self) -> None:
+        with patch.object(GraphDatabase, 'driver'), tempfile.TemporaryDirectory() as tmp_dir:
+            node_dir = os.path.join(tmp_dir, 'nodes')
+            shutil.copytree(f'{self._resource_path}/nodes', node_dir)
+            with open(os.path.join(node_dir, neo4j_csv_publisher.MANIFEST_FILE_NAME), 'w') as manifest_file:
+                json.dump({'test_column.csv': {'labels': ['Column'], 'header': [], 'row_count': 2}}, manifest_file)
+
+            publisher = Neo4jCsvPublisher()
+
+            conf = ConfigFactory.from_dict(
+                {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                 neo4j_csv_publisher.NODE_FILES_DIR: node_dir,
+                 neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                 neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                 neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+            )
+            publisher.init(conf)
+
+            # Manifest is not a node file
+            self.assertEqual(sorted(os.path.basename(f) for f in publisher._node_files),
+                             ['test_column.csv', 'test_table.csv'])
+
+            with patch.object(publisher, '_try_create_index') as mock_create_index, \
+                    patch.object(publisher, '_read_records') as mock_read_records:
+                for node_file in publisher._node_files:
+                    publisher._create_indices(node_file)
+
+                # Column from manifest, Table from the first row of the file
+                self.assertEqual(sorted(c[0][0] for c in mock_create_index.call_args_list), ['Column', 'Table'])
+                mock_read_records.assert_not_called()
+
     def test_preprocessor(self) -> None:
         with patch.object(GraphDatabase, 'driver') as mock_driver:
             mock_session = MagicMock()
@@ -68,7 +970,7 @@ class TestPublish(unittest.TestCase):
 
             mock_preprocessor = MagicMock()
             mock_preprocessor.is_perform_preprocess.return_value = MagicMock(return_value=True)
-            mock_preprocessor.preprocess_cypher.return_value = ('MATCH (f:Foo) RETURN f', {})
+            mock_preprocessor.preprocess_cypher_batch.return_value = [('MATCH (f:Foo) RETURN f', {})]
 
             publisher = Neo4jCsvPublisher()
 
@@ -89,6 +991,87 @@ class TestPublish(unittest.TestCase):
             # 2 node files, 1 relation file
             self.assertEqual(mock_commit.call_count, 1)
 
+    def test_preprocessor_batch(self) -> None:
+        relation_dir = tempfile.mkdtemp()
+        try:
+            # Same relations twice, which are only pre-processed the first time
+            with open(f'{self._resource_path}/relations/test_edge_short.csv') as relation_file:
+                header, *rows = relation_file.readlines()
+            with open(f'{relation_dir}/test_edge_short.csv', 'w') as relation_file:
+                relation_file.writelines([header] + rows * 2)
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_session = MagicMock()
+                mock_driver.return_value.session.return_value = mock_session
+
+                mock_transaction = MagicMock()
+                mock_session.begin_transaction.return_value = mock_transaction
+
+                mock_run = MagicMock()
+                mock_transaction.run = mock_run
+
+                publisher = Neo4jCsvPublisher()
+
+                conf = ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.NODE_FILES_DIR: f'{self._resource_path}/nodes',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: relation_dir,
+                     neo4j_csv_publisher.RELATION_PREPROCESSOR: DeleteRelationPreprocessor(),
+                     neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 100,
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+                )
+                publisher.init(conf)
+                publisher.publish()
+        finally:
+            shutil.rmtree(relation_dir)
+
+        # 2 node batches, then 1 delete batch for the relations followed by their merge batch
+        statements = [c[0][0] for c in mock_run.call_args_list]
+        self.assertEqual(len(statements), 4)
+        self.assertIn(b'DELETE r', statements[2])
+        self.assertEqual(len(mock_run.call_args_list[2][1]['parameters']['batch']), 2)
+        self.assertIn(b'MERGE (n1)', statements[3])
+        self.assertEqual(len(mock_run.call_args_list[3][1]['parameters']['batch']), 4)
+
+    def test_preprocessor_reverse_relation(self) -> None:
+        relation_dir = tempfile.mkdtemp()
+        try:
+            # Lineage listed from both of its ends, merged one by one
+            with open(f'{relation_dir}/test_lineage.csv', 'w') as relation_file:
+                relation_file.write('"START_LABEL","START_KEY","END_LABEL","END_KEY","TYPE","REVERSE_TYPE"\n'
+                                    '"Table","table1","Table","table2","HAS_DOWNSTREAM","HAS_UPSTREAM"\n'
+                                    '"Table","table2","Table","table1","HAS_UPSTREAM","HAS_DOWNSTREAM"\n'
+                                    '"Table","table2","Table","table1","HAS_DOWNSTREAM","HAS_UPSTREAM"\n')
+
+            with patch.object(GraphDatabase, 'driver') as mock_driver:
+                mock_transaction = MagicMock()
+                mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+                publisher = Neo4jCsvPublisher()
+
+                conf = ConfigFactory.from_dict(
+                    {neo4j_csv_publisher.NEO4J_END_POINT_KEY: 'dummy://999.999.999.999:7687/',
+                     neo4j_csv_publisher.RELATION_FILES_DIR: relation_dir,
+                     neo4j_csv_publisher.RELATION_PREPROCESSOR: DeleteRelationPreprocessor(),
+                     neo4j_csv_publisher.NEO4J_UNWIND_BATCH_SIZE: 1,
+                     neo4j_csv_publisher.NEO4J_USER: 'neo4j_user',
+                     neo4j_csv_publisher.NEO4J_PASSWORD: 'neo4j_password',
+                     neo4j_csv_publisher.JOB_PUBLISH_TAG: str(uuid.uuid4())}
+                )
+                publisher.init(conf)
+                publisher.publish()
+        finally:
+            shutil.rmtree(relation_dir)
+
+        # Relations between the same tables are deleted once, before any of them is merged, so that the reverse
+        # direction does not delete the relation merged from an earlier row
+        statements = [c[0][0] for c in mock_transaction.run.call_args_list]
+        self.assertEqual([b'DELETE r' in statement for statement in statements], [True, False, False, False])
+        self.assertEqual(mock_transaction.run.call_args_list[0][1]['parameters']['batch'],
+                         [{'start_key': 'table1', 'end_key': 'table2'}])
+
 
 if __name__ == '__main__':
     unittest.main()
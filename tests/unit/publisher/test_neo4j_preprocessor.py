@@ -51,6 +51,62 @@ class TestNeo4jPreprocessor(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
+    def testDeleteRelationPreprocessorBatch(self) -> None:
+        preprocessor = DeleteRelationPreprocessor(label_tuples=[('Column', 'Tag')])
+
+        actual = preprocessor.preprocess_cypher_batch([('Column', 'Tag', 'col1', 'pii'),
+                                                       ('Column', 'Tag', 'col2', 'pii'),
+                                                       ('Tag', 'Column', 'pii', 'col3'),
+                                                       ('Table', 'Tag', 'table1', 'pii')],
+                                                      relation='TAGGED_BY',
+                                                      reverse_relation='TAG')
+
+        expected = [(textwrap.dedent("""
+    UNWIND $batch AS row
+    MATCH (n1:Column {key: row.start_key })-[r]-(n2:Tag {key: row.end_key })
+
+    WITH row, collect(r)[..2] AS rels
+    UNWIND rels AS r
+    DELETE r
+    RETURN count(*) as count;
+    """), {'batch': [{'start_key': 'col1', 'end_key': 'pii'}, {'start_key': 'col2', 'end_key': 'pii'}]}),
+            (textwrap.dedent("""
+    UNWIND $batch AS row
+    MATCH (n1:Tag {key: row.start_key })-[r]-(n2:Column {key: row.end_key })
+
+    WITH row, collect(r)[..2] AS rels
+    UNWIND rels AS r
+    DELETE r
+    RETURN count(*) as count;
+    """), {'batch': [{'start_key': 'pii', 'end_key': 'col3'}]})]
+
+        self.assertEqual(expected, actual)
+
+    def testDeleteRelationPreprocessorMissingKey(self) -> None:
+        preprocessor = DeleteRelationPreprocessor()
+
+        with self.assertRaisesRegex(Exception, 'all labels and keys are required'):
+            preprocessor.preprocess_cypher(start_label='foo_label',
+                                           end_label='bar_label',
+                                           start_key='foo_key',
+                                           end_key='',
+                                           relation='foo_relation',
+                                           reverse_relation='bar_relation')
+
+        with self.assertRaisesRegex(Exception, 'all labels and keys are required'):
+            preprocessor.preprocess_cypher_batch([('foo_label', 'bar_label', 'foo_key', 'bar_key'),
+                                                  ('foo_label', '', 'foo_key', 'bar_key')],
+                                                 relation='foo_relation',
+                                                 reverse_relation='bar_relation')
+
+    def testNoopRelationPreprocessorBatch(self) -> None:
+        preprocessor = NoopRelationPreprocessor()
+        preprocessor.filter = lambda **kwargs: False  # type: ignore
+
+        self.assertEqual(preprocessor.preprocess_cypher_batch([('foo', 'bar', 'foo_key', 'bar_key')],
+                                                              relation='foo_relation',
+                                                              reverse_relation='bar_relation'), [])
+
     def testDeleteRelationPreprocessorFilter(self) -> None:
         preprocessor = DeleteRelationPreprocessor(label_tuples=[('foo', 'bar')])
 
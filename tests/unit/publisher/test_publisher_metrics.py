@@ -0,0 +1,77 @@
+# Copyright Contributors to the Amundsen project.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import MagicMock
+
+from databuilder.publisher.publisher_metrics import PublisherMetrics
+
+
+class TestPublisherMetrics(unittest.TestCase):
+
+    def test_report(self) -> None:
+        metrics = PublisherMetrics(slowest_statement_count=2)
+        metrics.incr('nodes.Table')
+        metrics.incr('nodes.Column', 3)
+        metrics.record_statement('MERGE (node:Table {key: $KEY})', {'KEY': 'k1'}, 0.1)
+        metrics.record_statement('MERGE   (node:Table\n {key: $KEY})', {'KEY': 'k2'}, 0.3)
+        metrics.record_statement('UNWIND $batch AS row', {'batch': [{'KEY': str(i)} for i in range(1000)]}, 0.2)
+        metrics.record_commit(0.02)
+        metrics.record_commit(2)
+
+        report = metrics.finish(is_success=True)
+
+        self.assertTrue(report['success'])
+        self.assertEqual(report['counters'], {'commits': 2, 'nodes.Column': 3, 'nodes.Table': 1, 'statements': 3})
+        self.assertEqual([s['duration_sec'] for s in report['slowest_statements']], [0.3, 0.2])
+        self.assertEqual(report['slowest_statements'][0]['statement'], 'MERGE (node:Table {key: $KEY})')
+        # Params of a large batch are truncated
+        self.assertLess(len(report['slowest_statements'][1]['params']), 200)
+
+        commit_latency = report['commit_latency']
+        self.assertEqual(commit_latency['count'], 2)
+        self.assertEqual(commit_latency['max_sec'], 2)
+        self.assertEqual(commit_latency['histogram']['<=0.05'], 1)
+        self.assertEqual(commit_latency['histogram']['<=5'], 1)
+        self.assertEqual(sum(commit_latency['histogram'].values()), 2)
+
+    def test_statsd(self) -> None:
+        statsd = MagicMock()
+        pipe = statsd.pipeline.return_value.__enter__.return_value
+        metrics = PublisherMetrics(statsd=statsd, prefix='neo4j_publisher')
+        metrics.incr('relations.COLUMN', 2)
+        metrics.record_commit(0.5)
+
+        metrics.finish(is_success=False)
+
+        statsd.timing.assert_called_once_with('neo4j_publisher.commit', 500)
+        pipe.incr.assert_any_call('neo4j_publisher.relations.COLUMN', 2)
+        pipe.incr.assert_any_call('neo4j_publisher.commits', 1)
+        pipe.gauge.assert_called_once()
+
+    def test_write_report(self) -> None:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            metrics = PublisherMetrics()
+            metrics.record_statement('MATCH (n) RETURN n', None, 0.1)
+            metrics.finish(is_success=True)
+
+            metrics.write_report(os.path.join(temp_dir, 'report.json'))
+            with open(os.path.join(temp_dir, 'report.json')) as report_file:
+                report = json.load(report_file)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(report['counters'], {'statements': 1})
+        self.assertEqual(report['commit_latency'], {'count': 0, 'histogram': {
+            '<=0.01': 0, '<=0.05': 0, '<=0.1': 0, '<=0.5': 0, '<=1': 0, '<=5': 0, '<=10': 0, '<=30': 0, '<=60': 0,
+            '>60': 0}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,16 +6,27 @@ import logging
 import shutil
 import tempfile
 import unittest
-from typing import Any
+from typing import (
+    Any, Iterable, Optional,
+)
 
-from mock import patch
+from mock import MagicMock, patch
+from neo4j import GraphDatabase
 from pyhocon import ConfigFactory, ConfigTree
 
 from databuilder.extractor.base_extractor import Extractor
 from databuilder.job.job import DefaultJob
 from databuilder.loader.base_loader import Loader
+from databuilder.loader.file_system_neo4j_csv_loader import FsNeo4jCSVLoader
+from databuilder.publisher import neo4j_csv_publisher
+from databuilder.publisher.neo4j_csv_publisher import Neo4jCsvPublisher
 from databuilder.task.task import DefaultTask
 from databuilder.transformer.base_transformer import Transformer
+from databuilder.utils.key_registry import get_key_registry
+from databuilder.utils.ready_file_queue import ReadyFileQueue
+from tests.unit.models.movie import (
+    Actor, City, Movie,
+)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -49,6 +60,15 @@ class TestJob(unittest.TestCase):
 
         self.assertEqual(mock_statsd.call_count, 0)
 
+    def test_job_resets_key_registry(self) -> None:
+        get_key_registry().add('database://hive')
+
+        task = DefaultTask(SuperHeroExtractor(), SuperHeroLoader())
+        DefaultJob(self.conf, task).launch()
+
+        # Keys remembered in the job run do not leak into the next one
+        self.assertTrue(get_key_registry().add('database://hive'))
+
 
 class TestJobNoTransform(unittest.TestCase):
 
@@ -105,6 +125,112 @@ class TestJobStatsd(unittest.TestCase):
                 self.assertFalse(file.readline())
 
             self.assertEqual(mock_statsd.return_value.incr.call_count, 1)
+            self.assertEqual(job.publisher.statsd, mock_statsd.return_value)
+
+
+class TestJobStreaming(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir_path = tempfile.mkdtemp()
+        self.ready_file_queue = ReadyFileQueue()
+        self.conf = ConfigFactory.from_dict(
+            {f'loader.filesystem_csv_neo4j.{FsNeo4jCSVLoader.NODE_DIR_PATH}': f'{self.temp_dir_path}/nodes',
+             f'loader.filesystem_csv_neo4j.{FsNeo4jCSVLoader.RELATION_DIR_PATH}': f'{self.temp_dir_path}/relations',
+             f'loader.filesystem_csv_neo4j.{FsNeo4jCSVLoader.READY_FILE_QUEUE}': self.ready_file_queue,
+             f'loader.filesystem_csv_neo4j.{FsNeo4jCSVLoader.READY_FILE_ROW_COUNT}': 2,
+             f'publisher.neo4j.{neo4j_csv_publisher.NODE_FILES_DIR}': f'{self.temp_dir_path}/nodes',
+             f'publisher.neo4j.{neo4j_csv_publisher.RELATION_FILES_DIR}': f'{self.temp_dir_path}/relations',
+             f'publisher.neo4j.{neo4j_csv_publisher.NEO4J_END_POINT_KEY}': 'dummy://999.999.999.999:7687/',
+             f'publisher.neo4j.{neo4j_csv_publisher.NEO4J_USER}': 'neo4j_user',
+             f'publisher.neo4j.{neo4j_csv_publisher.NEO4J_PASSWORD}': 'neo4j_password',
+             f'publisher.neo4j.{neo4j_csv_publisher.NEO4J_READY_FILE_QUEUE}': self.ready_file_queue,
+             f'publisher.neo4j.{neo4j_csv_publisher.JOB_PUBLISH_TAG}': 'unit_test'})
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir_path)
+
+    def test_job(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_transaction = MagicMock()
+            mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+            task = DefaultTask(MovieExtractor(), FsNeo4jCSVLoader())
+            job = DefaultJob(self.conf, task, publisher=Neo4jCsvPublisher())
+            with self.assertLogs(level=logging.INFO) as logs:
+                job.launch()
+
+            # 2 movies with 5 nodes and 4 relations each
+            self.assertEqual(mock_transaction.run.call_count, 18)
+            self.assertIn('INFO:root:Job completed', logs.output)
+
+    def test_job_extract_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_transaction = MagicMock()
+            mock_transaction.closed.return_value = False
+            mock_transaction.rollback.side_effect = lambda: setattr(mock_transaction.closed, 'return_value', True)
+            mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+            task = DefaultTask(MovieExtractor(fail_after=1), FsNeo4jCSVLoader())
+            job = DefaultJob(self.conf, task, publisher=Neo4jCsvPublisher())
+
+            with self.assertRaisesRegex(RuntimeError, 'test'):
+                job.launch()
+            # Files published before the failure may be committed ahead of index creation, the rest is rolled back
+            mock_transaction.rollback.assert_called_once()
+
+    def test_job_loader_without_queue(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_transaction = MagicMock()
+            mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+            del self.conf['loader']['filesystem_csv_neo4j'][FsNeo4jCSVLoader.READY_FILE_QUEUE]
+            task = DefaultTask(MovieExtractor(), FsNeo4jCSVLoader())
+            job = DefaultJob(self.conf, task, publisher=Neo4jCsvPublisher())
+            # Job closes the queue itself, so that the publisher does not wait for files forever
+            job.launch()
+
+            mock_transaction.run.assert_not_called()
+
+    def test_job_publish_failure(self) -> None:
+        with patch.object(GraphDatabase, 'driver') as mock_driver:
+            mock_transaction = MagicMock()
+            mock_transaction.run.side_effect = RuntimeError('publish failure')
+            mock_driver.return_value.session.return_value.begin_transaction.return_value = mock_transaction
+
+            extractor = MovieExtractor(movie_count=100000)
+            task = DefaultTask(extractor, FsNeo4jCSVLoader())
+            job = DefaultJob(self.conf, task, publisher=Neo4jCsvPublisher())
+
+            with self.assertRaisesRegex(RuntimeError, 'publish failure'):
+                job.launch()
+            # Task stops once the loader can't hand over files anymore
+            self.assertLess(extractor.count, 100000)
+
+
+class MovieExtractor(Extractor):
+    def __init__(self, fail_after: Optional[int] = None, movie_count: Optional[int] = None) -> None:
+        self.fail_after = fail_after
+        self.movie_count = movie_count
+
+    def init(self, conf: ConfigTree) -> None:
+        self.count = 0
+        movies: Iterable[Movie] = [Movie('Top Gun', [Actor('Tom Cruise'), Actor('Meg Ryan')],
+                                         [City('San Diego'), City('Oakland')]),
+                                   Movie('Jaws', [Actor('Roy Scheider'), Actor('Robert Shaw')],
+                                         [City('Edgartown'), City('Menemsha')])]
+        if self.movie_count:
+            movies = (Movie(f'Movie {i}', [Actor(f'Actor {i}')], [City(f'City {i}')])
+                      for i in range(self.movie_count))
+        self.iter = iter(movies)
+
+    def extract(self) -> Any:
+        if self.count == self.fail_after:
+            raise RuntimeError('test')
+        self.count += 1
+        return next(self.iter, None)
+
+    def get_scope(self) -> str:
+        return 'extractor.movie'
 
 
 class SuperHeroExtractor(Extractor):